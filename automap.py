@@ -0,0 +1,490 @@
+'''
+Pairs the joints of two skeletons automatically, for binding rigs whose names differ.
+
+Joints are matched either by rest position, or by name tokens under alias and side
+rules. Either way the hierarchy breaks ties, and each target joint is used at most once.
+Matching works on plain arrays of names, positions and parent indices, so it runs
+the same inside and outside of Maya, and dense rigs with thousands of joints match
+in the milliseconds.
+'''
+import re
+import math
+import numpy as np
+import solver
+
+
+class KDTree(object):
+    '''
+    A static KD-tree over points, split at the median until each leaf holds at most leafSize points.
+    Queries run for every point at once. Each query first searches its own leaf to bound its
+    search radius, then walks the tree again visiting only the nodes whose boxes reach inside it.
+    '''
+
+    def __init__(self, points, leafSize=16):
+        '''
+        :param points: An (n, d) array of points
+        :param leafSize: The most points held in a leaf
+        '''
+        self.points = np.asarray(points, dtype=float)
+        if len(self.points) == 0:
+            raise ValueError('A KD-tree needs at least one point')
+        self.leafSize = leafSize
+
+        # Each node either splits on an axis, or points at a leaf, and keeps the box around its points
+        axes, splits, children, lower, upper, leaves = [], [], [], [], [], []
+        stack = [(np.arange(len(self.points)), 0)]
+        while stack:
+            indices, node = stack.pop()
+            values = self.points[indices]
+            while len(axes) <= node:
+                axes.append(-1)
+                splits.append(0.0)
+                children.append((-1, -1))
+                lower.append(None)
+                upper.append(None)
+            lower[node] = values.min(axis=0)
+            upper[node] = values.max(axis=0)
+
+            if len(indices) <= leafSize:
+                children[node] = (-1, len(leaves))
+                leaves.append(indices)
+                continue
+
+            # Split the widest axis at its median
+            axis = int(np.argmax(upper[node] - lower[node]))
+            half = len(indices) // 2
+            order = np.argpartition(values[:, axis], half)
+            left, right = len(axes), len(axes) + 1
+            axes[node] = axis
+            splits[node] = values[order[half], axis]
+            children[node] = (left, right)
+
+            axes += [-1, -1]
+            splits += [0.0, 0.0]
+            children += [(-1, -1), (-1, -1)]
+            lower += [None, None]
+            upper += [None, None]
+            stack += [(indices[order[:half]], left), (indices[order[half:]], right)]
+
+        self._axes = np.array(axes, dtype=int)
+        self._splits = np.array(splits, dtype=float)
+        self._children = np.array(children, dtype=int)
+        self._lower = np.array(lower)
+        self._upper = np.array(upper)
+
+        # Leaves are padded to the same size, with padding too far away to ever be found
+        self._leafIndices = np.full((len(leaves), leafSize), -1, dtype=int)
+        self._leafPoints = np.full((len(leaves), leafSize, self.points.shape[1]), np.inf)
+        for i, indices in enumerate(leaves):
+            self._leafIndices[i, :len(indices)] = indices
+            self._leafPoints[i, :len(indices)] = self.points[indices]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _findLeaves(self, points):
+
+        # Walk every point down the tree together, one level at a time
+        nodes = np.zeros(len(points), dtype=int)
+        inner = self._axes[nodes] >= 0
+        while inner.any():
+            current = nodes[inner]
+            right = points[inner, self._axes[current]] >= self._splits[current]
+            nodes[inner] = self._children[current, right.astype(int)]
+            inner = self._axes[nodes] >= 0
+
+        return self._children[nodes, 1]
+
+    def query(self, points, k=1, chunkSize=1024):
+        '''
+        Finds the nearest points in the tree.
+        :param points: An (m, d) array of points to search from
+        :param k: The number of neighbors to find for each point
+        :param chunkSize: The number of points searched from at once, bounding the memory used
+        :return: The (m, k) distances and (m, k) indices of the neighbors, nearest first
+        '''
+        points = np.asarray(points, dtype=float)
+        k = min(k, len(self.points))
+        distances = np.empty((len(points), k))
+        indices = np.empty((len(points), k), dtype=int)
+
+        for start in range(0, len(points), chunkSize):
+            chunk = slice(start, start + chunkSize)
+            distances[chunk], indices[chunk] = self._query(points[chunk], k)
+
+        return distances, indices
+
+    def _query(self, points, k):
+
+        # The kth nearest in a point's own leaf bounds how far it has to look
+        own = np.sum((self._leafPoints[self._findLeaves(points)] - points[:, None]) ** 2, axis=-1)
+        radius = np.sort(own, axis=1)[:, k - 1] if k <= self.leafSize else np.full(len(points), np.inf)
+
+        # Walk down from the root in step, only into nodes whose boxes reach inside the radius
+        queries = np.arange(len(points))
+        nodes = np.zeros(len(points), dtype=int)
+        found = []
+        while len(nodes):
+            gap = np.maximum(np.maximum(self._lower[nodes] - points[queries], points[queries] - self._upper[nodes]), 0.0)
+            near = np.sum(gap ** 2, axis=-1) <= radius[queries]
+            queries, nodes = queries[near], nodes[near]
+
+            leaf = self._axes[nodes] < 0
+            found.append((queries[leaf], self._children[nodes[leaf], 1]))
+            queries = np.repeat(queries[~leaf], 2)
+            nodes = self._children[nodes[~leaf]].ravel()
+
+        queries = np.concatenate([pair[0] for pair in found])
+        leaves = np.concatenate([pair[1] for pair in found])
+
+        found = np.sum((self._leafPoints[leaves] - points[queries, None]) ** 2, axis=-1)
+        candidates = self._leafIndices[leaves]
+
+        # No more than k of each leaf's points can be among a query's k nearest
+        if k < self.leafSize:
+            rows = np.arange(len(found))[:, None]
+            best = np.argpartition(found, k - 1, axis=1)[:, :k]
+            found, candidates = found[rows, best], candidates[rows, best]
+        queries = np.repeat(queries, found.shape[1])
+        found = found.ravel()
+        candidates = candidates.ravel()
+
+        # Sort by distance, then group by query keeping that order, and take the first k of each group
+        order = np.argsort(found)
+        order = order[np.argsort(queries[order], kind='mergesort')]
+        queries, found, candidates = queries[order], found[order], candidates[order]
+        rank = np.arange(len(queries)) - np.searchsorted(queries, queries)
+        keep = (rank < k) & (candidates >= 0)
+
+        distances = np.empty((len(points), k))
+        indices = np.empty((len(points), k), dtype=int)
+        distances[queries[keep], rank[keep]] = np.sqrt(found[keep])
+        indices[queries[keep], rank[keep]] = candidates[keep]
+
+        return distances, indices
+
+
+def ancestry(parents):
+    '''
+    Numbers the joints in depth first order, so ancestry becomes an interval test:
+    a is an ancestor of b when enter[a] < enter[b] and leave[b] <= leave[a].
+    :param parents: For each joint, the index of its parent, or -1 for roots
+    :return: The (n,) enter and (n,) leave numbers
+    '''
+    parents = np.asarray(parents, dtype=int)
+    children = [[] for i in parents]
+    for joint, parent in enumerate(parents):
+        if parent >= 0:
+            children[parent].append(joint)
+
+    enter = np.zeros(len(parents), dtype=int)
+    leave = np.zeros(len(parents), dtype=int)
+    counter = 0
+    for root in np.flatnonzero(parents < 0):
+        stack = [(root, False)]
+        while stack:
+            joint, done = stack.pop()
+            if done:
+                leave[joint] = counter
+                continue
+            enter[joint] = counter
+            counter += 1
+            stack.append((joint, True))
+            stack += [(child, False) for child in reversed(children[joint])]
+
+    return enter, leave
+
+
+def normalizePositions(positions, parents, up=1):
+    '''
+    Moves a skeleton's root to the origin and scales it to unit height,
+    so skeletons of different sizes can be compared.
+    :param positions: The (n, 3) joint positions
+    :param parents: For each joint, the index of its parent, or -1 for roots
+    :param up: The axis height is measured along
+    :return: The (n, 3) normalized positions
+    '''
+    positions = np.asarray(positions, dtype=float)
+    root = positions[np.flatnonzero(np.asarray(parents) < 0)[0]]
+
+    # Flat skeletons fall back to their widest extent
+    extent = positions.max(axis=0) - positions.min(axis=0)
+    height = extent[up] if extent[up] > 1e-9 else extent.max()
+
+    return (positions - root) / (height if height > 1e-9 else 1.0)
+
+
+def matchByProximity(sourcePositions, sourceParents, targetPositions, targetParents,
+                     candidates=4, tolerance=0.05, up=1):
+    '''
+    Pairs each source joint with a target joint by rest position and hierarchy.
+    Both skeletons are normalized for height, then each source joint looks at its nearest
+    target joints. Sources are resolved parents first, and a candidate that is not below the
+    target matched to the source's parent is penalized. Each target is used at most once.
+    :param sourcePositions: The (s, 3) source rest positions
+    :param sourceParents: For each source joint, the index of its parent, or -1 for roots
+    :param targetPositions: The (t, 3) target rest positions
+    :param targetParents: For each target joint, the index of its parent, or -1 for roots
+    :param candidates: The number of nearest target joints considered for each source joint
+    :param tolerance: The normalized distance at which confidence falls to about 0.6
+    :param up: The axis height is measured along
+    :return: For each source joint, the index of its target or -1, and a confidence from 0 to 1
+    '''
+    sourceParents = np.asarray(sourceParents, dtype=int)
+    targetParents = np.asarray(targetParents, dtype=int)
+    source = normalizePositions(sourcePositions, sourceParents, up)
+    target = normalizePositions(targetPositions, targetParents, up)
+
+    distances, nearest = KDTree(target).query(source, candidates)
+    enter, leave = ancestry(targetParents)
+
+    # Near and hierarchy consistent candidates score highest
+    proximity = np.exp(-0.5 * (distances / tolerance) ** 2)
+    choice = np.full(len(source), -1)
+    scores = np.empty(distances.shape)
+    for level in solver.ForwardKinematics(sourceParents).levels:
+        parents = sourceParents[level]
+        parentTargets = np.where(parents >= 0, choice[np.maximum(parents, 0)], -1)[:, None]
+        below = (enter[parentTargets] < enter[nearest[level]]) & (leave[nearest[level]] <= leave[parentTargets])
+        consistent = (parentTargets < 0) | below
+        scores[level] = proximity[level] * np.where(consistent, 1.0, 0.5)
+        choice[level] = nearest[level, np.argmax(scores[level], axis=1)]
+
+    return _assign(nearest, scores, len(target))
+
+
+def _assign(nearest, scores, count):
+
+    # Hand out the targets in rounds, each unmatched source asks for its best remaining
+    # candidate and each target goes to the highest score asking, so no target is used twice
+    matches = np.full(len(nearest), -1)
+    confidence = np.zeros(len(nearest))
+    used = np.zeros(count, dtype=bool)
+    available = scores > 0.0
+    while True:
+        asking = np.flatnonzero(available.any(axis=1) & (matches < 0))
+        if len(asking) == 0:
+            break
+
+        rank = np.argmax(np.where(available[asking], scores[asking], -1.0), axis=1)
+        wanted = nearest[asking, rank]
+        order = np.lexsort((-scores[asking, rank], wanted))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = wanted[order][1:] != wanted[order][:-1]
+        winners = order[first]
+
+        matches[asking[winners]] = wanted[winners]
+        confidence[asking[winners]] = scores[asking[winners], rank[winners]]
+        used[wanted[winners]] = True
+        available &= ~used[nearest]
+
+    return matches, confidence
+
+
+# Words that mean the same part, longest phrases are replaced first
+ALIASES = {
+    'pelvis': 'hips', 'hip': 'hips', 'cog': 'hips', 'abdomen': 'spine',
+    'clavicle': 'shoulder', 'collar': 'shoulder', 'collarbone': 'shoulder',
+    'upperarm': 'arm', 'upper arm': 'arm', 'up arm': 'arm', 'bicep': 'arm',
+    'lowerarm': 'forearm', 'lower arm': 'forearm', 'fore arm': 'forearm', 'elbow': 'forearm',
+    'wrist': 'hand', 'palm': 'hand',
+    'thigh': 'upleg', 'upperleg': 'upleg', 'upper leg': 'upleg', 'up leg': 'upleg', 'femur': 'upleg',
+    'calf': 'leg', 'shin': 'leg', 'knee': 'leg', 'lowerleg': 'leg', 'lower leg': 'leg',
+    'ankle': 'foot', 'ball': 'toe', 'toebase': 'toe', 'toe base': 'toe', 'toes': 'toe',
+    'pointer': 'index', 'forefinger': 'index', 'mid': 'middle',
+    'little': 'pinky', 'pinkie': 'pinky', 'small': 'pinky', 'skull': 'head', 'eyeball': 'eye',
+}
+
+# Words that mark a side, by side
+SIDES = {'l': ('l', 'left', 'lf', 'lft', 'lt'), 'r': ('r', 'right', 'rt', 'rgt', 'rght')}
+
+# Words that say nothing about the part, such as vendor prefixes and joint suffixes
+IGNORED = ('jnt', 'jt', 'joint', 'bn', 'bone', 'bind', 'def', 'drv', 'skin', 'sk', 'env',
+           'mixamorig', 'bip', 'biped', 'char', 'rig')
+
+_TOKEN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+
+class NameRules(object):
+    '''
+    Turns joint names into a side and a tuple of part tokens, so names from different vendors compare.
+    Names are stripped of namespaces and paths, split on case changes, digits and separators, and
+    lowercased. Side words are taken out, ignored words dropped, and aliases replaced.
+    '''
+
+    def __init__(self, aliases=None, sides=None, ignored=None):
+        '''
+        :param aliases: A dict of phrases to the phrases they mean, ALIASES if None
+        :param sides: A dict of each side to the words marking it, SIDES if None
+        :param ignored: Words to drop, IGNORED if None
+        '''
+        aliases = ALIASES if aliases is None else aliases
+        sides = SIDES if sides is None else sides
+
+        self.aliases = dict((tuple(key.lower().split()), tuple(value.lower().split())) for key, value in aliases.items())
+        self.sides = dict((word.lower(), side) for side, words in sides.items() for word in words)
+        self.ignored = set(word.lower() for word in (IGNORED if ignored is None else ignored))
+        self._longest = max([len(key) for key in self.aliases] + [1])
+
+    def tokenize(self, name):
+        '''
+        :param name: A joint name, with or without namespaces and a path
+        :return: The side, or None, and the tuple of part tokens
+        '''
+        name = name.split('|')[-1].split(':')[-1]
+        words = [str(int(word)) if word.isdigit() else word.lower() for word in _TOKEN.findall(name)]
+
+        side = None
+        kept = []
+        for word in words:
+            if word in self.sides and side is None:
+                side = self.sides[word]
+            elif word not in self.ignored:
+                kept.append(word)
+
+        # Replace the longest alias phrase starting at each word
+        tokens = []
+        i = 0
+        while i < len(kept):
+            for length in range(min(self._longest, len(kept) - i), 0, -1):
+                phrase = tuple(kept[i:i + length])
+                if phrase in self.aliases:
+                    tokens += self.aliases[phrase]
+                    i += length
+                    break
+            else:
+                tokens.append(kept[i])
+                i += 1
+
+        return side, tuple(tokens)
+
+
+def _nameFeatures(tokens):
+
+    # Each token, and each pair of neighboring tokens, which tell chain numbers of different parts apart
+    return set(tokens) | set(first + ' ' + second for first, second in zip(tokens[:-1], tokens[1:]))
+
+
+def _nameCandidates(sourceTokens, targetTokens, candidates, maxPostings):
+
+    # Index the targets by feature, so each source only meets targets sharing a telling feature
+    targetFeatures = [_nameFeatures(tokens) for side, tokens in targetTokens]
+    index = {}
+    for t, features in enumerate(targetFeatures):
+        for feature in features:
+            index.setdefault(feature, []).append(t)
+
+    # Rare features weigh more, and features no target has weigh most
+    total = float(len(targetTokens))
+    weights = dict((feature, math.log(1.0 + total / len(postings))) for feature, postings in index.items())
+    unknown = math.log(2.0 + total)
+    targetWeights = [sum(weights[feature] for feature in features) for features in targetFeatures]
+
+    nearest = np.full((len(sourceTokens), candidates), -1)
+    similarity = np.zeros((len(sourceTokens), candidates))
+    for s, (side, tokens) in enumerate(sourceTokens):
+        features = _nameFeatures(tokens)
+        known = sorted((len(index[feature]), feature) for feature in features if feature in index)
+        if not known:
+            continue
+
+        # The rarest feature always finds candidates, the rest only when they are telling enough,
+        # common features just add their weight to the candidates already found
+        shared = {}
+        for i, (count, feature) in enumerate(known):
+            weight = weights[feature]
+            if i == 0 or count <= maxPostings:
+                for t in index[feature]:
+                    shared[t] = shared.get(t, 0.0) + weight
+            else:
+                for t in shared:
+                    if feature in targetFeatures[t]:
+                        shared[t] += weight
+
+        # Weighted overlap of the two feature sets, halved when only one names a side
+        sourceWeight = sum(weights.get(feature, unknown) for feature in features)
+        scored = []
+        for t, weight in shared.items():
+            targetSide = targetTokens[t][0]
+            if side is not None and targetSide is not None and side != targetSide:
+                continue
+            score = weight / (sourceWeight + targetWeights[t] - weight)
+            if (side is None) != (targetSide is None):
+                score *= 0.5
+            scored.append((-score, t))
+
+        scored.sort()
+        for c, (score, t) in enumerate(scored[:candidates]):
+            nearest[s, c] = t
+            similarity[s, c] = -score
+
+    return nearest, similarity
+
+
+def _childCounts(parents):
+
+    # The number of children of each joint
+    parents = np.asarray(parents, dtype=int)
+    return np.bincount(parents[parents >= 0], minlength=len(parents))
+
+
+def matchByName(sourceNames, sourceParents, targetNames, targetParents, rules=None,
+                candidates=8, topologyWeight=0.3, maxPostings=64):
+    '''
+    Pairs each source joint with a target joint by name tokens and hierarchy.
+    Candidates come from an index of target tokens and neighboring token pairs, so the work grows with
+    the joint count rather than its square. Each candidate is scored by the weighted overlap of those
+    tokens and pairs, rare ones counting most, then blended with how
+    alike its place in the hierarchy is: its relative depth, its child count, and whether it sits below
+    the target matched to the source's parent. Sources are resolved parents first.
+    :param sourceNames: The source joint names
+    :param sourceParents: For each source joint, the index of its parent, or -1 for roots
+    :param targetNames: The target joint names
+    :param targetParents: For each target joint, the index of its parent, or -1 for roots
+    :param rules: The NameRules used to tokenize names, the default rules if None
+    :param candidates: The most target joints considered for each source joint
+    :param topologyWeight: How much of the score comes from the hierarchy, from 0 to 1
+    :param maxPostings: Tokens shared by more target joints than this only find candidates
+                        when they are a source joint's rarest token, or pair of tokens
+    :return: For each source joint, the index of its target or -1, and a confidence from 0 to 1
+    '''
+    rules = rules or NameRules()
+    sourceParents = np.asarray(sourceParents, dtype=int)
+    targetParents = np.asarray(targetParents, dtype=int)
+    if len(targetNames) == 0:
+        return np.full(len(sourceNames), -1), np.zeros(len(sourceNames))
+
+    nearest, similarity = _nameCandidates([rules.tokenize(name) for name in sourceNames],
+                                          [rules.tokenize(name) for name in targetNames], candidates, maxPostings)
+    found = nearest >= 0
+    safe = np.maximum(nearest, 0)
+
+    # Depth relative to the deepest joint, and child counts, compared between each pair
+    sourceLevels = solver.ForwardKinematics(sourceParents).levels
+    targetLevels = solver.ForwardKinematics(targetParents).levels
+    sourceDepth = np.zeros(len(sourceParents))
+    targetDepth = np.zeros(len(targetParents))
+    for depth, level in enumerate(sourceLevels):
+        sourceDepth[level] = depth / max(len(sourceLevels) - 1.0, 1.0)
+    for depth, level in enumerate(targetLevels):
+        targetDepth[level] = depth / max(len(targetLevels) - 1.0, 1.0)
+    sourceChildren = _childCounts(sourceParents)[:, None]
+    targetChildren = _childCounts(targetParents)[safe]
+    depthSimilarity = 1.0 - np.abs(sourceDepth[:, None] - targetDepth[safe])
+    childSimilarity = (np.minimum(sourceChildren, targetChildren) + 1.0) / (np.maximum(sourceChildren, targetChildren) + 1.0)
+
+    enter, leave = ancestry(targetParents)
+    choice = np.full(len(sourceParents), -1)
+    scores = np.zeros(nearest.shape)
+    for level in sourceLevels:
+        parents = sourceParents[level]
+        parentTargets = np.where(parents >= 0, choice[np.maximum(parents, 0)], -1)[:, None]
+        below = (enter[parentTargets] < enter[safe[level]]) & (leave[safe[level]] <= leave[parentTargets])
+        consistent = np.where(parentTargets < 0, 1.0, below.astype(float))
+
+        topology = (depthSimilarity[level] + childSimilarity[level] + 2.0 * consistent) / 4.0
+        scores[level] = np.where(found[level], (1.0 - topologyWeight) * similarity[level] + topologyWeight * topology, 0.0)
+        best = np.argmax(scores[level], axis=1)
+        choice[level] = np.where(scores[level, best] > 0.0, nearest[level, best], -1)
+
+    return _assign(nearest, scores, len(targetNames))
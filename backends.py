@@ -0,0 +1,589 @@
+'''
+The scene calls the retargeter's hot paths are built on.
+
+Both backends expose the same methods over their own node handles. The pymel
+backend works with PyNodes, while the cmds backend works with plain string
+names through maya.cmds, skipping the cost of wrapping every node it touches.
+'''
+import numpy as np
+import maya.cmds as cmds
+import pymel.core as pmc
+import pymel.core.datatypes as dt
+import controltools
+import transformmath as tm
+
+# Names come back from maya.cmds as unicode in Python 2
+_STRING_TYPES = (str, type(u''))
+
+
+class HandleCache(object):
+    '''
+    PyNodes keyed by node UUID, which survives renames and reparenting, along
+    with the nodes found through their message attributes. Names looked up
+    before are answered from the cache while their node still exists under
+    that name. Nodes are evicted when they are deleted through the cache, and
+    dropped if found stale.
+    '''
+
+    def __init__(self):
+        self._handles = {}
+        self._uuids = {}
+        self._names = {}
+        self._namesOf = {}
+        self._messages = {}
+        self._linkedFrom = {}
+
+    def __len__(self):
+        return len(self._handles)
+
+    def uuid(self, node):
+        '''
+        :param node: A PyNode
+        :return: The node's UUID, only queried the first time the node is seen
+        '''
+        uuid = self._uuids.get(node)
+        if uuid is None:
+            uuid = cmds.ls(node.name(), uuid=True)[0]
+            self._uuids[node] = uuid
+            self._handles.setdefault(uuid, node)
+
+        return uuid
+
+    def get(self, name):
+        '''
+        :param name: The name of a node
+        :return: The node's PyNode, only wrapped the first time the node is seen
+        '''
+        # A name seen before needs no scene query, unless its node was deleted or renamed
+        node = self._names.get(name)
+        if node is not None and node.exists() and name in (node.name(), node.longName()):
+            return node
+
+        uuid = cmds.ls(name, uuid=True)[0]
+        node = self._handles.get(uuid)
+        if node is None or not node.exists():
+            node = pmc.PyNode(name)
+            self._handles[uuid] = node
+            self._uuids[node] = uuid
+
+        self._names[name] = node
+        self._namesOf.setdefault(uuid, set()).add(name)
+
+        return node
+
+    def getMessage(self, node, name):
+        '''
+        :param node: A PyNode
+        :param name: The name of one of the node's message attributes
+        :return: The node connected to the attribute, or None
+        '''
+        uuid = self.uuid(node)
+        linked = self._messages.get(uuid, {}).get(name)
+        if linked is not None and linked[0].exists():
+            return linked[0]
+
+        connections = pmc.listConnections(node.attr(name))
+        if not connections:
+            return None
+
+        linked = (connections[0], self.uuid(connections[0]))
+        self._messages.setdefault(uuid, {})[name] = linked
+        self._linkedFrom.setdefault(linked[1], set()).add((uuid, name))
+
+        return linked[0]
+
+    def forget(self, node, name):
+        '''
+        Drops the cached connection of a message attribute.
+        '''
+        self._drop(self.uuid(node), name)
+
+    def _drop(self, uuid, name):
+        linked = self._messages.get(uuid, {}).pop(name, None)
+        if linked is not None:
+            referrers = self._linkedFrom.get(linked[1], set())
+            referrers.discard((uuid, name))
+            if not referrers:
+                self._linkedFrom.pop(linked[1], None)
+
+    def evict(self, uuids):
+        '''
+        Drops deleted nodes, and every cached connection to them.
+        :param uuids: The UUIDs of the deleted nodes
+        '''
+        for uuid in uuids:
+            node = self._handles.pop(uuid, None)
+            if node is not None:
+                self._uuids.pop(node, None)
+            for name in self._namesOf.pop(uuid, ()):
+                if self._names.get(name) is node:
+                    del self._names[name]
+            for name in list(self._messages.get(uuid, ())):
+                self._drop(uuid, name)
+            self._messages.pop(uuid, None)
+            for key in list(self._linkedFrom.pop(uuid, ())):
+                self._drop(*key)
+
+    def clear(self):
+        self._handles.clear()
+        self._uuids.clear()
+        self._names.clear()
+        self._namesOf.clear()
+        self._messages.clear()
+        self._linkedFrom.clear()
+
+
+class PymelBackend(object):
+    '''
+    Scene calls on PyNodes, the convenience layer the rest of the tool uses.
+    Nodes found by name or through message attributes come from a HandleCache.
+    '''
+
+    name = 'pymel'
+
+    def __init__(self):
+        self.handles = HandleCache()
+
+    ### Nodes ###
+
+    def node(self, obj):
+        if isinstance(obj, _STRING_TYPES):
+            return self.handles.get(obj)
+        return pmc.PyNode(obj)
+
+    def nodeName(self, node, stripNamespace=False):
+        return node.nodeName(stripNamespace=stripNamespace)
+
+    def nodeType(self, node):
+        return node.nodeType()
+
+    def getParent(self, node):
+        return node.getParent()
+
+    def getShapes(self, node):
+        return node.getShapes()
+
+    def listHierarchy(self, root, nodeType='joint'):
+        return [root] + pmc.listRelatives(root, allDescendents=True, type=nodeType)
+
+    def listNodesWithAttr(self, name):
+
+        # Only the matching nodes are wrapped
+        return [self.handles.get(obj) for obj in cmds.ls(dag=True, long=True)
+                if cmds.attributeQuery(name, node=obj, exists=True)]
+
+    def createNode(self, nodeType):
+        return pmc.createNode(nodeType)
+
+    def createControl(self, curveData, scale=1.0, color=(1, 1, 0)):
+        node = controltools.create_control_curve_from_data(curveData)
+        controltools.scale_curve(scale, scale, scale, node)
+
+        for shape in node.getShapes():
+            pmc.setAttr(shape.overrideColorRGB, dt.Color(*color))
+            pmc.setAttr(shape.overrideRGBColors, True)
+            pmc.setAttr(shape.overrideEnabled, True)
+
+        return node
+
+    def moveShapes(self, source, node):
+        controltools.freeze_transforms(source)
+        for shape in source.getShapes():
+            pmc.parent(shape, node, shape=True, r=True)
+        pmc.delete(source)
+
+    def rename(self, node, name):
+        return pmc.rename(node, name)
+
+    def parent(self, node, parent=None):
+        if parent is not None:
+            pmc.parent(node, parent)
+        else:
+            pmc.parent(node, world=True)
+
+    def delete(self, nodes):
+        if not isinstance(nodes, (list, tuple)):
+            nodes = [nodes]
+
+        # Everything below the nodes goes with them
+        names = [node.longName() for node in nodes]
+        below = cmds.listRelatives(names, allDescendents=True, fullPath=True) or []
+        uuids = [self.handles.uuid(node) for node in nodes] + (cmds.ls(below, uuid=True) if below else [])
+
+        pmc.delete(nodes)
+        self.handles.evict(uuids)
+
+    ### Attributes ###
+
+    def hasAttr(self, node, name):
+        return pmc.hasAttr(node, name, checkShape=False)
+
+    def getMessage(self, node, name):
+        return self.handles.getMessage(node, name)
+
+    def addAttr(self, node, name, attrType, default=None):
+        if attrType == 'string':
+            pmc.addAttr(node, ln=name, dt=attrType)
+        elif default is not None:
+            pmc.addAttr(node, ln=name, at=attrType, dv=default)
+        else:
+            pmc.addAttr(node, ln=name, at=attrType)
+
+    def deleteAttr(self, node, name):
+        pmc.deleteAttr(node.attr(name))
+        self.handles.forget(node, name)
+
+    def getAttr(self, node, name):
+        return pmc.getAttr(node.attr(name))
+
+    def isSettable(self, node, name):
+        return pmc.getAttr(node.attr(name), settable=True)
+
+    def setAttr(self, node, name, value):
+        if isinstance(value, _STRING_TYPES):
+            pmc.setAttr(node.attr(name), value, type='string')
+        else:
+            pmc.setAttr(node.attr(name), value)
+
+    def lockAttr(self, node, name):
+        pmc.setAttr(node.attr(name), channelBox=False, keyable=False, lock=True)
+
+    def connectAttr(self, source, sourceName, destination, destinationName):
+        pmc.connectAttr(source.attr(sourceName), destination.attr(destinationName))
+
+    def listConnections(self, node, name, source=True, destination=True, nodeType=None):
+        return pmc.listConnections(node.attr(name), source=source, destination=destination, type=nodeType)
+
+    def plug(self, node, name):
+        return node.attr(name)
+
+    ### Transforms ###
+
+    def getMatrices(self, nodes, worldSpace=True):
+        if worldSpace:
+            return [pmc.xform(node, q=True, ws=True, m=True) for node in nodes]
+        return [pmc.xform(node, q=True, os=True, m=True) for node in nodes]
+
+    def matchTranslation(self, node, target):
+        node.setTranslation(target.getTranslation(worldSpace=True), worldSpace=True)
+
+    def matchRotation(self, node, target):
+
+        # Extract the target's world rotation in the node's own rotate order
+        rotation = tm.removeScale(tm.flatToMatrix(pmc.xform(target, q=True, ws=True, m=True)))
+        euler = tm.matrixToEuler(rotation, pmc.getAttr(node.rotateOrder))
+        pmc.xform(node, ws=True, ro=np.degrees(euler).tolist())
+
+    def freeze(self, node, translate=False, rotate=False):
+        pmc.makeIdentity(node, translate=translate, rotate=rotate, apply=True)
+
+    def constrain(self, kind, driver, driven, maintainOffset=True):
+        return getattr(pmc, kind + 'Constraint')(driver, driven, mo=maintainOffset)
+
+    def constraintTargets(self, constraint, kind):
+        return getattr(pmc, kind + 'Constraint')(constraint, q=True, targetList=True)
+
+    ### Animation ###
+
+    def getTime(self):
+        return pmc.currentTime(q=True)
+
+    def setTime(self, time):
+        pmc.currentTime(time, update=True)
+
+    def getAnimCurve(self, node, name, curveType):
+        attr = node.attr(name)
+
+        # Reuse a curve already driving the attribute
+        curves = pmc.listConnections(attr, source=True, destination=False, type='animCurve')
+        if curves:
+            return curves[0]
+
+        # Otherwise create one, replacing any constraint connection
+        curve = pmc.createNode(curveType, name=attr.nodeName() + '_' + attr.longName())
+        pmc.connectAttr(curve.output, attr, force=True)
+
+        return curve
+
+    def keyTimes(self, nodes):
+        return pmc.keyframe(nodes, q=True, timeChange=True) or []
+
+    def keyData(self, nodes):
+        # The times, values and tangent angles of every key, each as one flat list
+        keys = pmc.keyframe(nodes, q=True, timeChange=True, valueChange=True) or []
+        return ([value for key in keys for value in key],
+                pmc.keyTangent(nodes, q=True, inAngle=True) or [],
+                pmc.keyTangent(nodes, q=True, outAngle=True) or [])
+
+    def addKeys(self, curve, times, values, tangentType='linear'):
+        curve.addKeys(times, values, tangentInType=tangentType, tangentOutType=tangentType, keepExistingKeys=True)
+
+    def bake(self, plugs, start, end):
+        pmc.bakeResults(plugs, t=(start, end), simulation=True)
+
+    ### Evaluation ###
+
+    def listUpstream(self, nodes):
+
+        # History only follows connections, so the parents of everything found are followed too
+        found = set()
+        pending = list(nodes)
+        while pending:
+            history = [node for node in pmc.listHistory(pending) if node not in found]
+            found.update(history)
+            parents = [node.getParent() for node in pmc.ls(history, dag=True)] if history else []
+            pending = [parent for parent in parents if parent is not None and parent not in found]
+
+        return found
+
+    def listTimeDriven(self):
+
+        # Anim curves play against time without being connected to it, anything else is connected
+        nodes = pmc.ls(type='animCurve')
+        for node in pmc.ls(type='time'):
+            nodes += pmc.listConnections(node, source=False, destination=True)
+
+        return nodes
+
+    def suspendRefresh(self, suspend):
+        pmc.refresh(suspend=suspend)
+
+
+class CmdsBackend(object):
+    '''
+    Scene calls on plain string names through maya.cmds.
+    Names are kept as maya.cmds returns them, so they must stay unique in the scene.
+    '''
+
+    name = 'cmds'
+
+    ### Nodes ###
+
+    def node(self, obj):
+        return str(obj)
+
+    def nodeName(self, node, stripNamespace=False):
+        name = node.split('|')[-1]
+        return name.split(':')[-1] if stripNamespace else name
+
+    def nodeType(self, node):
+        return cmds.nodeType(node)
+
+    def getParent(self, node):
+        parents = cmds.listRelatives(node, parent=True)
+        return parents[0] if parents else None
+
+    def getShapes(self, node):
+        return cmds.listRelatives(node, shapes=True) or []
+
+    def listHierarchy(self, root, nodeType='joint'):
+        return [root] + (cmds.listRelatives(root, allDescendents=True, type=nodeType) or [])
+
+    def listNodesWithAttr(self, name):
+        return [obj for obj in cmds.ls(dag=True) if cmds.attributeQuery(name, node=obj, exists=True)]
+
+    def createNode(self, nodeType):
+        return cmds.createNode(nodeType)
+
+    def createControl(self, curveData, scale=1.0, color=(1, 1, 0)):
+        node = cmds.group(empty=True)
+
+        # The size goes straight into the points, so there is nothing to scale or freeze
+        for data in curveData:
+            points = (np.asarray(data['cvs'], dtype=float) * scale).tolist()
+            curve = cmds.curve(p=points, k=data['knots'], d=data['degree'])
+            shape = cmds.listRelatives(curve, shapes=True)[0]
+
+            cmds.setAttr(shape + '.overrideColorRGB', *color)
+            cmds.setAttr(shape + '.overrideRGBColors', True)
+            cmds.setAttr(shape + '.overrideEnabled', True)
+
+            cmds.parent(shape, node, shape=True, relative=True)
+            cmds.delete(curve)
+
+        return node
+
+    def moveShapes(self, source, node):
+        cmds.makeIdentity(source, apply=True, translate=True, rotate=True, scale=True)
+        for shape in self.getShapes(source):
+            cmds.parent(shape, node, shape=True, relative=True)
+        cmds.delete(source)
+
+    def rename(self, node, name):
+        return cmds.rename(node, name)
+
+    def parent(self, node, parent=None):
+        if parent is not None:
+            cmds.parent(node, parent)
+        else:
+            cmds.parent(node, world=True)
+
+    def delete(self, nodes):
+        cmds.delete(nodes)
+
+    ### Attributes ###
+
+    def hasAttr(self, node, name):
+        return cmds.attributeQuery(name, node=node, exists=True)
+
+    def getMessage(self, node, name):
+        connections = cmds.listConnections(node + '.' + name)
+        return connections[0] if connections else None
+
+    def addAttr(self, node, name, attrType, default=None):
+        if attrType == 'string':
+            cmds.addAttr(node, ln=name, dt=attrType)
+        elif default is not None:
+            cmds.addAttr(node, ln=name, at=attrType, dv=default)
+        else:
+            cmds.addAttr(node, ln=name, at=attrType)
+
+    def deleteAttr(self, node, name):
+        cmds.deleteAttr(node + '.' + name)
+
+    def getAttr(self, node, name):
+
+        # Compound attributes come back as a single tuple in a list
+        value = cmds.getAttr(node + '.' + name)
+        if isinstance(value, list) and len(value) == 1 and isinstance(value[0], tuple):
+            return value[0]
+
+        return value
+
+    def isSettable(self, node, name):
+        return cmds.getAttr(node + '.' + name, settable=True)
+
+    def setAttr(self, node, name, value):
+        if isinstance(value, _STRING_TYPES):
+            cmds.setAttr(node + '.' + name, value, type='string')
+        elif isinstance(value, (list, tuple)):
+            # Compound attributes take one argument per child
+            cmds.setAttr(node + '.' + name, *value)
+        else:
+            cmds.setAttr(node + '.' + name, value)
+
+    def lockAttr(self, node, name):
+        cmds.setAttr(node + '.' + name, channelBox=False, keyable=False, lock=True)
+
+    def connectAttr(self, source, sourceName, destination, destinationName):
+        cmds.connectAttr(source + '.' + sourceName, destination + '.' + destinationName)
+
+    def listConnections(self, node, name, source=True, destination=True, nodeType=None):
+        if nodeType is not None:
+            return cmds.listConnections(node + '.' + name, source=source, destination=destination, type=nodeType) or []
+        return cmds.listConnections(node + '.' + name, source=source, destination=destination) or []
+
+    def plug(self, node, name):
+        return node + '.' + name
+
+    ### Transforms ###
+
+    def getMatrices(self, nodes, worldSpace=True):
+        if worldSpace:
+            return [cmds.xform(node, q=True, ws=True, m=True) for node in nodes]
+        return [cmds.xform(node, q=True, os=True, m=True) for node in nodes]
+
+    def matchTranslation(self, node, target):
+        cmds.xform(node, ws=True, t=cmds.xform(target, q=True, ws=True, t=True))
+
+    def matchRotation(self, node, target):
+
+        # Extract the target's world rotation in the node's own rotate order
+        rotation = tm.removeScale(tm.flatToMatrix(cmds.xform(target, q=True, ws=True, m=True)))
+        euler = tm.matrixToEuler(rotation, cmds.getAttr(node + '.rotateOrder'))
+        cmds.xform(node, ws=True, ro=np.degrees(euler).tolist())
+
+    def freeze(self, node, translate=False, rotate=False):
+        cmds.makeIdentity(node, translate=translate, rotate=rotate, apply=True)
+
+    def constrain(self, kind, driver, driven, maintainOffset=True):
+        return getattr(cmds, kind + 'Constraint')(driver, driven, mo=maintainOffset)[0]
+
+    def constraintTargets(self, constraint, kind):
+        return getattr(cmds, kind + 'Constraint')(constraint, q=True, targetList=True)
+
+    ### Animation ###
+
+    def getTime(self):
+        return cmds.currentTime(q=True)
+
+    def setTime(self, time):
+        cmds.currentTime(time, update=True)
+
+    def getAnimCurve(self, node, name, curveType):
+        plug = node + '.' + name
+
+        # Reuse a curve already driving the attribute
+        curves = cmds.listConnections(plug, source=True, destination=False, type='animCurve')
+        if curves:
+            return curves[0]
+
+        # Otherwise create one, replacing any constraint connection
+        curve = cmds.createNode(curveType, name=self.nodeName(node) + '_' + name)
+        cmds.connectAttr(curve + '.output', plug, force=True)
+
+        return curve
+
+    def keyTimes(self, nodes):
+        return cmds.keyframe(nodes, q=True, timeChange=True) or []
+
+    def keyData(self, nodes):
+        # The times, values and tangent angles of every key, each as one flat list
+        return (cmds.keyframe(nodes, q=True, timeChange=True, valueChange=True) or [],
+                cmds.keyTangent(nodes, q=True, inAngle=True) or [],
+                cmds.keyTangent(nodes, q=True, outAngle=True) or [])
+
+    def addKeys(self, curve, times, values, tangentType='linear'):
+
+        # Angles are given in radians, the keys are set in degrees
+        if cmds.nodeType(curve) == 'animCurveTA':
+            values = np.degrees(values)
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+
+        # Keys landing among existing ones are set one at a time so they stay in order
+        count = cmds.getAttr(curve + '.keyTimeValue', size=True)
+        if count and cmds.findKeyframe(curve, which='last') >= times[0]:
+            for time, value in zip(times.tolist(), values.tolist()):
+                cmds.setKeyframe(curve, time=time, value=value)
+
+        # Otherwise the whole block is appended with a single setAttr
+        else:
+            keys = np.column_stack([times, values]).ravel().tolist()
+            cmds.setAttr('%s.keyTimeValue[%d:%d]' % (curve, count, count + len(times) - 1), *keys, size=len(times))
+
+        cmds.keyTangent(curve, inTangentType=tangentType, outTangentType=tangentType)
+
+    def bake(self, plugs, start, end):
+        cmds.bakeResults(plugs, t=(start, end), simulation=True)
+
+    ### Evaluation ###
+
+    def listUpstream(self, nodes):
+
+        # History only follows connections, so the parents of everything found are followed too
+        found = set()
+        pending = list(nodes)
+        while pending:
+            history = [node for node in cmds.listHistory(pending) or [] if node not in found]
+            found.update(history)
+            dag = cmds.ls(history, dag=True) if history else []
+            parents = (cmds.listRelatives(dag, parent=True) or []) if dag else []
+            pending = [parent for parent in parents if parent not in found]
+
+        return found
+
+    def listTimeDriven(self):
+
+        # Anim curves play against time without being connected to it, anything else is connected
+        nodes = cmds.ls(type='animCurve') or []
+        for node in cmds.ls(type='time') or []:
+            nodes += cmds.listConnections(node, source=False, destination=True) or []
+
+        return nodes
+
+    def suspendRefresh(self, suspend):
+        cmds.refresh(suspend=suspend)
+
+
+BACKENDS = {PymelBackend.name: PymelBackend, CmdsBackend.name: CmdsBackend}
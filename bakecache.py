@@ -0,0 +1,149 @@
+'''
+A content addressed cache of solved bakes on local disk.
+
+Each entry is a set of arrays stored under a hash of everything that went into
+the solve, so a bake whose inputs have not changed loads its result instead of
+solving again. The cache is bounded in size, and the least recently used
+entries are evicted first. Loading an entry counts as using it.
+
+Entries are folders of .npy files, loaded as memory maps, so a cached bake of
+any length can be read back a window at a time without holding it in memory.
+'''
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+
+def _hashParts(digest, parts):
+
+    # Arrays hash by dtype, shape and bytes, nested lists recurse, anything else by its repr
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(('%s%r' % (part.dtype.str, part.shape)).encode('utf-8'))
+            digest.update(part.tobytes())
+        elif isinstance(part, (list, tuple)):
+            digest.update(('[%d' % len(part)).encode('utf-8'))
+            _hashParts(digest, part)
+        else:
+            digest.update(repr(part).encode('utf-8'))
+
+
+class BakeCache(object):
+    '''
+    Solved bakes stored as folders of .npy files, keyed by a hash of their inputs.
+    '''
+
+    def __init__(self, folder=None, maxBytes=1 << 30):
+        '''
+        :param folder: Where entries are stored, a retargeter folder in the system temp folder if None
+        :param maxBytes: The most bytes the entries may use before the least recently used are evicted
+        '''
+        self.folder = folder or os.path.join(tempfile.gettempdir(), 'retargeterBakeCache')
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+    @staticmethod
+    def key(*parts):
+        '''
+        Hashes the inputs of a bake.
+        :param parts: Arrays, numbers, strings, or lists of them
+        :return: The hex digest used as the entry's key
+        '''
+        digest = hashlib.sha1()
+        _hashParts(digest, parts)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key)
+
+    def _entries(self):
+
+        # Entries still being written end in .tmp
+        paths = [os.path.join(self.folder, name) for name in os.listdir(self.folder) if not name.endswith('.tmp')]
+        return [(os.path.getmtime(path), sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)),
+                 path) for path in paths if os.path.isdir(path)]
+
+    @property
+    def size(self):
+        '''The bytes used by every entry.'''
+        return sum(size for used, size, path in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def load(self, key, names=None):
+        '''
+        :param key: The entry's key
+        :param names: The names of the arrays the entry must hold, any entry with arrays is enough if None
+        :return: A dict of the entry's arrays as read only memory maps, or None if there is no such entry,
+                 or it is missing any of the arrays
+        '''
+        path = self._path(key)
+        try:
+            arrays = dict((name[:-4], np.load(os.path.join(path, name), mmap_mode='r'))
+                          for name in os.listdir(path) if name.endswith('.npy'))
+        except (IOError, OSError, ValueError):
+            # Missing, or damaged on disk
+            arrays = {}
+
+        # An entry left empty or partial by something other than store is no use either
+        if not arrays or any(name not in arrays for name in names or ()):
+            self.misses += 1
+            return None
+
+        # The modified time records when the entry was last used
+        os.utime(path, None)
+        self.hits += 1
+        return arrays
+
+    def store(self, key, **arrays):
+        '''
+        Stores an entry, then evicts the least recently used entries until the cache fits.
+        :param key: The entry's key
+        :param arrays: The named arrays to store
+        '''
+        # Write beside the entry and move it into place, so readers never see part of one
+        temp = tempfile.mkdtemp(suffix='.tmp', dir=self.folder)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(temp, name + '.npy'), array)
+            if os.path.exists(self._path(key)):
+                shutil.rmtree(self._path(key), ignore_errors=True)
+            os.rename(temp, self._path(key))
+        finally:
+            if os.path.exists(temp):
+                shutil.rmtree(temp, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self, maxBytes=None):
+        '''
+        Removes the least recently used entries until the cache fits.
+        :param maxBytes: The size to fit in, the cache's own limit if None
+        '''
+        maxBytes = self.maxBytes if maxBytes is None else maxBytes
+        entries = sorted(self._entries())
+        total = sum(size for used, size, path in entries)
+
+        for used, size, path in entries:
+            if total <= maxBytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        '''
+        Removes every entry.
+        '''
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder)
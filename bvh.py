@@ -0,0 +1,234 @@
+import numpy as np
+import transformmath as tm
+import solver
+
+# The rates mocap is captured and played at, which rounded frame times are snapped back to
+STANDARD_RATES = (23.976, 24.0, 25.0, 29.97, 30.0, 48.0, 50.0, 59.94, 60.0, 72.0, 90.0, 100.0, 119.88, 120.0,
+                  150.0, 180.0, 200.0, 240.0, 250.0, 360.0, 480.0)
+
+
+def frameRate(frameTime, digits=None):
+    '''
+    The frames per second a BVH frame time stands for. Files store the frame time rounded, so
+    0.008333 would otherwise read as 120.0048 fps and drift against the real timing.
+    :param frameTime: The seconds per frame
+    :param digits: The number of decimal places the frame time was written with, if known
+    :return: The standard rate the frame time rounds from, or the rate rounded to three places
+    '''
+    # Anything within half of the last written digit could have been rounded to the frame time
+    tolerance = 0.5 * 10 ** -digits if digits is not None else 1e-6
+    rate = min(STANDARD_RATES, key=lambda rate: abs(1.0 / rate - frameTime))
+    if abs(1.0 / rate - frameTime) <= tolerance * (1 + 1e-9):
+        return rate
+
+    return round(1.0 / frameTime, 3)
+
+
+class BVHJoint(object):
+    '''
+    A joint in a BVH hierarchy.
+    '''
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.offset = np.zeros(3)
+        self.channels = []
+        self.channelIndex = 0
+
+    @property
+    def rotateOrder(self):
+        '''
+        The Maya rotate order matching this joint's rotation channels.
+        BVH lists rotations outermost first, Maya lists them innermost first.
+        '''
+        axes = [c[0].lower() for c in self.channels if c.endswith('rotation')]
+        return ''.join(reversed(axes)) if len(axes) == 3 else 'xyz'
+
+
+class BVHReader(object):
+    '''
+    Reads a BVH file, parsing the hierarchy up front and streaming the motion.
+    Frames are never all held in memory, they are read in fixed size blocks.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.joints = []
+        self.channelCount = 0
+        self.frameCount = 0
+        self.frameTime = 0.0
+        self.frameRate = 0.0
+        self._motionOffset = 0
+
+        self._parseHeader()
+        self._hierarchy = solver.ForwardKinematics([joint.parent for joint in self.joints])
+
+    def _parseHeader(self):
+
+        with open(self.path, 'rb') as f:
+
+            stack = []
+            joint = None
+
+            while True:
+                line = f.readline()
+                if not line:
+                    raise ValueError('No MOTION section in %s' % self.path)
+
+                tokens = line.decode('ascii').split()
+                if not tokens:
+                    continue
+
+                key = tokens[0].upper()
+
+                if key in ('ROOT', 'JOINT'):
+                    parent = stack[-1] if stack else -1
+                    joint = BVHJoint(tokens[1], parent)
+                    self.joints.append(joint)
+
+                elif key == 'END':
+                    # End sites carry no channels, track them so braces stay balanced
+                    joint = None
+
+                elif key == '{':
+                    stack.append(len(self.joints) - 1 if joint is not None else None)
+
+                elif key == '}':
+                    stack.pop()
+
+                elif key == 'OFFSET' and joint is not None:
+                    joint.offset = np.array([float(v) for v in tokens[1:4]])
+
+                elif key == 'CHANNELS':
+                    joint.channelIndex = self.channelCount
+                    joint.channels = tokens[2:2 + int(tokens[1])]
+                    self.channelCount += len(joint.channels)
+
+                elif key == 'FRAMES:':
+                    self.frameCount = int(tokens[1])
+
+                elif key == 'FRAME' and tokens[1].upper() == 'TIME:':
+                    self.frameTime = float(tokens[2])
+                    digits = len(tokens[2].split('.')[1]) if '.' in tokens[2] and 'e' not in tokens[2].lower() else None
+                    self.frameRate = frameRate(self.frameTime, digits)
+                    self._motionOffset = f.tell()
+                    break
+
+    @property
+    def jointNames(self):
+        return [joint.name for joint in self.joints]
+
+    def iterBlocks(self, blockSize=1024):
+        '''
+        Yields the motion data in blocks of frames.
+        :param blockSize: The number of frames per block
+        :return: A generator of (first frame index, (frames, channels) array) tuples
+        '''
+        with open(self.path, 'rb') as f:
+            f.seek(self._motionOffset)
+
+            frame = 0
+            while frame < self.frameCount:
+
+                lines = []
+                while len(lines) < blockSize and frame + len(lines) < self.frameCount:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        lines.append(line)
+
+                if not lines:
+                    break
+
+                block = np.array(b' '.join(lines).split(), dtype=float)
+                yield frame, block.reshape(len(lines), self.channelCount)
+
+                frame += len(lines)
+
+    def localMatrices(self, block):
+        '''
+        Builds the local matrices of every joint for a block of frames.
+        :param block: A (frames, channels) array from iterBlocks
+        :return: A (frames, joints, 4, 4) array of local matrices
+        '''
+        block = np.asarray(block, dtype=float)
+        local = tm.composeMatrix(shape=(len(block), len(self.joints)))
+
+        for i, joint in enumerate(self.joints):
+
+            local[:, i, 3, :3] = joint.offset
+            euler = np.zeros((len(block), 3))
+
+            for c, channel in enumerate(joint.channels):
+                values = block[:, joint.channelIndex + c]
+                axis = 'xyz'.index(channel[0].lower())
+
+                # Position channels replace the offset, rotations are in degrees
+                if channel.endswith('position'):
+                    local[:, i, 3, axis] = values
+                else:
+                    euler[:, axis] = np.radians(values)
+
+            local[:, i, :3, :3] = tm.eulerToMatrix(euler, joint.rotateOrder)
+
+        return local
+
+    def worldMatrices(self, block):
+        '''
+        Builds the world matrices of every joint for a block of frames.
+        :param block: A (frames, channels) array from iterBlocks
+        :return: A (frames, joints, 4, 4) array of world matrices
+        '''
+        return self._hierarchy.solve(self.localMatrices(block))
+
+    def readFrame(self, index):
+        '''
+        Reads a single frame of the motion.
+        :param index: The index of the frame
+        :return: A (channels,) array
+        '''
+        if not 0 <= index < self.frameCount:
+            raise IndexError('Frame %d is outside the %d frames of %s' % (index, self.frameCount, self.path))
+
+        # Stream up to the frame rather than reading the whole motion
+        for frame, block in self.iterBlocks():
+            if index < frame + len(block):
+                return block[index - frame]
+
+        raise IndexError('%s ends before frame %d' % (self.path, index))
+
+    def restMatrices(self, bindFrame=0):
+        '''
+        The world matrices of the rest pose, with every rotation at zero.
+        Position channels keep their values at the bind frame, since mocap usually leaves the root's
+        offset at zero and holds its height in them, so zeroing them would drop the root to the ground.
+        :param bindFrame: The index of the frame the positions are taken from
+        :return: A (joints, 4, 4) array of world matrices
+        '''
+        rest = np.zeros((1, self.channelCount))
+        if self.frameCount:
+            frame = self.readFrame(bindFrame)
+            for joint in self.joints:
+                for c, channel in enumerate(joint.channels):
+                    if channel.endswith('position'):
+                        rest[0, joint.channelIndex + c] = frame[joint.channelIndex + c]
+
+        return self.worldMatrices(rest)[0]
+
+
+def decodeToRing(path, ring, blockSize=1024):
+    '''
+    Decodes a BVH file into world matrices, writing each block of frames to a ring.
+    Meant to run in a process of its own, so decoding overlaps solving and keying.
+    The ring is only closed once the last block is written, so a failed decode is never
+    mistaken for the end of the file.
+    :param path: The path of the BVH file
+    :param ring: A framering.FrameRing of (blockSize, joints, 16) blocks
+    :param blockSize: The number of frames per block
+    '''
+    reader = BVHReader(path)
+    for frame, block in reader.iterBlocks(blockSize):
+        ring.write(reader.worldMatrices(block).reshape(len(block), len(reader.joints), 16))
+
+    ring.close()
@@ -1,7 +1,9 @@
 import os
 import json
+import numpy as np
 import pymel.core as pmc
 import pymel.core.datatypes as dt
+import transformmath as tm
 
 
 CONTROLFILENAME = os.path.join(os.environ['MAYA_APP_DIR'],'control_cache.json')
@@ -222,26 +224,42 @@ def move_to_transform(obj, target, upVector= dt.Vector(0,1,0)):
     :param target: The target transform
     :param upVector: The local up vector of the target
     '''
+    move_to_transforms([obj], [target], [list(upVector)])
 
-    # The world up vector
-    worldUp = dt.Vector(0, 1, 0)
 
-    # The Transformation matrix of the target in world space
-    if target:
-        targetSpace = target.getMatrix(worldSpace=True)
-    else:
-        targetSpace = dt.Matrix()
+def move_to_transforms(objs, targets, up_vectors=None):
+    '''
+    Moves many objects to many targets at once, like move_to_transform.
+    Every target is queried first, then all the transforms are aligned in one
+    pass and written back. Objects are written in the order given, so list
+    parents before their children.
+    :param objs: The obj transforms to be transformed
+    :param targets: The target transforms, one per object, None for the origin
+    :param up_vectors: The local up vectors of the targets, one per object or one for all
+    '''
+    count = len(objs)
+
+    # The world up vector, and each target's up vector
+    worldUp = np.array([0.0, 1.0, 0.0])
+    upVectors = np.broadcast_to(np.asarray(up_vectors if up_vectors is not None else worldUp, dtype=float), (count, 3))
+
+    # The Transformation matrices of the targets in world space
+    targetSpace = tm.composeMatrix(shape=(count,))
+    for i, target in enumerate(targets):
+        if target:
+            targetSpace[i] = tm.flatToMatrix(pmc.xform(target, q=True, ws=True, m=True))
 
-    # The input upVector transformed into target rotation space
-    targetUp = upVector.rotateBy(targetSpace)
+    # The up vectors transformed into target rotation space
+    targetUp = tm.rotateVectors(upVectors, targetSpace)
 
-    # Create a Quaternion  to represent the rotation
-    # From the object orientation to the target orientation
-    rotation = worldUp.rotateTo(targetUp)
+    # The rotations from the world up to each target's up
+    rotation = tm.quaternionToMatrix(tm.rotateBetween(worldUp, targetUp))
 
-    # Transform the object into the target space
-    obj.setMatrix(targetSpace, worldSpace=True)
-    obj.setRotation(rotation, space='world')
+    # Transform the objects into the target spaces, keeping the targets' scale
+    scale = np.linalg.norm(targetSpace[:, :3, :3], axis=-1)
+    matrices = tm.composeMatrix(scale[..., None] * rotation, targetSpace[:, 3, :3])
+    for obj, matrix in zip(objs, matrices):
+        pmc.xform(obj, ws=True, m=matrix.ravel().tolist())
 
 
 default_control = [Control(
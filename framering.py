@@ -0,0 +1,256 @@
+'''
+A ring buffer of frame blocks in shared memory, for passing frames between processes.
+
+The ring lives in a memory mapped file, so any process that opens the same path
+sees the same slots, and frames are written and read in place with no pickling.
+Each slot holds a block of up to blockSize frames of joints x channels float64s.
+
+One process writes and one process reads. Every committed block gets the next
+sequence number, and the head and tail sequences in the header tell each side
+how far the other has got:
+
+    block        the writer waits for the reader when every slot is full
+    dropNewest   the writer discards blocks while every slot is full
+    dropOldest   the writer overwrites the oldest block, the reader skips ahead
+
+The ring is picklable, it pickles as its path and reopens on the other side.
+'''
+import os
+import time
+import numpy as np
+
+_MAGIC = 0x52494e47
+_FIELDS = ('magic', 'slots', 'blockSize', 'joints', 'channels', 'policy', 'head', 'tail', 'dropped', 'closed')
+_POLICIES = ('block', 'dropNewest', 'dropOldest')
+
+
+class FrameRing(object):
+    '''
+    A single writer, single reader ring of frame blocks in a memory mapped file.
+    '''
+
+    def __init__(self, path):
+        '''
+        Opens a ring made by create.
+        :param path: The ring's file
+        '''
+        self.path = path
+
+        header = np.memmap(path, dtype='<i8', mode='r', shape=(len(_FIELDS),))
+        if header[0] != _MAGIC:
+            raise ValueError('%s is not a frame ring' % path)
+        slots, blockSize, joints, channels, policy = [int(v) for v in header[1:6]]
+        del header
+
+        self.slots = slots
+        self.blockSize = blockSize
+        self.shape = (blockSize, joints, channels)
+        self.policy = _POLICIES[policy]
+
+        # The header is followed by the sequence and frame count of each slot, then the slots
+        size = len(_FIELDS) + 2 * slots
+        self._header = np.memmap(path, dtype='<i8', mode='r+', shape=(size,))
+        self._sequences = self._header[len(_FIELDS):len(_FIELDS) + slots]
+        self._counts = self._header[len(_FIELDS) + slots:]
+        self._data = np.memmap(path, dtype='<f8', mode='r+', offset=size * 8, shape=(slots,) + self.shape)
+
+    @classmethod
+    def create(cls, path, slots, blockSize, joints, channels, policy='block'):
+        '''
+        Makes a new ring, replacing any file at the path.
+        :param path: The ring's file
+        :param slots: The number of blocks held at once
+        :param blockSize: The most frames in a block
+        :param joints: The joints in each frame
+        :param channels: The values per joint, such as 16 for a matrix or 4 for a quaternion
+        :param policy: What the writer does when every slot is full, one of block, dropNewest or dropOldest
+        :return: The new ring
+        '''
+        if policy not in _POLICIES:
+            raise ValueError('Unknown policy %s, expected one of %s' % (policy, ', '.join(_POLICIES)))
+
+        header = np.zeros(len(_FIELDS) + 2 * slots, dtype='<i8')
+        header[:6] = [_MAGIC, slots, blockSize, joints, channels, _POLICIES.index(policy)]
+        header[len(_FIELDS):len(_FIELDS) + slots] = -1
+
+        # Size the file up front so every process maps the same length
+        with open(path, 'wb') as f:
+            f.write(header.tobytes())
+            f.truncate(header.nbytes + slots * blockSize * joints * channels * 8)
+
+        return cls(path)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def _field(self, name):
+        return int(self._header[_FIELDS.index(name)])
+
+    def _setField(self, name, value):
+        self._header[_FIELDS.index(name)] = value
+
+    @property
+    def head(self):
+        '''The sequence number the next block written will get.'''
+        return self._field('head')
+
+    @property
+    def tail(self):
+        '''The sequence number of the next block to be read.'''
+        return self._field('tail')
+
+    @property
+    def dropped(self):
+        '''The number of blocks discarded or overwritten before they were read.'''
+        return self._field('dropped')
+
+    @property
+    def closed(self):
+        '''Whether the writer has finished, the reader still drains what is left.'''
+        return bool(self._field('closed'))
+
+    def __len__(self):
+        return max(0, self.head - max(self.tail, self.head - self.slots))
+
+    ### Writing ###
+
+    def reserve(self, timeout=None):
+        '''
+        Waits for a free slot and returns it, to be filled in place then committed.
+        :param timeout: The most seconds to wait when blocking, forever if None
+        :return: A writable (blockSize, joints, channels) view, or None if there is no room
+        '''
+        head = self.head
+        if head - self.tail >= self.slots:
+
+            if self.policy == 'dropNewest':
+                self._setField('dropped', self.dropped + 1)
+                return None
+
+            if self.policy == 'block' and not _wait(lambda: head - self.tail < self.slots, timeout):
+                return None
+
+        # Mark the slot as being written, so a reader that lapped it can tell
+        slot = head % self.slots
+        self._sequences[slot] = -1
+        return self._data[slot]
+
+    def commit(self, count=None):
+        '''
+        Publishes the block filled after reserve.
+        :param count: The number of frames filled, the whole block if None
+        '''
+        head = self.head
+        slot = head % self.slots
+
+        # The reader trusts a slot once its sequence is set, so the data and count go first
+        self._counts[slot] = self.blockSize if count is None else count
+        self._sequences[slot] = head
+
+        # Overwriting the oldest block loses it, unless the reader got to it first
+        if self.policy == 'dropOldest' and head - self.tail >= self.slots:
+            self._setField('dropped', self.dropped + 1)
+
+        self._setField('head', head + 1)
+
+    def write(self, frames, timeout=None):
+        '''
+        Copies a block of frames into the ring.
+        :param frames: A (frames, joints, channels) array, at most blockSize frames
+        :param timeout: The most seconds to wait when blocking, forever if None
+        :return: Whether the block was written
+        '''
+        frames = np.asarray(frames, dtype=float)
+        slot = self.reserve(timeout)
+        if slot is None:
+            return False
+
+        slot[:len(frames)] = frames.reshape((len(frames),) + self.shape[1:])
+        self.commit(len(frames))
+        return True
+
+    def close(self):
+        '''
+        Marks the end of the stream, once the reader drains the ring it stops.
+        '''
+        self._setField('closed', 1)
+
+    ### Reading ###
+
+    def peek(self, timeout=None):
+        '''
+        Waits for the next block and returns it in place, without releasing its slot.
+        The view is only valid until release, and under dropOldest until the writer laps it.
+        :param timeout: The most seconds to wait, forever if None
+        :return: The block's sequence number and a (frames, joints, channels) view,
+                 or None if nothing arrived or the ring is closed and empty
+        '''
+        if not _wait(lambda: self.head > self.tail or self.closed, timeout) or self.head <= self.tail:
+            return None
+
+        # Skip any blocks the writer has already overwritten
+        tail = self.tail
+        if self.head - tail > self.slots:
+            tail = self.head - self.slots
+            self._setField('tail', tail)
+
+        slot = tail % self.slots
+        return tail, self._data[slot, :int(self._counts[slot])]
+
+    def release(self):
+        '''
+        Frees the slot of the block returned by peek.
+        '''
+        self._setField('tail', self.tail + 1)
+
+    def read(self, timeout=None):
+        '''
+        Waits for the next block and copies it out of the ring.
+        :param timeout: The most seconds to wait, forever if None
+        :return: The block's sequence number and a (frames, joints, channels) array,
+                 or None if nothing arrived or the ring is closed and empty
+        '''
+        while True:
+            block = self.peek(timeout)
+            if block is None:
+                return None
+
+            sequence, frames = block
+            frames = np.array(frames)
+
+            # A block the writer started overwriting while it was copied is lost
+            if self._sequences[sequence % self.slots] == sequence:
+                self.release()
+                return sequence, frames
+
+    def __iter__(self):
+        '''
+        Reads blocks until the writer closes the ring.
+        '''
+        while True:
+            block = self.read()
+            if block is None:
+                return
+            yield block
+
+    def unlink(self):
+        '''
+        Removes the ring's file, once both sides are done with it.
+        '''
+        del self._header, self._sequences, self._counts, self._data
+        os.remove(self.path)
+
+
+def _wait(condition, timeout=None, interval=0.0005):
+
+    # Poll, there is no cheap cross process signal that works everywhere
+    end = None if timeout is None else time.time() + timeout
+    while not condition():
+        if end is not None and time.time() >= end:
+            return False
+        time.sleep(interval)
+
+    return True
@@ -0,0 +1,350 @@
+'''
+A local socket stream of joint rotations, for previewing retargets live.
+
+A stream starts with a header describing the skeleton, followed by fixed size
+frames. Each frame holds a sequence number, the time it was sent, the root
+position and an x, y, z, w quaternion per joint, all little endian:
+
+    b'RTS1', uint32 header length, JSON {"names", "parents", "offsets", "rate"}
+    uint32 sequence, float64 time, 3 float64 position, joints * 4 float64 rotation
+
+Frames have a fixed size so any number of them decode with a single frombuffer.
+'''
+import json
+import math
+import select
+import socket
+import struct
+import threading
+import time
+import collections
+import numpy as np
+import transformmath as tm
+import solver
+
+MAGIC = b'RTS1'
+
+
+def frameDtype(count):
+    '''
+    The packed layout of a single frame.
+    :param count: The number of joints in the stream
+    :return: A numpy structured dtype
+    '''
+    return np.dtype([('sequence', '<u4'), ('time', '<f8'), ('position', '<f8', (3,)), ('rotation', '<f8', (count, 4))])
+
+
+def encodeHeader(names, parents, offsets, rate):
+    '''
+    Packs the header sent before the first frame.
+    :param names: The joint names
+    :param parents: For each joint, the index of its parent, or -1 for roots
+    :param offsets: The (joints, 3) rest offsets from each joint's parent
+    :param rate: The frames sent per second
+    :return: The header bytes
+    '''
+    header = json.dumps({'names': list(names), 'parents': [int(p) for p in parents],
+                         'offsets': np.asarray(offsets, dtype=float).tolist(), 'rate': float(rate)})
+    header = header.encode('utf-8')
+    return MAGIC + struct.pack('<I', len(header)) + header
+
+
+def _receive(connection, size):
+
+    # Block until exactly size bytes have arrived
+    chunks = []
+    while size > 0:
+        chunk = connection.recv(size)
+        if not chunk:
+            raise IOError('The stream closed during its header')
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+class StreamStats(object):
+    '''
+    Latency and jitter of the frames published from a stream.
+    Latency runs from when a frame was sent to when its pose was published, and
+    jitter is the mean change in latency between consecutive published frames.
+    Only the most recent frames are kept, so long sessions use constant memory.
+    '''
+
+    def __init__(self, history=10000):
+        '''
+        :param history: The number of published frames kept
+        '''
+        self.sent = collections.deque(maxlen=history)
+        self.received = collections.deque(maxlen=history)
+        self.published = collections.deque(maxlen=history)
+        self.frames = 0
+        self.dropped = 0
+        self.skipped = 0
+        self._last = None
+
+    def add(self, sequence, sent, received, published, skipped=0):
+        '''
+        Records a published frame.
+        :param sequence: The frame's sequence number, gaps count as frames dropped by the stream
+        :param sent: When the frame was sent
+        :param received: When the frame was read from the socket
+        :param published: When the frame's pose was published
+        :param skipped: The number of older frames read alongside it and never published
+        '''
+        if self._last is not None and sequence > self._last + 1 + skipped:
+            self.dropped += sequence - self._last - 1 - skipped
+        self._last = sequence
+
+        self.frames += 1
+        self.skipped += skipped
+        self.sent.append(sent)
+        self.received.append(received)
+        self.published.append(published)
+
+    def summary(self):
+        '''
+        :return: A dict of frame counts, and latency and jitter in milliseconds
+        '''
+        sent = np.array(self.sent)
+        latency = (np.array(self.published) - sent) * 1000.0
+        transit = (np.array(self.received) - sent) * 1000.0
+
+        result = {'frames': self.frames, 'dropped': self.dropped, 'skipped': self.skipped}
+        if len(latency) == 0:
+            return result
+
+        result.update({'latencyMean': latency.mean(),
+                       'latencyP95': np.percentile(latency, 95),
+                       'latencyMax': latency.max(),
+                       'transitMean': transit.mean(),
+                       'jitter': np.abs(np.diff(latency)).mean() if len(latency) > 1 else 0.0})
+        return result
+
+
+class StreamReader(object):
+    '''
+    Reads a live stream, parsing the header on connection and frames as they arrive.
+    Reads never block once connected, they return whatever whole frames are waiting.
+    '''
+
+    def __init__(self, address, timeout=5.0):
+        '''
+        :param address: The (host, port) of the stream
+        :param timeout: The seconds to wait for the connection and header
+        '''
+        self._connection = socket.create_connection(address, timeout)
+        self._connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        if _receive(self._connection, len(MAGIC)) != MAGIC:
+            self._connection.close()
+            raise ValueError('%s:%d is not a joint stream' % tuple(address))
+
+        size = struct.unpack('<I', _receive(self._connection, 4))[0]
+        header = json.loads(_receive(self._connection, size).decode('utf-8'))
+        self._connection.settimeout(None)
+
+        self.jointNames = [str(name) for name in header['names']]
+        self.parents = np.array(header['parents'], dtype=int)
+        self.offsets = np.array(header['offsets'], dtype=float).reshape(-1, 3)
+        self.rate = header['rate']
+        self.dtype = frameDtype(len(self.jointNames))
+        self.closed = False
+
+        self._pending = b''
+        self._hierarchy = solver.ForwardKinematics(self.parents)
+        self._live = solver.ForwardKinematics(self.parents)
+        self._liveLocal = None
+
+    def read(self):
+        '''
+        Reads every whole frame waiting on the socket without blocking.
+        :return: A structured array of frames, oldest first, and the time they were read
+        '''
+        chunks = [self._pending]
+        while not self.closed and select.select([self._connection], [], [], 0)[0]:
+            chunk = self._connection.recv(65536)
+            if not chunk:
+                self.closed = True
+            chunks.append(chunk)
+        received = time.time()
+
+        # Hold on to any partial frame until the rest of it arrives
+        data = b''.join(chunks)
+        count = len(data) // self.dtype.itemsize
+        self._pending = data[count * self.dtype.itemsize:]
+
+        return np.frombuffer(data, dtype=self.dtype, count=count).copy(), received
+
+    def wait(self, timeout=None):
+        '''
+        Waits for data to arrive on the socket.
+        :param timeout: The most seconds to wait, forever if None
+        :return: Whether there is data to read
+        '''
+        if self.closed:
+            return False
+        return bool(select.select([self._connection], [], [], timeout)[0])
+
+    def close(self):
+        self.closed = True
+        self._connection.close()
+
+    def localMatrices(self, frames):
+        '''
+        Builds the local matrices of every joint for a block of frames.
+        :param frames: A structured array of frames from read
+        :return: A (frames, joints, 4, 4) array of local matrices
+        '''
+        local = tm.composeMatrix(tm.quaternionToMatrix(frames['rotation']),
+                                 np.broadcast_to(self.offsets, frames['rotation'].shape[:-1] + (3,)))
+
+        # The root position replaces the offset of the first joint
+        local[:, 0, 3, :3] = frames['position']
+        return local
+
+    def worldMatrices(self, frames):
+        '''
+        Builds the world matrices of every joint for a block of frames.
+        :param frames: A structured array of frames from read
+        :return: A (frames, joints, 4, 4) array of world matrices
+        '''
+        return self._hierarchy.solve(self.localMatrices(frames))
+
+    def updateWorldMatrices(self, frame):
+        '''
+        Builds the world matrices of every joint for the next frame of a live preview.
+        Only the joints whose local matrices changed since the last update are recomputed,
+        along with their descendants, the rest are kept from the frame before.
+        :param frame: A structured array holding a single frame from read
+        :return: A (1, joints, 4, 4) array of world matrices, reused by the next update
+        '''
+        local = self.localMatrices(frame)
+        if self._liveLocal is None:
+            self._live.setLocal(local)
+        else:
+            changed = np.flatnonzero(np.any(local[0] != self._liveLocal[0], axis=(-2, -1)))
+            if len(changed):
+                self._live.setLocal(local[:, changed], changed)
+        self._liveLocal = local
+
+        return self._live.getWorld()
+
+    def restMatrices(self):
+        '''
+        The world matrices of the rest pose, with every rotation at identity.
+        :return: A (joints, 4, 4) array of world matrices
+        '''
+        frames = np.zeros(1, dtype=self.dtype)
+        frames['rotation'][..., 3] = 1.0
+        frames['position'] = self.offsets[0]
+        return self.worldMatrices(frames)[0]
+
+
+class SimulatedSource(object):
+    '''
+    Serves a swinging skeleton on a local socket, standing in for a capture feed.
+    Frames are paced at the stream rate on a background thread, to a single client.
+    '''
+
+    def __init__(self, names, parents=None, offsets=None, rate=120.0, port=0, frames=None):
+        '''
+        :param names: The joint names
+        :param parents: For each joint, the index of its parent, a single chain if None
+        :param offsets: The (joints, 3) rest offsets, one unit up from the parent if None
+        :param rate: The frames sent per second
+        :param port: The port to serve on, any free port if 0
+        :param frames: The number of frames to send before closing, unlimited if None
+        '''
+        self.names = list(names)
+        self.parents = list(range(-1, len(self.names) - 1)) if parents is None else list(parents)
+        self.offsets = np.tile([0.0, 1.0, 0.0], (len(self.names), 1)) if offsets is None else np.asarray(offsets, dtype=float)
+        self.rate = float(rate)
+        self.frames = frames
+        self.sent = 0
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', port))
+        self._server.listen(1)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.getsockname()
+
+    def pose(self, sequence):
+        '''
+        The pose sent as a given frame.
+        :param sequence: The frame's sequence number
+        :return: The (3,) root position and (joints, 4) rotations
+        '''
+        seconds = sequence / self.rate
+        phases = np.arange(len(self.names)) * 0.5
+
+        # Every joint swings about x and z, a little out of step with its parent
+        euler = np.zeros((len(self.names), 3))
+        euler[:, 0] = 0.5 * np.sin(2.0 * math.pi * 0.5 * seconds + phases)
+        euler[:, 2] = 0.25 * np.sin(2.0 * math.pi * 0.3 * seconds + phases)
+
+        position = self.offsets[0] + [math.sin(seconds), 0.0, 0.0]
+        return position, tm.eulerToQuaternion(euler)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._server.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _serve(self):
+
+        # Wake up now and then to check whether we've been stopped
+        self._server.settimeout(0.1)
+        while not self._stop.is_set():
+            try:
+                connection = self._server.accept()[0]
+                break
+            except socket.timeout:
+                continue
+        else:
+            return
+
+        connection.settimeout(None)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        frame = np.zeros(1, dtype=frameDtype(len(self.names)))
+
+        try:
+            connection.sendall(encodeHeader(self.names, self.parents, self.offsets, self.rate))
+
+            # Pace frames against the start time so sleep errors don't accumulate
+            start = time.time()
+            while not self._stop.is_set() and (self.frames is None or self.sent < self.frames):
+                delay = start + self.sent / self.rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+                frame['sequence'] = self.sent
+                frame['position'], frame['rotation'] = self.pose(self.sent)
+                frame['time'] = time.time()
+                connection.sendall(frame.tobytes())
+                self.sent += 1
+
+        except socket.error:
+            # The reader went away
+            pass
+
+        finally:
+            connection.close()
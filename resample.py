@@ -0,0 +1,113 @@
+'''
+Resamples streamed animation from one frame rate to another, before it is solved.
+
+Mocap often arrives at a higher rate than the targets play at. Rather than solving
+every source frame and decimating the keys afterwards, each output frame is blended
+from the two source frames around it, slerping rotations and interpolating
+translations. An optional retime curve maps output time onto source time, for
+speed ramps and holds.
+
+Blocks are pushed in order as they are decoded, and the last source frame of each
+block is kept so output frames can fall between blocks.
+'''
+import numpy as np
+import transformmath as tm
+
+# How close, in frames, a time must be to a frame to count as on it, covering rates read from rounded frame times
+FRAME_TOLERANCE = 1e-3
+
+
+def retimeKeys(keys):
+    '''
+    Checks a retime curve given as keys.
+    :param keys: A list of (output seconds, source seconds) pairs
+    :return: The (n, 2) array of keys, sorted by output time
+    '''
+    keys = np.array(keys, dtype=float).reshape(-1, 2)
+    if len(keys) == 0:
+        raise ValueError('A retime curve needs at least one key')
+
+    keys = keys[np.argsort(keys[:, 0], kind='mergesort')]
+    if np.any(np.diff(keys[:, 1]) < 0):
+        raise ValueError('Retime curves cannot run backwards, source times must not decrease')
+
+    return keys
+
+
+class Resampler(object):
+    '''
+    Turns blocks of source frames into blocks of output frames at another rate.
+    '''
+
+    def __init__(self, sourceRate, targetRate, frameCount, retime=None):
+        '''
+        :param sourceRate: The source frames per second
+        :param targetRate: The output frames per second
+        :param frameCount: The number of source frames
+        :param retime: A list of (output seconds, source seconds) keys, linearly interpolated,
+                       mapping each output frame to the source time it shows. Output starts at
+                       0 seconds and ends at the last key. None plays the source at its own speed
+        '''
+        self.sourceRate = float(sourceRate)
+        self.targetRate = float(targetRate)
+        self.frameCount = frameCount
+
+        # Where each output frame falls in the source, in fractional source frames
+        duration = (frameCount - 1) / self.sourceRate
+        if retime is None:
+            seconds = np.arange(int(np.floor(duration * self.targetRate + FRAME_TOLERANCE)) + 1) / self.targetRate
+        else:
+            keys = retimeKeys(retime)
+            outputs = np.arange(int(np.floor(keys[-1, 0] * self.targetRate + FRAME_TOLERANCE)) + 1) / self.targetRate
+            seconds = np.interp(outputs, keys[:, 0], keys[:, 1])
+
+        self.sourceFrames = np.clip(seconds * self.sourceRate, 0.0, frameCount - 1)
+
+        # Snap times within rounding of a source frame onto it, so matching rates pass frames through
+        nearest = np.round(self.sourceFrames)
+        snap = np.abs(self.sourceFrames - nearest) < FRAME_TOLERANCE
+        self.sourceFrames[snap] = nearest[snap]
+
+        # The two source frames each output frame blends, the same one twice when it lands on a frame
+        self._lower = np.floor(self.sourceFrames).astype(int)
+        self._upper = np.where(self.sourceFrames == self._lower, self._lower,
+                               np.minimum(self._lower + 1, frameCount - 1))
+
+        self._next = 0
+        self._last = None
+
+    def __len__(self):
+        return len(self.sourceFrames)
+
+    def push(self, first, matrices):
+        '''
+        Adds the next block of source frames.
+        :param first: The index of the block's first source frame
+        :param matrices: A (frames, ...) array of rigid transform matrices, such as local joint matrices
+        :return: The index of the first output frame produced, and a (frames, ...) array of output
+                 matrices, which may be empty
+        '''
+        matrices = np.asarray(matrices, dtype=float)
+
+        # The last frame of the block before lets output frames fall across the seam
+        if self._last is not None and self._last[0] == first - 1:
+            base = first - 1
+            frames = np.concatenate([self._last[1][None], matrices])
+        else:
+            base = first
+            frames = matrices
+        last = first + len(matrices) - 1
+
+        # Every output frame whose two source frames have both arrived
+        start = self._next
+        end = start + np.searchsorted(self._upper[start:], last, side='right')
+        self._next = end
+
+        # Keep a copy, the block may be a view that is about to be reused
+        if len(matrices):
+            self._last = (last, np.array(matrices[-1]))
+
+        lower = self._lower[start:end]
+        weights = self.sourceFrames[start:end] - lower
+        weights = weights.reshape(weights.shape + (1,) * (frames.ndim - 3))
+        return start, tm.interpolateMatrices(frames[lower - base], frames[self._upper[start:end] - base], weights)
@@ -1,12 +1,36 @@
 import pymel.core as pmc
-import pymel.core.datatypes as dt
-import controltools
+import numpy as np
+import tempfile
+import shutil
+import time
+import os
+import multiprocessing
+import backends
+import transformmath as tm
+import solver
+import bvh
+import livestream
+import framering
+import bakecache
+import automap
+import resample
 import logging
 
 ##############################
 #      Private Methods       #
 ##############################
 
+# The scene calls used while binding and baking, see setBackend
+_backend = backends.PymelBackend()
+
+# The default caches, by folder name, made on first use
+_caches = {}
+
+# The lean node channels set by snapping, and the attributes holding each constraint's offset
+_BIND_NODE_CHANNELS = ('translate', 'rotate', 'rotatePivot')
+_OFFSET_ATTRS = {'orient': ('offset',), 'point': ('offset',),
+                 'parent': ('target[0].targetOffsetTranslate', 'target[0].targetOffsetRotate')}
+
 class _undoBlock(object):
 
     def __enter__(self):
@@ -14,129 +38,1006 @@ class _undoBlock(object):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         pmc.undoInfo(closeChunk=True)
-        if exc_val is not None:
+
+        # Nothing was recorded to undo inside a batch session
+        if exc_val is not None and pmc.undoInfo(q=True, state=True):
             pmc.undo()
 
-def _bind(source, target, translate=False, rotate=False, snap=True, scale=10.0):
+def _session(batch):
 
-    # Create the nodes
-    tNode = _createTranslateNode(scale)
-    pmc.rename(tNode, target.shortName() + '_translateOffset')
-    _connectToTarget(tNode, target)
+    # Large jobs skip the undo queue and roll back from a checkpoint instead
+    return batchSession() if batch else _undoBlock()
 
-    rNode = _createRotateNode(scale)
-    pmc.rename(rNode, target.shortName() + '_rotateOffset')
-    pmc.parent(rNode, tNode)
+class _evaluateAll(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+def _isolation(nodes, isolate):
+
+    # Bakes step through time, so only what drives the nodes is evaluated unless asked otherwise
+    return isolatedEvaluation(nodes) if isolate else _evaluateAll()
+
+def _bind(source, target, translate=False, rotate=False, snap=True, scale=10.0, lean=False, offsets=None):
+
+    if not translate and not rotate:
+        logging.warning('Nothing to bind, enable translate or rotate')
+        return
+
+    # Offsets captured from an earlier lean bind only fit a lean bind
+    if offsets is not None:
+        lean = True
+
+    source = _backend.node(source)
+    target = _backend.node(target)
+    name = _backend.nodeName(target)
+
+    # Create only the nodes needed for the bound channels
+    tNode = rNode = None
+
+    if lean:
+        # A single shapeless node plays the part of both offsets
+        node = _backend.rename(_createLeanNode(), name + '_bindOffset')
+        tNode = node if translate else None
+        rNode = node if rotate else None
 
-    # If a parent exists, parent it, otherwise parent to world
-    if source.getParent() is not None:
-        pmc.parent(tNode, source.getParent())
     else:
-        pmc.parent(tNode, world=True)
+        if translate:
+            tNode = _backend.rename(_createTranslateNode(scale), name + '_translateOffset')
+
+        if rotate:
+            rNode = _backend.rename(_createRotateNode(scale), name + '_rotateOffset')
+            if tNode is not None:
+                _backend.parent(rNode, tNode)
+
+    # The top node holds the connections
+    node = tNode if tNode is not None else rNode
+    _connectToTarget(node, target)
+    _connectToSource(node, source)
+    _setBindChannels(node, translate, rotate)
 
-    # Set the nodes default positions and reset them
-    tNode.setTranslation(target.getTranslation(worldSpace=True), worldSpace=True)
-    pmc.makeIdentity(tNode, translate=True, apply=True)
-    rNode.setRotation(target.getRotation(worldSpace=True), worldSpace=True)
-    pmc.makeIdentity(rNode, rotate=True, apply=True)
+    # If a parent exists, parent it, otherwise parent to world
+    _backend.parent(node, _backend.getParent(source))
+
+    # Set the nodes default positions, only resetting them when snapping
+    if offsets is None:
+        _backend.matchTranslation(node, target)
+        if snap:
+            _backend.freeze(node, translate=True)
+
+        if rNode is not None:
+            _backend.matchRotation(rNode, target)
+            if snap:
+                _backend.freeze(rNode, rotate=True)
+
+    # Connect the source to the nodes, and the nodes to the target
+    if tNode is not None and rNode is not None:
+        links = [('orient', source, tNode), ('parent', rNode, target)]
+    elif tNode is not None:
+        links = [('point', tNode, target)]
+    else:
+        links = [('orient', source, rNode), ('orient', rNode, target)]
 
-    # Connect the source to the nodes
-    pmc.orientConstraint(source, tNode, mo=True)
+    # Known offsets are set rather than captured, the node's channels before the constraints drive them
+    if offsets is not None:
+        nodePlugs = [(node, name) for name in _BIND_NODE_CHANNELS]
+        _applyBindOffsets(nodePlugs, offsets[:3 * len(nodePlugs)])
 
-    # Connect the binds to the target
-    # pmc.pointConstraint(tOffset, target)
-    pmc.parentConstraint(rNode, target, mo=True)
+    constraints = [(kind, _backend.constrain(kind, driver, driven, maintainOffset=offsets is None))
+                   for kind, driver, driven in links]
+    if offsets is not None:
+        offsetPlugs = [(constraint, name) for kind, constraint in constraints for name in _OFFSET_ATTRS[kind]]
+        _applyBindOffsets(offsetPlugs, offsets[3 * len(nodePlugs):])
 
     # Lock and hide the controls we don't want modified
-    pmc.setAttr(tNode.rotate, channelBox=False, keyable=False, lock=True)
-    pmc.setAttr(rNode.translate, channelBox=False, keyable=False, lock=True)
-    pmc.setAttr(tNode.scale, channelBox=False, keyable=False, lock=True)
-    pmc.setAttr(rNode.scale, channelBox=False, keyable=False, lock=True)
+    if lean:
+        _backend.lockAttr(node, 'scale')
+        return node, constraints
+
+    if tNode is not None:
+        _backend.lockAttr(tNode, 'rotate')
+        _backend.lockAttr(tNode, 'scale')
+    if rNode is not None:
+        _backend.lockAttr(rNode, 'translate')
+        _backend.lockAttr(rNode, 'scale')
+
+    return node, constraints
+
+def _captureBindOffsets(node, constraints):
+
+    # The lean node's channels after snapping, then each constraint's offset
+    values = [_backend.getAttr(node, name) for name in _BIND_NODE_CHANNELS]
+    values += [_backend.getAttr(constraint, name) for kind, constraint in constraints for name in _OFFSET_ATTRS[kind]]
+
+    return np.array(values, dtype=float).ravel()
+
+def _applyBindOffsets(plugs, offsets):
+
+    # Set the values in the order they were captured, three at a time
+    for i, (obj, name) in enumerate(plugs):
+        _backend.setAttr(obj, name, tuple(offsets[3 * i:3 * i + 3].tolist()))
+
+def _skeletonFingerprint(root):
+
+    # Names, hierarchy and local transforms, along with where the whole skeleton sits
+    joints = _listHierarchy(root)
+    indices = dict((joint, i) for i, joint in enumerate(joints))
+
+    return bakecache.BakeCache.key([_backend.nodeName(joint, stripNamespace=True) for joint in joints],
+                                   [indices.get(_backend.getParent(joint), -1) for joint in joints],
+                                   [_backend.getAttr(joint, 'rotateOrder') for joint in joints],
+                                   np.round(tm.flatToMatrix(_backend.getMatrices(joints, worldSpace=False)), 6),
+                                   np.round(_getParentMatrices([root]), 6))
+
+def _setBindChannels(node, translate, rotate):
+
+    # Record which of the target's channels the bind drives
+    channels = [name for name, bound in (('translate', translate), ('rotate', rotate)) if bound]
+    _backend.addAttr(node, 'bindChannels', 'string')
+    _backend.setAttr(node, 'bindChannels', ' '.join(channels))
+
+def _findBindChannels(node):
+
+    # Binds made before channels were recorded drive both
+    if not _backend.hasAttr(node, 'bindChannels'):
+        return ['translate', 'rotate']
+
+    return _backend.getAttr(node, 'bindChannels').split()
+
+def _findBindPlugs():
+
+    # Grab the bound channels of every target, one plug per axis
+    plugs = []
+    for node in _findBindNodes():
+        target = _findBindTarget(node)
+        plugs += [_backend.plug(target, channel + axis) for channel in _findBindChannels(node) for axis in 'XYZ']
+
+    # Along with every bound attribute
+    plugs += [_backend.plug(node, name) for node, name in _findAttrBindPairs()[1]]
+
+    return plugs
 
 def _connectToTarget(node, target):
 
     # Add message attributes to the node and its target
-    pmc.addAttr(node, ln='bindTarget', at='message')
-    pmc.addAttr(target, ln='bindNode', at='message')
+    _backend.addAttr(node, 'bindTarget', 'message')
+    _backend.addAttr(target, 'bindNode', 'message')
 
     # Connect the attributes
-    pmc.connectAttr(node.bindTarget, target.bindNode)
+    _backend.connectAttr(node, 'bindTarget', target, 'bindNode')
+
+def _findBindTarget(node):
+
+    return _backend.getMessage(node, 'bindTarget')
+
+def _connectToSource(node, source):
+
+    # Record the source so the bind can be solved without walking the constraints
+    _backend.addAttr(node, 'bindSource', 'message')
+    _backend.connectAttr(source, 'message', node, 'bindSource')
+
+def _findBindSource(node):
+
+    if _backend.hasAttr(node, 'bindSource'):
+        return _backend.getMessage(node, 'bindSource')
+
+    # Binds made before sources were recorded are driven by an orient constraint
+    constraint = _backend.listConnections(node, 'rotateX', source=True, destination=False, nodeType='orientConstraint')[0]
+    return _backend.constraintTargets(constraint, 'orient')[0]
+
+def _findBindPairs():
+
+    # Grab the source, target and bound channels of every bind node
+    nodes = _findBindNodes()
+    sources = [_findBindSource(node) for node in nodes]
+    targets = [_findBindTarget(node) for node in nodes]
+    channels = [_findBindChannels(node) for node in nodes]
+
+    return sources, targets, channels
 
 def _findBindNodes():
 
     # Grab a list of every bind node in the scene
-    return [obj for obj in pmc.ls(dag=True) if pmc.hasAttr(obj, 'bindTarget', checkShape=False)]
+    return _backend.listNodesWithAttr('bindTarget')
 
 def _findBindTargets():
 
     # Grab all the bind nodes, and create a list of their targets
-    return [node.bindTarget for node in _findBindNodes()]
+    return [_findBindTarget(node) for node in _findBindNodes()]
 
-def _createTranslateNode(scale=1.0):
-
-    # Create the node and set its base size
-    node = controltools.create_control_curve_from_data(CUBE_CURVEDATA)
-    controltools.scale_curve(scale,scale,scale, node)
+def _createLeanNode():
 
-    # Color the node
-    for shape in node.getShapes():
-        pmc.setAttr(shape.overrideColorRGB, dt.Color(1,1,0))
-        pmc.setAttr(shape.overrideRGBColors, True)
-        pmc.setAttr(shape.overrideEnabled, True)
+    # A bare transform, shapes are only added when they are asked for
+    node = _backend.createNode('transform')
+    _backend.addAttr(node, 'bindLean', 'bool', default=True)
 
     return node
 
+def _addBindShapes(node, scale=1.0):
+
+    # Translate binds show a cube, rotate only binds an octahedron
+    if 'translate' in _findBindChannels(node):
+        shapeNode = _createTranslateNode(scale)
+    else:
+        shapeNode = _createRotateNode(scale)
+
+    # Freeze the size into the curves and move them onto the bind node
+    _backend.moveShapes(shapeNode, node)
+
+def _findLeanNodes():
+
+    # Grab the bind nodes created without shapes
+    return [node for node in _findBindNodes() if _backend.hasAttr(node, 'bindLean')]
+
+def _createTranslateNode(scale=1.0):
+
+    # Create a yellow cube at its base size
+    return _backend.createControl(CUBE_CURVEDATA, scale, (1, 1, 0))
+
 def _createRotateNode(scale=1.0):
 
-    # Create the node and set its base size
-    node = controltools.create_control_curve_from_data(OCTO_CURVEDATA)
-    controltools.scale_curve(scale/2, scale/2, scale/2, node)
+    # Create a blue octahedron at its base size
+    return _backend.createControl(OCTO_CURVEDATA, scale/2, (0, 0, 1))
+
+def _removeNode(node):
+
+    target = _findBindTarget(node)
+    _backend.deleteAttr(target, 'bindNode')
+    _backend.deleteAttr(node, 'bindTarget')
+
+    _backend.delete(node)
+
+def _splitPlug(plug):
+
+    # Plugs are given by name, or as anything whose name is 'node.attr'
+    name, attrName = str(plug).split('.', 1)
+    return _backend.node(name), attrName
+
+def _bindAttrs(source, target, pairs):
+
+    # One node per source and target records every pair bound between them
+    node = _backend.rename(_backend.createNode('transform'), _backend.nodeName(target) + '_bindAttrs')
+    _backend.addAttr(node, 'bindAttrSource', 'message')
+    _backend.connectAttr(source, 'message', node, 'bindAttrSource')
+    _backend.addAttr(node, 'bindAttrTarget', 'message')
+    _backend.connectAttr(target, 'message', node, 'bindAttrTarget')
+    _backend.addAttr(node, 'bindAttrs', 'string')
+    _backend.setAttr(node, 'bindAttrs', '\n'.join('%s %s %r %r' % pair for pair in pairs))
+
+    # Pairs passed through unchanged are connected directly, the rest are remapped three at a time
+    remapped = []
+    for pair in pairs:
+        if pair[2] == 1.0 and pair[3] == 0.0:
+            _backend.connectAttr(source, pair[0], target, pair[1])
+        else:
+            remapped.append(pair)
 
-    # Color the node
-    for shape in node.getShapes():
-        pmc.setAttr(shape.overrideColorRGB, dt.Color.blue)
-        pmc.setAttr(shape.overrideRGBColors, True)
-        pmc.setAttr(shape.overrideEnabled, True)
+    for i in range(0, len(remapped), 3):
+        _remapAttrs(node, source, target, remapped[i:i + 3])
 
     return node
 
-def _removeNode(node):
+def _remapAttrs(node, source, target, pairs):
+
+    # Scale through a multiplyDivide and offset through a plusMinusAverage, skipping whichever isn't needed
+    outputs = [(source, pair[0]) for pair in pairs]
+
+    if any(pair[2] != 1.0 for pair in pairs):
+        multiply = _createRemapNode(node, 'multiplyDivide')
+        for axis, output, pair in zip('XYZ', outputs, pairs):
+            _backend.connectAttr(output[0], output[1], multiply, 'input1' + axis)
+            _backend.setAttr(multiply, 'input2' + axis, pair[2])
+        outputs = [(multiply, 'output' + axis) for axis in 'XYZ'[:len(pairs)]]
+
+    if any(pair[3] != 0.0 for pair in pairs):
+        add = _createRemapNode(node, 'plusMinusAverage')
+        for axis, output, pair in zip('xyz', outputs, pairs):
+            _backend.connectAttr(output[0], output[1], add, 'input3D[0].input3D' + axis)
+            _backend.setAttr(add, 'input3D[1].input3D' + axis, pair[3])
+        outputs = [(add, 'output3D' + axis) for axis in 'xyz'[:len(pairs)]]
+
+    for output, pair in zip(outputs, pairs):
+        _backend.connectAttr(output[0], output[1], target, pair[1])
+
+def _createRemapNode(node, nodeType):
+
+    # Remap nodes sit outside the hierarchy, so they are linked to the bind node to be removed with it
+    remap = _backend.createNode(nodeType)
+    _backend.addAttr(remap, 'bindAttrNode', 'message')
+    _backend.connectAttr(node, 'message', remap, 'bindAttrNode')
+
+    return remap
+
+def _findAttrBindNodes():
+
+    # Grab every attribute bind node in the scene
+    return _backend.listNodesWithAttr('bindAttrs')
 
-    target = pmc.getAttr(node.bindTarget)
-    pmc.deleteAttr(target.bindNode)
-    pmc.deleteAttr(node.bindTarget)
+def _findAttrBindPairs():
 
-    pmc.delete(node)
+    # Grab every bound attribute as a (node, attribute) plug, along with its scale and offset
+    sources, targets, scales, offsets = [], [], [], []
+    for node in _findAttrBindNodes():
+        source = _backend.getMessage(node, 'bindAttrSource')
+        target = _backend.getMessage(node, 'bindAttrTarget')
+        for line in _backend.getAttr(node, 'bindAttrs').splitlines():
+            sourceName, targetName, scale, offset = line.split()
+            sources.append((source, sourceName))
+            targets.append((target, targetName))
+            scales.append(float(scale))
+            offsets.append(float(offset))
+
+    return sources, targets, np.array(scales, dtype=float), np.array(offsets, dtype=float)
+
+def _removeAttrNode(node):
+
+    remaps = _backend.listConnections(node, 'message', source=False, destination=True)
+    _backend.delete(list(remaps) + [node])
+
+def _frameWindows(count, windowSize):
+
+    # Split a frame count into consecutive slices
+    return [slice(i, min(i + windowSize, count)) for i in range(0, count, windowSize)]
+
+def _getWorldMatrices(nodes):
+
+    # Query each world matrix as a flat list and convert them in one go
+    return tm.flatToMatrix(_backend.getMatrices(nodes))
+
+def _getParentMatrices(nodes):
+
+    # Nodes without a parent use the identity matrix
+    matrices = tm.composeMatrix(shape=(len(nodes),))
+    for i, node in enumerate(nodes):
+        parent = _backend.getParent(node)
+        if parent is not None:
+            matrices[i] = _getWorldMatrices([parent])[0]
+
+    return matrices
+
+def _getCarrierMatrices(world, indices, parents):
+
+    # Roots have no parent to carry them, so they carry their own translation
+    parents = np.asarray(parents, dtype=int)
+    matrices = tm.composeMatrix(translation=world[..., indices, 3, :3])
+
+    carried = parents >= 0
+    matrices[..., carried, :, :] = world[..., parents[carried], :, :]
+
+    return matrices
+
+def _sampleWorldMatrices(nodes, times):
+
+    return _sampleFrames(nodes, [], times)[0]
+
+def _sampleFrames(nodes, plugs, times):
+
+    # Step through each frame once for the world matrices and attribute values, then return to where we started
+    current = _backend.getTime()
+    matrices = np.empty((len(times), len(nodes), 4, 4))
+    values = np.empty((len(times), len(plugs)))
+    for f, time in enumerate(times):
+        _backend.setTime(float(time))
+        if nodes:
+            matrices[f] = _getWorldMatrices(nodes)
+        if plugs:
+            values[f] = [_backend.getAttr(node, name) for node, name in plugs]
+    _backend.setTime(current)
+
+    return matrices, values
+
+def _sampleBake(bake, targets, times):
+
+    # Bake inside a chunk of its own and sample what it keyed, then undo it to bring the binds back
+    pmc.undoInfo(openChunk=True)
+    try:
+        start = time.time()
+        bake()
+        seconds = time.time() - start
+        matrices = _sampleWorldMatrices(targets, times)
+    finally:
+        pmc.undoInfo(closeChunk=True)
+        pmc.undo()
+
+    return matrices, seconds
+
+def _sampleHierarchyMatrices(nodes, hierarchy, times):
+
+    # Roots are carried by their parent outside the hierarchy, if they have one
+    roots = [i for i in hierarchy.levels[0] if _backend.getParent(nodes[i]) is not None]
+    rootParents = [_backend.getParent(nodes[i]) for i in roots]
+
+    # Sample local matrices only, the hierarchy solves them level by level
+    current = _backend.getTime()
+    local = np.empty((len(times), len(nodes), 4, 4))
+    rootMatrices = tm.composeMatrix(shape=(len(times), len(nodes)))
+    for f, time in enumerate(times):
+        _backend.setTime(float(time))
+        local[f] = tm.flatToMatrix(_backend.getMatrices(nodes, worldSpace=False))
+        if roots:
+            rootMatrices[f, roots] = _getWorldMatrices(rootParents)
+    _backend.setTime(current)
+
+    return hierarchy.solve(local, rootMatrices)
+
+def _listHierarchy(root):
+
+    # The root followed by every joint below it
+    return _backend.listHierarchy(root, 'joint')
+
+def _getJointOrients(nodes):
+
+    # Only joints have an orient, everything else is treated as zero
+    orients = np.zeros((len(nodes), 3))
+    for i, node in enumerate(nodes):
+        if _backend.hasAttr(node, 'jointOrient'):
+            orients[i] = np.radians(_backend.getAttr(node, 'jointOrient'))
+
+    return orients
+
+def _createSolver(sources, sourceParentMatrices, targets, sourceMatrices=None, sourceIndices=None, channels=None):
+
+    # Targets whose parent is also a target are localized against the solved parent
+    indices = dict((target, i) for i, target in enumerate(targets))
+    targetParents = [indices.get(_backend.getParent(target), -1) for target in targets]
+
+    if sourceMatrices is None:
+        sourceMatrices = _getWorldMatrices(sources)
+
+    return solver.RetargetSolver.fromRestPose(sourceMatrices,
+                                              sourceParentMatrices,
+                                              _getWorldMatrices(targets),
+                                              targetParents=targetParents,
+                                              targetParentWorld=_getParentMatrices(targets),
+                                              jointOrients=_getJointOrients(targets),
+                                              rotateOrders=[_backend.getAttr(t, 'rotateOrder') for t in targets],
+                                              sourceIndices=sourceIndices,
+                                              translate=None if channels is None else ['translate' in c for c in channels],
+                                              rotate=None if channels is None else ['rotate' in c for c in channels])
+
+def _animationFingerprint(nodes, time):
+
+    # The keys on the nodes and everything above them, along with their pose at a frame
+    ancestors = _listAncestors(nodes)
+    current = _backend.getTime()
+    _backend.setTime(float(time))
+    local = np.asarray(_backend.getMatrices(ancestors, worldSpace=False), dtype=float)
+    _backend.setTime(current)
+
+    keys = [np.asarray(data, dtype=float) for data in _backend.keyData(ancestors)]
+
+    return [_backend.nodeName(node) for node in ancestors], local, keys
+
+def _unhashedDrivers(nodes):
+
+    # Only keys are fingerprinted, so anything else feeding the nodes would change the bake unnoticed
+    ancestors = set(_listAncestors(nodes))
+    upstream = [node for node in _backend.listUpstream(nodes) if node not in ancestors]
+    return [node for node in upstream
+            if not _backend.nodeType(node).startswith('animCurveT') and _backend.nodeType(node) != 'time']
+
+def _bakeKey(sources, retarget, times, tangentType):
+
+    # Everything the solved curves depend on
+    return bakecache.BakeCache.key(_animationFingerprint(sources, times[0]),
+                                   retarget.rotateOffsets, retarget.pivotOffsets, retarget.parentIndices,
+                                   retarget.parentMatrices, retarget.jointOrients, list(retarget.rotateOrders),
+                                   retarget.sourceIndices, retarget.translateMask, retarget.rotateMask,
+                                   retarget.restLocal, retarget.scales, np.asarray(times, dtype=float), tangentType)
+
+def _bakeOutOfCore(sources, targets, bindChannels, times, windowSize, tangentType='linear', workers=1, processes=False,
+                   cache=None, attrBinds=None):
+
+    windows = _frameWindows(len(times), windowSize)
+
+    # Bound attributes are sampled in the same pass as the sources, and only need remapping
+    attrSources, attrTargets, scales, offsets = attrBinds if attrBinds is not None else ([], [], [], [])
+
+    retarget = None
+    if targets:
+        retarget = _createSolver(sources, _getParentMatrices(sources), targets, channels=bindChannels)
+
+    # Sources driven by more than keys can't be fingerprinted, so their bakes are never cached
+    if cache is not None and retarget is not None:
+        drivers = _unhashedDrivers(sources)
+        if drivers:
+            logging.warning('Not caching the bake, the sources are driven by more than keys through %s' %
+                            ', '.join(_backend.nodeName(node) for node in drivers[:5]))
+            cache = None
+
+    # An identical bake only needs its keys written
+    key = cached = None
+    if cache is not None and retarget is not None:
+        key = _bakeKey(sources, retarget, times, tangentType)
+        cached = cache.load(key, ['translate', 'rotate'])
+    solve = retarget is not None and cached is None
+
+    # Every buffer lives on disk so only one window is ever held in memory
+    folder = tempfile.mkdtemp(prefix='retargeter')
+    samples = solved = values = None
+    try:
+        nodes = []
+        if solve:
+            samples = np.memmap(os.path.join(folder, 'samples.dat'), dtype=float, mode='w+',
+                                shape=(len(times), 2, len(sources), 4, 4))
+            solved = np.memmap(os.path.join(folder, 'solved.dat'), dtype=float, mode='w+',
+                               shape=(len(times), 2, len(targets), 3))
+
+            # Sample the sources and their parents, parentless sources use the identity matrix
+            parents = [_backend.getParent(source) for source in sources]
+            parented = [i for i, parent in enumerate(parents) if parent is not None]
+            nodes = sources + [parents[i] for i in parented]
+
+        if attrSources:
+            values = np.memmap(os.path.join(folder, 'values.dat'), dtype=float, mode='w+',
+                               shape=(len(times), len(attrSources)))
+
+        for window in windows if nodes or attrSources else []:
+            world, sampled = _sampleFrames(nodes, attrSources, times[window])
+
+            # Remap every bound attribute at once, keys are only written once every frame is sampled
+            if values is not None:
+                values[window] = sampled * scales + offsets
+                values.flush()
+
+            if solve:
+                parentWorld = tm.composeMatrix(shape=(len(world), len(sources)))
+                parentWorld[:, parented] = world[:, len(sources):]
+
+                samples[window, 0] = world[:, :len(sources)]
+                samples[window, 1] = parentWorld
+                samples.flush()
+
+        if cached is not None:
+            for window in windows:
+                _writeKeys(targets, times[window], cached['translate'][window], cached['rotate'][window],
+                           retarget.translateMask, retarget.rotateMask, tangentType)
+
+        elif solve:
+            # Solve each window, carrying the euler filter over the seams
+            previous = None
+            with solver.ParallelSolver(retarget, workers, processes) as parallel:
+                for window in windows:
+                    translate, rotate = parallel.localize(samples[window, 0], samples[window, 1])
+                    rotate = tm.filterEuler(rotate, retarget.rotateOrders, previous)
+                    solved[window, 0] = translate
+                    solved[window, 1] = rotate
+                    previous = rotate[-1]
+            solved.flush()
+
+            if key is not None:
+                cache.store(key, translate=solved[:, 0], rotate=solved[:, 1])
+
+            # Key each window
+            for window in windows:
+                _writeKeys(targets, times[window], solved[window, 0], solved[window, 1],
+                           retarget.translateMask, retarget.rotateMask, tangentType)
+
+        if values is not None:
+            for window in windows:
+                _writeAttrKeys(attrTargets, times[window], values[window], tangentType)
+
+    finally:
+        # Memory maps must be closed before their files can be removed
+        del samples, solved, values
+        shutil.rmtree(folder, ignore_errors=True)
+
+def _listAncestors(nodes):
+
+    # The nodes and everything above them, each listed once
+    found = []
+    seen = set()
+    for node in nodes:
+        while node is not None and node not in seen:
+            found.append(node)
+            seen.add(node)
+            node = _backend.getParent(node)
+
+    return found
+
+def _sparseKeyTimes(nodes):
+
+    # Keys on any curve upstream of the nodes move them, including those on the controls of a rig
+    # driving them through constraints or IK. Anything else played by time moves them between keys,
+    # so every frame is sampled instead, which None stands for
+    upstream = _backend.listUpstream(nodes)
+    clocked = [node for node in _backend.listTimeDriven()
+               if node in upstream and not _backend.nodeType(node).startswith('animCurve')]
+    if clocked:
+        logging.warning('Sampling every frame, the sources are moved by time through %s' %
+                        ', '.join(_backend.nodeName(node) for node in clocked))
+        return None
+
+    curves = [node for node in upstream if _backend.nodeType(node).startswith('animCurveT')]
+    return np.asarray(_backend.keyTimes(curves) if curves else [], dtype=float)
+
+def _sparseTimes(keyTimes, start, end):
+
+    # The key times within the range, whose ends are always sampled, or every frame without them
+    if keyTimes is None:
+        return np.arange(start, end + 1)
+
+    times = np.union1d([start, end], keyTimes)
+    times = times[(times >= start) & (times <= end)]
+
+    # A whole frame half way between keys keeps the shape of the curve between them
+    midpoints = np.floor((times[:-1] + times[1:]) / 2.0)
+
+    return np.union1d(times, midpoints[midpoints > times[:-1]])
+
+def _mergeRanges(ranges):
+
+    # Sort the ranges and join any that overlap or touch, so no frame is sampled twice
+    merged = []
+    for start, end in sorted((min(r), max(r)) for r in ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [tuple(r) for r in merged]
+
+def _rangeTimes(ranges, sparseNodes=None):
+
+    # Every frame of every range, or only the sparse times within each
+    if sparseNodes is not None:
+        keyTimes = _sparseKeyTimes(sparseNodes)
+        return np.unique(np.concatenate([_sparseTimes(keyTimes, start, end) for start, end in ranges]))
+
+    return np.unique(np.concatenate([np.arange(start, end + 1) for start, end in ranges]))
+
+def _decodeBVH(reader, blockSize):
+
+    # Decode in this process, one block at a time
+    for frame, block in reader.iterBlocks(blockSize):
+        yield frame, reader.worldMatrices(block)
+
+def _decodeBVHInSubprocess(reader, blockSize):
+
+    # Decode in a separate process, handing world matrices over in shared memory
+    count = len(reader.joints)
+    solver.useMayapy()
+    folder = tempfile.mkdtemp(prefix='retargeter')
+    ring = framering.FrameRing.create(os.path.join(folder, 'frames.ring'), 4, blockSize, count, 16)
+    process = multiprocessing.Process(target=bvh.decodeToRing, args=(reader.path, ring, blockSize))
+    process.daemon = True
+    process.start()
+
+    try:
+        while True:
+            block = ring.peek(timeout=0.1)
+            if block is not None:
+                # Each block is used in place, its slot is only freed once it has been solved
+                sequence, frames = block
+                yield sequence * blockSize, frames.reshape(len(frames), count, 4, 4)
+                ring.release()
+            elif ring.closed and len(ring) == 0:
+                break
+            elif not process.is_alive():
+                raise RuntimeError('Decoding %s failed' % reader.path)
+
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        ring.unlink()
+        shutil.rmtree(folder, ignore_errors=True)
+
+def _resampleBVH(blocks, resampler, parents):
+
+    # Blend in local space so bones keep their length, then rebuild the world matrices
+    parents = np.asarray(parents, dtype=int)
+    hierarchy = solver.ForwardKinematics(parents)
+    carried = parents >= 0
+    for frame, world in blocks:
+        local = np.array(world)
+        local[:, carried] = np.matmul(world[:, carried], tm.invertRigid(world[:, parents[carried]]))
+
+        first, local = resampler.push(frame, local)
+        if len(local):
+            yield first, hierarchy.solve(local)
+
+def _defaultCache(name):
+
+    # Made on first use, so the cache folder only exists once something is cached
+    if name not in _caches:
+        _caches[name] = bakecache.BakeCache(os.path.join(tempfile.gettempdir(), name))
+
+    return _caches[name]
+
+def _writeKeys(targets, times, translate, rotate, translateMask=None, rotateMask=None, tangentType='linear'):
+
+    if translateMask is None:
+        translateMask = [True] * len(targets)
+    if rotateMask is None:
+        rotateMask = [True] * len(targets)
+
+    # Add a block of keys to each bound channel, leaving keys from earlier blocks alone
+    times = np.asarray(times, dtype=float).tolist()
+    for i, target in enumerate(targets):
+        for axis, name in enumerate('XYZ'):
+            if translateMask[i]:
+                curve = _backend.getAnimCurve(target, 'translate' + name, 'animCurveTL')
+                _backend.addKeys(curve, times, translate[:, i, axis].tolist(), tangentType)
+
+            if rotateMask[i]:
+                curve = _backend.getAnimCurve(target, 'rotate' + name, 'animCurveTA')
+                _backend.addKeys(curve, times, rotate[:, i, axis].tolist(), tangentType)
+
+
+def _writeAttrKeys(plugs, times, values, tangentType='linear'):
+
+    # Add a block of keys to each bound attribute, replacing whatever drove it
+    times = np.asarray(times, dtype=float).tolist()
+    for i, (node, name) in enumerate(plugs):
+        curve = _backend.getAnimCurve(node, name, 'animCurveTU')
+        _backend.addKeys(curve, times, values[:, i].tolist(), tangentType)
 
 
 ##############################
 #      Public Methods       #
 ##############################
 
-def bakeBindTargets():
+class batchSession(object):
+    '''
+    Runs a block of work without recording undo, for binds and bakes too big for the undo queue.
+    The scene is checkpointed to a file on entry, and reopened from it if the block fails.
+    On exit, report holds the checkpoint size, how much Maya's heap grew over the block with undo
+    off, the time taken and whether the block was rolled back. The undo memory saved can't be
+    measured without running the block twice, retargeter_benchmark.benchmarkBatch runs the same
+    binds both ways and reports the difference.
+    '''
+
+    def __init__(self, folder=None):
+        '''
+        :param folder: Where the checkpoint is written, the system temp folder if None
+        '''
+        self.folder = folder
+        self.report = {}
 
-    # Grab a list of all targets
-    targets = _findBindTargets()
+    def __enter__(self):
 
-    if len(targets) > 0:
+        self._tempFolder = tempfile.mkdtemp(prefix='retargeter', dir=self.folder)
+        self._path = os.path.join(self._tempFolder, 'checkpoint.mb')
+        self._sceneName = pmc.sceneName()
+        self._undoState = pmc.undoInfo(q=True, state=True)
+        self._heap = pmc.memory(heapMemory=True, megaByte=True)
+        self._start = time.time()
 
-        # Grab the start and end frame
-        start = pmc.playbackOptions(ast=True, q=True)
-        end = pmc.playbackOptions(aet=True, q=True)
+        pmc.exportAll(self._path, type='mayaBinary', force=True, preserveReferences=True)
 
-        print start
-        print end
+        # Stop recording without flushing, so the steps before the session can still be undone
+        pmc.undoInfo(stateWithoutFlush=False)
 
-        # Bake the targets
-        pmc.bakeResults(targets, t=(start, end), simulation=True)
+        return self
 
-        # Delete all the baked nodes
-        for node in _findBindNodes():
-            _removeNode(node)
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        try:
+            pmc.undoInfo(stateWithoutFlush=self._undoState)
+
+            # The rollback state sits on disk rather than in the undo queue, measured before any reopening
+            size = os.path.getsize(self._path)
+            growth = int((pmc.memory(heapMemory=True, megaByte=True) - self._heap) * 1048576)
+            self.report = {'checkpointBytes': size, 'heapGrowthBytes': growth,
+                           'seconds': time.time() - self._start, 'rolledBack': exc_val is not None}
+
+            if exc_val is not None:
+                # Reopen the checkpoint under the scene's own name, the handles from before are gone
+                pmc.openFile(self._path, force=True)
+                pmc.renameFile(self._sceneName or 'untitled')
+                setBackend(_backend.name)
+                logging.warning('Batch session failed, the scene was restored from its checkpoint')
+
+            logging.info('Batch session checkpointed %.1f MB to disk instead of recording undo, the heap grew %.1f MB' %
+                         (size / 1048576.0, growth / 1048576.0))
+
+        finally:
+            shutil.rmtree(self._tempFolder, ignore_errors=True)
+
+class isolatedEvaluation(object):
+    '''
+    Evaluates only what drives a set of nodes while a block steps through time, such as a bake.
+    Viewport refresh is suspended, and every node played by time that the nodes don't depend on,
+    like the anim curves and simulations of unrelated rigs, is blocked through its nodeState,
+    unless that nodeState is locked or connected. Both are restored on exit. On exit, report holds the number of time driven nodes blocked and
+    kept, and the time taken.
+    '''
+
+    def __init__(self, nodes):
+        '''
+        :param nodes: The nodes to keep evaluating, along with everything upstream of them and their parents
+        '''
+        self.nodes = nodes
+        self.report = {}
+
+    def __enter__(self):
+
+        self._start = time.time()
+        upstream = _backend.listUpstream(self.nodes)
+        driven = _backend.listTimeDriven()
+
+        # Nodes already blocked or switched off are left as they are, and so are those whose
+        # nodeState is locked or driven, which can't be set or would be overridden
+        blocked = [node for node in driven
+                   if node not in upstream and _backend.getAttr(node, 'nodeState') == 0
+                   and _backend.isSettable(node, 'nodeState')]
+        self._kept = len(driven) - len(blocked)
+
+        # __exit__ isn't called if this fails, so unblock whatever was blocked before raising
+        self._blocked = []
+        try:
+            for node in blocked:
+                _backend.setAttr(node, 'nodeState', 2)
+                self._blocked.append(node)
+            _backend.suspendRefresh(True)
+        except Exception:
+            for node in self._blocked:
+                _backend.setAttr(node, 'nodeState', 0)
+            raise
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        try:
+            _backend.suspendRefresh(False)
+        finally:
+            for node in self._blocked:
+                _backend.setAttr(node, 'nodeState', 0)
+
+            self.report = {'blockedNodes': len(self._blocked), 'keptNodes': self._kept,
+                           'seconds': time.time() - self._start}
+            logging.info('Isolated evaluation blocked %d of %d time driven nodes' %
+                         (len(self._blocked), len(self._blocked) + self._kept))
+
+def setBackend(name):
+    '''
+    Switches the scene calls used while binding and baking.
+    :param name: 'pymel' to work on PyNodes, or 'cmds' to work on maya.cmds string names
+    '''
+    global _backend
+    _backend = backends.BACKENDS[name]()
+
+def bakeBindTargets(outOfCore=False, windowSize=1000, batch=False, sparse=False, workers=1, processes=False,
+                    cache=None, ranges=None, isolate=True):
+    '''
+    Bakes every bind target over the animation range, then removes the bind nodes.
+    :param outOfCore: Solve the binds in windows backed by memory mapped buffers instead of bakeResults
+    :param windowSize: The number of frames held in memory at once when out of core
+    :param batch: Run in a batch session instead of an undo chunk
+    :param sparse: Solve and key only at the times of the keys driving the sources, including those
+                   on rig controls upstream of them, and the frames half way between, with spline
+                   tangents, always out of core. Sources moved by time otherwise, such as by an
+                   expression, are sampled every frame
+    :param workers: The number of workers solving each window out of core, one per core if None
+    :param processes: Solve on a process pool instead of a thread pool, started with mayapy inside Maya
+    :param cache: A bakecache.BakeCache, or True for the default one, to load identical bakes from
+                  instead of solving them, always out of core. Cached keys are read back a window at a time.
+                  Sources driven by anything but keys, such as constraints or expressions, are never cached
+    :param ranges: A list of (start, end) frame ranges to bake instead of the animation range, such as
+                   those of shotRanges. Overlapping ranges are merged, and every frame of their union is
+                   sampled once and keyed in the same pass. More than one range is always out of core
+    :param isolate: Evaluate only what drives the bind targets while baking, see isolatedEvaluation
+    '''
+
+    # Grab a list of all targets, along with any bound attributes
+    targets = _findBindTargets()
+
+    if len(targets) > 0 or len(_findAttrBindNodes()) > 0:
+
+        # Grab the ranges, the animation range by default
+        if ranges is None:
+            ranges = [(pmc.playbackOptions(ast=True, q=True), pmc.playbackOptions(aet=True, q=True))]
+        ranges = _mergeRanges(ranges)
+        if len(ranges) == 0:
+            logging.warning('No frame ranges to bake')
+            return
+
+        with _session(batch):
+
+            # Bake only the channels each bind drives
+            if cache is True:
+                cache = _defaultCache('retargeterBakeCache')
+
+            with _isolation(targets + [node for node, name in _findAttrBindPairs()[1]], isolate):
+
+                if sparse:
+                    sources, targets, channels = _findBindPairs()
+                    attrBinds = _findAttrBindPairs()
+                    sparseNodes = sources + [node for node, name in attrBinds[0]]
+                    _bakeOutOfCore(sources, targets, channels, _rangeTimes(ranges, sparseNodes), windowSize, 'spline',
+                                   workers, processes, cache, attrBinds)
+                elif outOfCore or cache is not None or len(ranges) > 1:
+                    sources, targets, channels = _findBindPairs()
+                    _bakeOutOfCore(sources, targets, channels, _rangeTimes(ranges), windowSize,
+                                   workers=workers, processes=processes, cache=cache, attrBinds=_findAttrBindPairs())
+                else:
+                    _backend.bake(_findBindPlugs(), ranges[0][0], ranges[0][1])
+
+            # Delete all the baked nodes
+            for node in _findBindNodes():
+                _removeNode(node)
+            for node in _findAttrBindNodes():
+                _removeAttrNode(node)
 
     else:
         logging.warning('No Bind Nodes in scene')
 
+def shotRanges():
+    '''
+    The frame ranges of the scene's shots, for baking several shots in one pass.
+    :return: A list of (start, end) frame ranges, one per shot, in the order the shots start
+    '''
+    return sorted((shot.startFrame.get(), shot.endFrame.get()) for shot in pmc.ls(type='shot'))
+
+def verifyBake(rotationTolerance=0.01, positionTolerance=0.001, percentiles=(50, 95, 99), raiseOnFailure=True,
+               **options):
+    '''
+    Checks a faster bake path against bakeResults, so it can be adopted safely.
+    Both paths bake every bind target over the animation range and are undone again, leaving the
+    binds as they were. Every target's world matrix is compared on every frame.
+    :param rotationTolerance: The largest rotation error allowed, in degrees
+    :param positionTolerance: The largest position error allowed, in scene units
+    :param percentiles: The error percentiles to summarize
+    :param raiseOnFailure: Raise a RuntimeError when an error exceeds its tolerance, otherwise log a warning
+    :param options: The bakeBindTargets options of the path checked, such as outOfCore=True or sparse=True
+    :return: A dict of the targets, the frames, the (frames, targets) rotation errors in degrees and
+             position errors, a summary of each, the seconds each bake took, and whether the path passed
+    '''
+    if options.get('batch'):
+        raise ValueError('A batch bake cannot be undone, verify without batch')
+    if not pmc.undoInfo(q=True, state=True):
+        raise RuntimeError('Undo is off, the bakes compared could not be undone')
+
+    targets = _findBindTargets()
+    if len(targets) == 0:
+        logging.warning('No Bind Nodes in scene')
+        return None
+
+    # Compare on every frame the bake keys, the reference bakes straight across any gaps between ranges
+    if options.get('ranges') is not None:
+        ranges = _mergeRanges(options['ranges'])
+        if len(ranges) == 0:
+            raise ValueError('No frame ranges to verify')
+        times = _rangeTimes(ranges)
+    else:
+        times = np.arange(pmc.playbackOptions(ast=True, q=True), pmc.playbackOptions(aet=True, q=True) + 1)
+    start, end = times[0], times[-1]
+    names = [_backend.nodeName(target) for target in targets]
+
+    reference, referenceSeconds = _sampleBake(lambda: _backend.bake(_findBindPlugs(), start, end), targets, times)
+    candidate, candidateSeconds = _sampleBake(lambda: bakeBindTargets(**options), targets, times)
+
+    errors = {'rotation': np.degrees(tm.rotationAngle(reference, candidate)),
+              'position': np.linalg.norm(reference[..., 3, :3] - candidate[..., 3, :3], axis=-1)}
+    tolerances = {'rotation': rotationTolerance, 'position': positionTolerance}
+
+    # The worst target and frame of each error, along with its spread
+    summary = {}
+    for kind, error in errors.items():
+        frame, target = np.unravel_index(np.argmax(error), error.shape)
+        summary[kind] = dict(('p%g' % p, float(value)) for p, value in zip(percentiles, np.percentile(error, percentiles)))
+        summary[kind].update({'max': float(error[frame, target]), 'mean': float(error.mean()),
+                              'worstTarget': names[target], 'worstFrame': float(times[frame])})
+
+    report = {'targets': names, 'times': times, 'rotationError': errors['rotation'], 'positionError': errors['position'],
+              'summary': summary, 'referenceSeconds': referenceSeconds, 'candidateSeconds': candidateSeconds,
+              'passed': all(summary[kind]['max'] <= tolerances[kind] for kind in errors)}
+
+    if not report['passed']:
+        failures = ['%s error %.6g at %s frame %g exceeds %g' % (kind, summary[kind]['max'], summary[kind]['worstTarget'],
+                                                                   summary[kind]['worstFrame'], tolerances[kind])
+                    for kind in sorted(errors) if summary[kind]['max'] > tolerances[kind]]
+        if raiseOnFailure:
+            raise RuntimeError('Bake verification failed, ' + ', '.join(failures))
+        logging.warning('Bake verification failed, ' + ', '.join(failures))
+
+    return report
+
 def selectBindNodes():
 
     nodes = _findBindNodes()
@@ -154,7 +1055,7 @@ def selectBindNodes():
 
 def removeSelectedNodes():
 
-    nodes = [obj for obj in pmc.selected() if pmc.hasAttr(obj, 'bindTarget')]
+    nodes = [_backend.node(obj) for obj in pmc.selected() if pmc.hasAttr(obj, 'bindTarget')]
 
     if len(nodes) > 0:
         for node in nodes:
@@ -177,7 +1078,30 @@ def selectBindTargets():
     else:
         logging.warning('No targets to select')
 
-def bindSelected(translate, rotate, snap, scale):
+def showBindShapes(scale=1.0):
+
+    nodes = [node for node in _findLeanNodes() if not _backend.getShapes(node)]
+
+    if len(nodes) > 0:
+        with _undoBlock():
+            for node in nodes:
+                _addBindShapes(node, scale)
+
+    else:
+        logging.warning('No lean bind nodes without shapes')
+
+def hideBindShapes():
+
+    shapes = [shape for node in _findLeanNodes() for shape in _backend.getShapes(node)]
+
+    if len(shapes) > 0:
+        with _undoBlock():
+            _backend.delete(shapes)
+
+    else:
+        logging.warning('No lean bind shapes to hide')
+
+def bindSelected(translate, rotate, snap, scale, lean=False):
 
     # Grab the selection
     selection = pmc.selected()
@@ -190,11 +1114,412 @@ def bindSelected(translate, rotate, snap, scale):
 
         # Bind the targets
         with _undoBlock():
-            _bind(source, target, translate=translate, rotate=rotate, snap=snap, scale=scale)
+            _bind(source, target, translate=translate, rotate=rotate, snap=snap, scale=scale, lean=lean)
 
     else:
         logging.warning('Not enough targets')
 
+def bindHierarchy(source, target, translate=True, rotate=True, snap=True, cache=None):
+    '''
+    Binds every joint below a target root to the source joint of the same name, with lean bind nodes.
+    Joints are paired by name with namespaces stripped, and each target's current pose is bound
+    to the source's current pose.
+    :param source: The root of the source hierarchy
+    :param target: The root of the target hierarchy
+    :param translate: Bind the translation of each joint
+    :param rotate: Bind the rotation of each joint
+    :param snap: Reset the bind nodes to the target's pose
+    :param cache: A bakecache.BakeCache, or True for the default one, holding the offsets captured by
+                  earlier binds of the same two rest poses. A hit skips snapping and capturing offsets
+    '''
+    if not translate and not rotate:
+        logging.warning('Nothing to bind, enable translate or rotate')
+        return
+
+    source = _backend.node(source)
+    target = _backend.node(target)
+    names = dict((_backend.nodeName(joint, stripNamespace=True), joint) for joint in _listHierarchy(source))
+
+    # Pair every target joint with the source joint of the same name
+    pairs = []
+    for joint in _listHierarchy(target):
+        name = _backend.nodeName(joint, stripNamespace=True)
+        if name in names:
+            pairs.append((names[name], joint))
+
+    if len(pairs) > 0:
+
+        # The rest poses of both skeletons decide the offsets
+        key = cached = None
+        if cache is True:
+            cache = _defaultCache('retargeterOffsetCache')
+        if cache is not None:
+            key = bakecache.BakeCache.key(_skeletonFingerprint(source), _skeletonFingerprint(target),
+                                          translate, rotate, snap)
+            cached = cache.load(key, ['offsets'])
+
+        captured = []
+        with _undoBlock():
+            for i, (sourceJoint, targetJoint) in enumerate(pairs):
+                offsets = None if cached is None else cached['offsets'][i]
+                node, constraints = _bind(sourceJoint, targetJoint, translate, rotate, snap, lean=True, offsets=offsets)
+                if cache is not None and cached is None:
+                    captured.append(_captureBindOffsets(node, constraints))
+
+        if captured:
+            cache.store(key, offsets=np.array(captured))
+
+    else:
+        logging.warning('No target joints match the source hierarchy')
+
+def mapByProximity(source, target, candidates=4, tolerance=0.05, minConfidence=0.0):
+    '''
+    Pairs the joints of two hierarchies by their current pose, for skeletons whose names differ.
+    Both skeletons are normalized for height, each source joint is matched to a nearby target
+    joint that keeps the hierarchy consistent, and no target joint is used twice.
+    :param source: The root of the source hierarchy
+    :param target: The root of the target hierarchy
+    :param candidates: The number of nearest target joints considered for each source joint
+    :param tolerance: The distance, as a fraction of height, at which confidence falls to about 0.6
+    :param minConfidence: Leave out pairs with a lower confidence
+    :return: A list of (source joint, target joint, confidence) in source hierarchy order
+    '''
+    sources = _listHierarchy(_backend.node(source))
+    targets = _listHierarchy(_backend.node(target))
+
+    positions = []
+    parents = []
+    for joints in (sources, targets):
+        indices = dict((joint, i) for i, joint in enumerate(joints))
+        positions.append(_getWorldMatrices(joints)[:, 3, :3])
+        parents.append([indices.get(_backend.getParent(joint), -1) for joint in joints])
+
+    matches, confidence = automap.matchByProximity(positions[0], parents[0], positions[1], parents[1],
+                                                   candidates=candidates, tolerance=tolerance)
+
+    return [(sources[i], targets[match], float(confidence[i])) for i, match in enumerate(matches)
+            if match >= 0 and confidence[i] >= minConfidence]
+
+def mapByName(source, target, rules=None, topologyWeight=0.3, minConfidence=0.0):
+    '''
+    Pairs the joints of two hierarchies by name, for skeletons that follow different naming conventions.
+    Names are split into tokens under the alias and side rules, and candidates sharing telling tokens
+    are scored by their tokens and their place in the hierarchy. No target joint is used twice.
+    :param source: The root of the source hierarchy
+    :param target: The root of the target hierarchy
+    :param rules: An automap.NameRules with the aliases, sides and ignored words, the defaults if None
+    :param topologyWeight: How much of the score comes from the hierarchy, from 0 to 1
+    :param minConfidence: Leave out pairs with a lower confidence
+    :return: A list of (source joint, target joint, confidence) in source hierarchy order
+    '''
+    sources = _listHierarchy(_backend.node(source))
+    targets = _listHierarchy(_backend.node(target))
+
+    names = []
+    parents = []
+    for joints in (sources, targets):
+        indices = dict((joint, i) for i, joint in enumerate(joints))
+        names.append([_backend.nodeName(joint, stripNamespace=True) for joint in joints])
+        parents.append([indices.get(_backend.getParent(joint), -1) for joint in joints])
+
+    matches, confidence = automap.matchByName(names[0], parents[0], names[1], parents[1],
+                                              rules=rules, topologyWeight=topologyWeight)
+
+    return [(sources[i], targets[match], float(confidence[i])) for i, match in enumerate(matches)
+            if match >= 0 and confidence[i] >= minConfidence]
+
+def bindPairs(pairs, translate=True, rotate=True, snap=True, batch=False):
+    '''
+    Binds many targets to their sources at once with lean bind nodes, such as the pairs found by
+    mapByName or mapByProximity. Each target's current pose is bound to its source's current pose.
+    :param pairs: A list of (source, target) or (source, target, confidence)
+    :param translate: Bind the translation of each target
+    :param rotate: Bind the rotation of each target
+    :param snap: Reset the bind nodes to the target's pose
+    :param batch: Run in a batch session instead of an undo chunk
+    :return: The bind nodes created
+    '''
+    if not translate and not rotate:
+        logging.warning('Nothing to bind, enable translate or rotate')
+        return []
+
+    if len(pairs) == 0:
+        logging.warning('No pairs to bind')
+        return []
+
+    nodes = []
+    with _session(batch):
+        for pair in pairs:
+            node, constraints = _bind(pair[0], pair[1], translate, rotate, snap, lean=True)
+            nodes.append(node)
+
+    return nodes
+
+def bindAttributes(pairs, batch=False):
+    '''
+    Binds numeric attributes beyond transforms, such as blendshape weights and custom rig attributes,
+    each target following its source times a scale plus an offset. Pairs left unchanged are connected
+    directly, the rest share a multiplyDivide for every three that are scaled, and a plusMinusAverage
+    for every three that are offset. bakeBindTargets keys the bound attributes along with the binds.
+    :param pairs: A list of (source plug, target plug) or (source plug, target plug, scale, offset),
+                  with plugs given as 'node.attribute'
+    :param batch: Run in a batch session instead of an undo chunk
+    :return: The bind nodes created, one for each source and target node bound
+    '''
+    if len(pairs) == 0:
+        logging.warning('No attributes to bind')
+        return []
+
+    # Group the pairs by the nodes they bind, keeping the order they were given in
+    groups = []
+    found = {}
+    bound = set()
+    for pair in pairs:
+        source, sourceName = _splitPlug(pair[0])
+        target, targetName = _splitPlug(pair[1])
+        scale, offset = (float(pair[2]), float(pair[3])) if len(pair) > 2 else (1.0, 0.0)
+
+        plug = (_backend.nodeName(target), targetName)
+        if plug in bound:
+            raise ValueError('%s.%s is bound more than once' % plug)
+        bound.add(plug)
+
+        key = (_backend.nodeName(source), _backend.nodeName(target))
+        if key not in found:
+            found[key] = (source, target, [])
+            groups.append(found[key])
+        found[key][2].append((sourceName, targetName, scale, offset))
+
+    with _session(batch):
+        nodes = [_bindAttrs(source, target, group) for source, target, group in groups]
+
+    return nodes
+
+def bakeCrowd(source, targets, start=None, end=None, windowSize=1000, batch=False, sparse=False,
+              workers=1, processes=False):
+    '''
+    Retargets one source hierarchy onto many target hierarchies in a single pass.
+    Joints are paired by name with namespaces stripped, and each target's current
+    pose is bound to the source's current pose. Every source joint is sampled once
+    per frame and shared by all the targets.
+    :param source: The root of the source hierarchy
+    :param targets: The roots of the target hierarchies
+    :param start: The first frame, defaults to the animation start
+    :param end: The last frame, defaults to the animation end
+    :param windowSize: The number of frames sampled and solved at once
+    :param batch: Run in a batch session instead of an undo chunk
+    :param sparse: Solve and key only at the times of the keys driving the source, including those
+                   on rig controls upstream of it, and the frames half way between, with spline tangents
+    :param workers: The number of workers solving each window, one per core if None
+    :param processes: Solve on a process pool instead of a thread pool, started with mayapy inside Maya
+    '''
+    source = _backend.node(source)
+    sources = _listHierarchy(source)
+
+    indices = dict((joint, i) for i, joint in enumerate(sources))
+    names = dict((_backend.nodeName(joint, stripNamespace=True), i) for i, joint in enumerate(sources))
+    parents = [indices.get(_backend.getParent(joint), -1) for joint in sources]
+
+    # Pair every target joint with the source joint of the same name
+    pairs = []
+    for root in targets:
+        for joint in _listHierarchy(_backend.node(root)):
+            name = _backend.nodeName(joint, stripNamespace=True)
+            if name in names:
+                pairs.append((names[name], joint))
+
+    if len(pairs) > 0:
+
+        if start is None:
+            start = pmc.playbackOptions(ast=True, q=True)
+        if end is None:
+            end = pmc.playbackOptions(aet=True, q=True)
+
+        sourceIndices = [index for index, joint in pairs]
+        targetJoints = [joint for index, joint in pairs]
+
+        # Every target shares the same source samples through its pair's source index
+        rest = _getWorldMatrices(sources)
+        retarget = _createSolver(sources, _getCarrierMatrices(rest, np.arange(len(sources)), parents), targetJoints,
+                                 sourceMatrices=rest, sourceIndices=sourceIndices)
+
+        hierarchy = solver.ForwardKinematics(parents)
+        times = _sparseTimes(_sparseKeyTimes(sources), start, end) if sparse else np.arange(start, end + 1)
+        tangentType = 'spline' if sparse else 'linear'
+        previous = None
+        with _session(batch), solver.ParallelSolver(retarget, workers, processes) as parallel:
+            for window in _frameWindows(len(times), windowSize):
+                world = _sampleHierarchyMatrices(sources, hierarchy, times[window])
+                carriers = _getCarrierMatrices(world, np.arange(len(sources)), parents)
+
+                translate, rotate = parallel.localize(world, carriers)
+                rotate = tm.filterEuler(rotate, retarget.rotateOrders, previous)
+                _writeKeys(targetJoints, times[window], translate, rotate, tangentType=tangentType)
+                previous = rotate[-1]
+
+    else:
+        logging.warning('No target joints match the source hierarchy')
+
+def bakeBVH(path, mapping=None, start=None, blockSize=1024, batch=False, decodeProcess=False, rate=None, retime=None,
+            bindFrame=0, sourceRate=None):
+    '''
+    Retargets a BVH file onto scene joints, streaming it in blocks of frames.
+    The targets' current pose is bound to the BVH rest pose, with every rotation at zero and the
+    positions of the bind frame, so targets placed to match the take follow it in place.
+    :param path: The path of the BVH file
+    :param mapping: A dict of BVH joint names to target nodes, matched by name if None
+    :param start: The frame of the first BVH frame, defaults to the animation start
+    :param blockSize: The number of frames solved and keyed at once
+    :param batch: Run in a batch session instead of an undo chunk
+    :param decodeProcess: Decode the file in a separate process, overlapping it with solving and keying.
+                          Inside Maya the process is started with mayapy
+    :param rate: The frames per second to key at, such as the scene's rate. The BVH is resampled before
+                 solving, so only the frames keyed are solved. None keys one frame per BVH frame
+    :param retime: A list of (output seconds, BVH seconds) keys, linearly interpolated, mapping each keyed
+                   frame to the moment of the BVH it shows. BVH time may hold still but not run backwards
+    :param bindFrame: The index of the BVH frame the rest pose takes its positions from
+    :param sourceRate: The frames per second the BVH was captured at, when resampling. Defaults to the
+                       standard rate its rounded frame time stands for, see bvh.frameRate
+    '''
+    reader = bvh.BVHReader(path)
+    names = reader.jointNames
+
+    # Match joints by name when no mapping is given
+    if mapping is None:
+        mapping = dict((name, name) for name in names if pmc.objExists(name))
+
+    pairs = [(names.index(name), _backend.node(target)) for name, target in mapping.items() if name in names]
+
+    if len(pairs) > 0:
+
+        if start is None:
+            start = pmc.playbackOptions(ast=True, q=True)
+
+        sources = [index for index, target in pairs]
+        parents = [reader.joints[index].parent for index in sources]
+        targets = [target for index, target in pairs]
+
+        # Bind the targets to the rest pose
+        rest = reader.restMatrices(bindFrame)
+        retarget = _createSolver(sources, _getCarrierMatrices(rest, sources, parents), targets,
+                                 sourceMatrices=rest[sources])
+
+        # Solve and key each block as it is read, carrying the euler filter over the seams
+        previous = None
+        with _session(batch):
+            blocks = _decodeBVHInSubprocess(reader, blockSize) if decodeProcess else _decodeBVH(reader, blockSize)
+            if rate is not None or retime is not None:
+                sourceRate = sourceRate or reader.frameRate
+                resampler = resample.Resampler(sourceRate, rate or sourceRate, reader.frameCount, retime)
+                blocks = _resampleBVH(blocks, resampler, [joint.parent for joint in reader.joints])
+            for frame, world in blocks:
+                translate, rotate = retarget.localize(retarget.solve(world[:, sources], _getCarrierMatrices(world, sources, parents)))
+                rotate = tm.filterEuler(rotate, retarget.rotateOrders, previous)
+                _writeKeys(targets, start + np.arange(frame, frame + len(world)), translate, rotate)
+                previous = rotate[-1]
+
+    else:
+        logging.warning('No BVH joints match the targets')
+
+class liveRetarget(object):
+    '''
+    Retargets a live stream of joint rotations onto scene joints as frames arrive.
+    The targets' current pose is bound to the stream's rest pose. Each update solves
+    only the newest frame waiting, so a slow scene skips frames rather than falling
+    behind, and stats records the latency and jitter of every frame published.
+    Undo is not recorded while the stream is open.
+    '''
+
+    def __init__(self, address, mapping=None, timeout=5.0):
+        '''
+        :param address: The (host, port) of a livestream source
+        :param mapping: A dict of stream joint names to target nodes, matched by name if None
+        :param timeout: The seconds to wait for the stream to connect
+        '''
+        self.reader = livestream.StreamReader(address, timeout)
+        self.stats = livestream.StreamStats()
+        self.targets = []
+        names = self.reader.jointNames
+
+        # Match joints by name when no mapping is given
+        if mapping is None:
+            mapping = dict((name, name) for name in names if pmc.objExists(name))
+
+        pairs = [(names.index(name), _backend.node(target)) for name, target in mapping.items() if name in names]
+
+        if len(pairs) > 0:
+            self._sources = [index for index, target in pairs]
+            self._parents = [int(self.reader.parents[index]) for index in self._sources]
+            self.targets = [target for index, target in pairs]
+
+            # Bind the targets to the rest pose
+            rest = self.reader.restMatrices()
+            self._solver = _createSolver(self._sources, _getCarrierMatrices(rest, self._sources, self._parents),
+                                         self.targets, sourceMatrices=rest[self._sources])
+
+        else:
+            logging.warning('No stream joints match the targets')
+
+        self._previous = None
+        self._undoState = pmc.undoInfo(q=True, state=True)
+        pmc.undoInfo(stateWithoutFlush=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def update(self):
+        '''
+        Publishes the newest frame waiting on the stream to the targets.
+        :return: Whether a frame was published
+        '''
+        frames, received = self.reader.read()
+        if len(frames) == 0 or not self.targets:
+            return False
+
+        # Older frames are already late, only the newest is worth showing.
+        # Only the joints that moved since the last frame are recomputed
+        frame = frames[-1:]
+        world = self.reader.updateWorldMatrices(frame)
+        translate, rotate = self._solver.localize(self._solver.solve(world[:, self._sources],
+                                                                     _getCarrierMatrices(world, self._sources, self._parents)))
+        rotate = tm.filterEuler(rotate, self._solver.rotateOrders, self._previous)
+        self._previous = rotate[-1]
+
+        rotate = np.degrees(rotate[0])
+        for i, target in enumerate(self.targets):
+            _backend.setAttr(target, 'translate', tuple(translate[0, i].tolist()))
+            _backend.setAttr(target, 'rotate', tuple(rotate[i].tolist()))
+
+        self.stats.add(int(frame['sequence'][0]), float(frame['time'][0]), received, time.time(), len(frames) - 1)
+        return True
+
+    def run(self, seconds=None, frames=None):
+        '''
+        Publishes frames as they arrive until the stream closes or a limit is reached.
+        :param seconds: The most seconds to run for, unlimited if None
+        :param frames: The most frames to publish, unlimited if None
+        :return: The stats summary
+        '''
+        start = time.time()
+        while not self.reader.closed:
+            remaining = None if seconds is None else start + seconds - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            if frames is not None and self.stats.frames >= frames:
+                break
+
+            if self.reader.wait(remaining):
+                self.update()
+
+        return self.stats.summary()
+
+    def close(self):
+        self.reader.close()
+        pmc.undoInfo(stateWithoutFlush=self._undoState)
+
 
 ##### Shapes #####
 
@@ -0,0 +1,462 @@
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
+
+try:
+    import pymel.core as pmc
+except ImportError:
+    # Outside of Maya, run against the in-memory scene
+    import scenegraph
+    scenegraph.install()
+    import pymel.core as pmc
+
+import retargeter
+import solver
+import transformmath as tm
+import livestream
+import framering
+import automap
+import resample
+
+
+def _createChain(count, name):
+
+    # Build a straight joint chain, each joint parented to the last
+    pmc.select(clear=True)
+    return [pmc.joint(p=(0, i, 0), name='%s%d' % (name, i)) for i in range(count)]
+
+def _animateChain(joints, frames):
+
+    # Swing every joint over the range so each frame differs
+    for i, joint in enumerate(joints):
+        pmc.setKeyframe(joint.rotateX, t=1, v=0.0)
+        pmc.setKeyframe(joint.rotateX, t=frames, v=45.0 + i)
+        pmc.setKeyframe(joint.rotateZ, t=1, v=-10.0)
+        pmc.setKeyframe(joint.rotateZ, t=frames, v=20.0)
+
+def _produceQueue(queue, blocks, shape):
+
+    # Every block is pickled on the way through the queue
+    block = np.ones(shape)
+    for i in range(blocks):
+        queue.put(block)
+    queue.put(None)
+
+def _produceRing(ring, blocks):
+
+    # Every block is written in place in shared memory
+    for i in range(blocks):
+        slot = ring.reserve()
+        slot[:] = 1.0
+        ring.commit()
+    ring.close()
+
+def _report(title, results):
+
+    print(title)
+    for mode, result in sorted(results.items()):
+        print('  %-10s %s' % (mode, ', '.join('%s: %.6g' % item for item in sorted(result.items()))))
+
+def benchmarkBind(count=100, translate=True, rotate=True):
+    '''
+    Binds two joint chains with the default and lean bind nodes, in a new scene,
+    and compares the nodes created and the time taken per bind.
+    :param count: The number of joints in each chain
+    :return: A dict of results for each mode
+    '''
+    results = {}
+
+    for mode, lean in (('default', False), ('lean', True)):
+
+        pmc.newFile(force=True)
+        sources = _createChain(count, 'source')
+        targets = _createChain(count, 'target')
+
+        before = len(pmc.ls())
+        start = time.time()
+        for source, target in zip(sources, targets):
+            retargeter._bind(source, target, translate=translate, rotate=rotate, lean=lean)
+        elapsed = time.time() - start
+
+        results[mode] = {'nodesPerBind': float(len(pmc.ls()) - before) / count,
+                         'secondsPerBind': elapsed / count}
+
+    _report('Bind %d joints' % count, results)
+    return results
+
+def benchmarkPipeline(count=100, frames=100, outOfCore=False):
+    '''
+    Runs the whole bind, bake and remove pipeline on an animated chain in a new scene.
+    :param count: The number of joints in each chain
+    :param frames: The number of frames baked
+    :param outOfCore: Bake through the windowed solver instead of bakeResults
+    :return: A dict of results for each stage
+    '''
+    pmc.newFile(force=True)
+    pmc.playbackOptions(ast=1, aet=frames)
+    sources = _createChain(count, 'source')
+    targets = _createChain(count, 'target')
+    _animateChain(sources, frames)
+
+    results = {}
+    before = len(pmc.ls())
+
+    start = time.time()
+    for source, target in zip(sources, targets):
+        retargeter._bind(source, target, translate=True, rotate=True)
+    results['bind'] = {'seconds': time.time() - start, 'nodes': float(len(pmc.ls()) - before)}
+
+    # Baking also removes the bind nodes
+    start = time.time()
+    retargeter.bakeBindTargets(outOfCore=outOfCore)
+    results['bake'] = {'seconds': time.time() - start, 'nodes': float(len(pmc.ls()) - before)}
+
+    _report('Pipeline %d joints, %d frames' % (count, frames), results)
+    return results
+
+def benchmarkBackends(count=500, frames=100, outOfCore=True):
+    '''
+    Binds and bakes an animated chain once with each backend, in a new scene each time.
+    :param count: The number of joints in each chain
+    :param frames: The number of frames baked
+    :param outOfCore: Bake through the windowed solver instead of bakeResults
+    :return: A dict of results for each backend
+    '''
+    results = {}
+
+    try:
+        for backend in ('pymel', 'cmds'):
+            retargeter.setBackend(backend)
+
+            pmc.newFile(force=True)
+            pmc.playbackOptions(ast=1, aet=frames)
+            sources = _createChain(count, 'source')
+            targets = _createChain(count, 'target')
+            _animateChain(sources, frames)
+
+            start = time.time()
+            for source, target in zip(sources, targets):
+                retargeter._bind(source, target, translate=True, rotate=True)
+            bind = time.time() - start
+
+            start = time.time()
+            retargeter.bakeBindTargets(outOfCore=outOfCore)
+            bake = time.time() - start
+
+            results[backend] = {'bindSeconds': bind, 'bakeSeconds': bake, 'totalSeconds': bind + bake}
+
+    finally:
+        retargeter.setBackend('pymel')
+
+    _report('Backends %d joints, %d frames' % (count, frames), results)
+    return results
+
+def benchmarkLive(count=50, rate=120.0, seconds=2.0):
+    '''
+    Retargets a simulated stream onto a joint chain in a new scene, measuring
+    the latency and jitter from a frame being sent to its pose being published.
+    :param count: The number of joints in the chain
+    :param rate: The frames streamed per second
+    :param seconds: How long to stream for
+    :return: A dict of results for the stream
+    '''
+    pmc.newFile(force=True)
+    targets = _createChain(count, 'target')
+    names = [target.name() for target in targets]
+
+    with livestream.SimulatedSource(names, rate=rate) as source:
+        with retargeter.liveRetarget(source.address) as live:
+            results = {'live': live.run(seconds=seconds)}
+
+    _report('Live %d joints at %g fps' % (count, rate), results)
+    return results
+
+def benchmarkFrameRing(joints=200, blockSize=256, blocks=200):
+    '''
+    Passes blocks of world matrices from a producer process through a pickling
+    queue and through a shared memory frame ring, comparing their throughput.
+    :param joints: The number of joints in each frame
+    :param blockSize: The number of frames in each block
+    :param blocks: The number of blocks passed
+    :return: A dict of results for each transport
+    '''
+    shape = (blockSize, joints, 16)
+    frames = float(blockSize * blocks)
+    results = {}
+
+    queue = multiprocessing.Queue(4)
+    process = multiprocessing.Process(target=_produceQueue, args=(queue, blocks, shape))
+    start = time.time()
+    process.start()
+    while queue.get() is not None:
+        pass
+    elapsed = time.time() - start
+    process.join()
+    results['queue'] = {'seconds': elapsed, 'framesPerSecond': frames / elapsed}
+
+    folder = tempfile.mkdtemp(prefix='retargeter')
+    try:
+        ring = framering.FrameRing.create(os.path.join(folder, 'frames.ring'), 4, blockSize, joints, 16)
+        process = multiprocessing.Process(target=_produceRing, args=(ring, blocks))
+        start = time.time()
+        process.start()
+        for sequence, block in iter(ring.peek, None):
+            ring.release()
+        elapsed = time.time() - start
+        process.join()
+        results['ring'] = {'seconds': elapsed, 'framesPerSecond': frames / elapsed}
+        ring.unlink()
+
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    _report('Frame transport %d joints, %d frame blocks' % (joints, blockSize), results)
+    return results
+
+def benchmarkParallel(characters=16, joints=64, frames=1000, workers=(1, 2, 4, 8), processes=False):
+    '''
+    Solves a crowd of random joint chains on a growing number of workers,
+    comparing each against a single worker.
+    :param characters: The number of separate target hierarchies
+    :param joints: The number of joints in each hierarchy
+    :param frames: The number of frames solved
+    :param workers: The worker counts to time
+    :param processes: Use process pools instead of thread pools
+    :return: A dict of results for each worker count
+    '''
+    random = np.random.RandomState(0)
+    count = characters * joints
+
+    def matrices(shape):
+        return tm.composeMatrix(tm.eulerToMatrix(random.uniform(-np.pi, np.pi, shape + (3,))), random.randn(*(shape + (3,))))
+
+    parents = [-1 if i % joints == 0 else i - 1 for i in range(count)]
+    retarget = solver.RetargetSolver.fromRestPose(matrices((count,)), matrices((count,)), matrices((count,)),
+                                                  targetParents=parents)
+    sourceWorld = matrices((frames, count))
+    sourceParentWorld = matrices((frames, count))
+
+    results = {}
+    for workerCount in workers:
+        with solver.ParallelSolver(retarget, workerCount, processes) as parallel:
+            start = time.time()
+            parallel.localize(sourceWorld, sourceParentWorld)
+            results[workerCount] = {'seconds': time.time() - start}
+
+    for result in results.values():
+        result['speedup'] = results[workers[0]]['seconds'] / result['seconds']
+
+    _report('Parallel solve %d joints, %d frames, %d cores' % (count, frames, multiprocessing.cpu_count()), results)
+    return results
+
+def benchmarkAutoMap(branches=(10, 40, 200), depth=25):
+    '''
+    Matches random branching skeletons against scaled copies of themselves,
+    timing the match and checking every joint found its copy.
+    :param branches: The branch counts to time, each branch a chain of depth joints from the root
+    :param depth: The number of joints in each branch
+    :return: A dict of results for each joint count
+    '''
+    random = np.random.RandomState(0)
+
+    results = {}
+    for count in branches:
+        parents = [-1]
+        positions = [np.zeros(3)]
+        for branch in range(count):
+            parent = 0
+            direction = random.randn(3) * 0.3 + (0.0, 1.0, 0.0)
+            for joint in range(depth):
+                parents.append(parent)
+                positions.append(positions[parent] + direction * 0.04 + random.randn(3) * 0.005)
+                parent = len(positions) - 1
+        positions = np.array(positions)
+
+        start = time.time()
+        matches, confidence = automap.matchByProximity(positions, parents, positions * 1.7, parents)
+        results[len(parents)] = {'ms': (time.time() - start) * 1000.0,
+                                 'correct': np.mean(matches == np.arange(len(parents))),
+                                 'confidence': confidence.min()}
+
+    _report('Auto map by proximity', results)
+    return results
+
+def benchmarkNameMap(regions=(25, 100, 200), depth=14):
+    '''
+    Matches facial rigs of numbered regions against copies renamed to another vendor's convention,
+    timing the match and checking every joint found its copy.
+    :param regions: The region counts to time, each region a chain on either side
+    :param depth: The number of joints in each chain
+    :return: A dict of results for each joint count
+    '''
+    results = {}
+    for count in regions:
+        names = ['face_root']
+        parents = [-1]
+        for region in range(count):
+            for side in 'LR':
+                names.append('face_region%d_%s' % (region, side))
+                parents.append(0)
+                for joint in range(depth):
+                    names.append('face_region%d_%d_%s' % (region, joint, side))
+                    parents.append(len(names) - 2)
+        renamed = [name.replace('face_', 'FACE:').replace('_L', 'Left').replace('_R', 'Right') for name in names]
+
+        start = time.time()
+        matches, confidence = automap.matchByName(names, parents, renamed, parents)
+        results[len(names)] = {'ms': (time.time() - start) * 1000.0,
+                               'correct': np.mean(matches == np.arange(len(names))),
+                               'confidence': confidence.min()}
+
+    _report('Auto map by name', results)
+    return results
+
+def benchmarkResample(joints=100, frames=12000, sourceRate=120.0, rates=(60.0, 30.0, 24.0), blockSize=1024):
+    '''
+    Resamples random local matrices streamed in blocks down to lower rates,
+    showing how many fewer frames are left to solve.
+    :param joints: The number of joints
+    :param frames: The number of source frames
+    :param sourceRate: The source frames per second
+    :param rates: The output rates to time
+    :param blockSize: The number of source frames pushed at once
+    :return: A dict of results for each rate
+    '''
+    random = np.random.RandomState(0)
+    local = tm.composeMatrix(tm.eulerToMatrix(random.uniform(-np.pi, np.pi, (frames, joints, 3))),
+                             random.randn(frames, joints, 3))
+
+    results = {}
+    for rate in rates:
+        resampler = resample.Resampler(sourceRate, rate, frames)
+        start = time.time()
+        for first in range(0, frames, blockSize):
+            resampler.push(first, local[first:first + blockSize])
+        seconds = time.time() - start
+        results[rate] = {'seconds': seconds, 'framesPerSecond': frames / seconds,
+                         'solvedFraction': len(resampler) / float(frames)}
+
+    _report('Resample %d joints from %g fps' % (joints, sourceRate), results)
+    return results
+
+def benchmarkAttributes(count=150, frames=100, outOfCore=True):
+    '''
+    Binds custom attributes, such as blendshape weights, directly and through scale and offset remap
+    nodes in a new scene, then bakes them, comparing the nodes created and the time taken.
+    :param count: The number of attributes bound
+    :param frames: The number of frames baked
+    :param outOfCore: Bake through the windowed pass instead of bakeResults
+    :return: A dict of results for each mode
+    '''
+    results = {}
+
+    for mode, scale, offset in (('direct', 1.0, 0.0), ('remapped', 0.5, 0.1)):
+
+        pmc.newFile(force=True)
+        pmc.playbackOptions(ast=1, aet=frames)
+        source = pmc.createNode('transform', name='source')
+        target = pmc.createNode('transform', name='target')
+        for i in range(count):
+            pmc.addAttr(source, ln='weight%d' % i, at='double')
+            pmc.addAttr(target, ln='weight%d' % i, at='double')
+            pmc.setKeyframe(source.attr('weight%d' % i), t=1, v=0.0)
+            pmc.setKeyframe(source.attr('weight%d' % i), t=frames, v=1.0)
+        pairs = [('source.weight%d' % i, 'target.weight%d' % i, scale, offset) for i in range(count)]
+
+        before = len(pmc.ls())
+        start = time.time()
+        retargeter.bindAttributes(pairs)
+        bind = time.time() - start
+        nodes = len(pmc.ls()) - before
+
+        start = time.time()
+        retargeter.bakeBindTargets(outOfCore=outOfCore)
+        results[mode] = {'bindSeconds': bind, 'bakeSeconds': time.time() - start,
+                         'nodesPerAttribute': float(nodes) / count}
+
+    _report('Bind and bake %d attributes, %d frames' % (count, frames), results)
+    return results
+
+def benchmarkIsolation(count=50, frames=100, clutter=1000, outOfCore=False):
+    '''
+    Bakes an animated chain in a new scene cluttered with an unrelated animated rig, evaluating
+    the whole scene and then only what drives the bind targets, and compares the bake times.
+    :param count: The number of joints in each chain
+    :param frames: The number of frames baked
+    :param clutter: The number of unrelated animated joints, in chains of ten
+    :param outOfCore: Bake through the windowed solver instead of bakeResults
+    :return: A dict of results for each mode
+    '''
+    results = {}
+
+    for mode, isolate in (('before', False), ('after', True)):
+
+        pmc.newFile(force=True)
+        pmc.playbackOptions(ast=1, aet=frames)
+        sources = _createChain(count, 'source')
+        targets = _createChain(count, 'target')
+        _animateChain(sources, frames)
+        for i in range(0, clutter, 10):
+            _animateChain(_createChain(min(10, clutter - i), 'clutter%d_' % i), frames)
+
+        for source, target in zip(sources, targets):
+            retargeter._bind(source, target, translate=True, rotate=True, lean=True)
+
+        start = time.time()
+        retargeter.bakeBindTargets(outOfCore=outOfCore, isolate=isolate)
+        results[mode] = {'bakeSeconds': time.time() - start}
+
+    results['after']['speedup'] = results['before']['bakeSeconds'] / results['after']['bakeSeconds']
+
+    _report('Isolated bake %d joints, %d frames, %d unrelated joints' % (count, frames, clutter), results)
+    return results
+
+def benchmarkBatch(count=500):
+    '''
+    Binds joint chains in an undo chunk and again in a batch session, in new scenes,
+    and compares how much the heap grew, which gives the memory the batch session saved.
+    :param count: The number of joints bound, in chains of ten
+    :return: A dict of results for each mode
+    '''
+    results = {}
+
+    for mode, batch in (('undo', False), ('batch', True)):
+
+        pmc.newFile(force=True)
+        pmc.undoInfo(state=True)
+        sources = []
+        targets = []
+        for i in range(0, count, 10):
+            sources += _createChain(min(10, count - i), 'source%d_' % i)
+            targets += _createChain(min(10, count - i), 'target%d_' % i)
+
+        heap = pmc.memory(heapMemory=True, megaByte=True)
+        start = time.time()
+        retargeter.bindPairs(list(zip(sources, targets)), batch=batch)
+        results[mode] = {'heapGrowthBytes': int((pmc.memory(heapMemory=True, megaByte=True) - heap) * 1048576),
+                         'seconds': time.time() - start}
+
+    results['batch']['memorySavedBytes'] = results['undo']['heapGrowthBytes'] - results['batch']['heapGrowthBytes']
+
+    _report('Bind %d joints with and without undo' % count, results)
+    return results
+
+
+if __name__ == '__main__':
+    benchmarkBind()
+    benchmarkPipeline()
+    benchmarkPipeline(outOfCore=True)
+    benchmarkBackends()
+    benchmarkLive()
+    benchmarkFrameRing()
+    benchmarkParallel()
+    benchmarkParallel(processes=True)
+    benchmarkAutoMap()
+    benchmarkNameMap()
+    benchmarkResample()
+    benchmarkAttributes()
+    benchmarkIsolation()
+    benchmarkBatch()
@@ -22,5 +22,7 @@ def show():
         window.bakeClicked.connect(retargeter.bakeBindTargets)
         window.selectNodesClicked.connect(retargeter.selectBindNodes)
         window.removeClicked.connect(retargeter.removeSelectedNodes)
+        window.showShapesClicked.connect(retargeter.showBindShapes)
+        window.hideShapesClicked.connect(retargeter.hideBindShapes)
 
         window.show()
\ No newline at end of file
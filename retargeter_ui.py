@@ -3,10 +3,12 @@ from Qt.QtCore import Signal, Slot
 
 class RetargeterWindow(QtWidgets.QMainWindow):
 
-    bindClicked = Signal(bool, bool, bool, float)
+    bindClicked = Signal(bool, bool, bool, float, bool)
     bakeClicked = Signal()
     selectNodesClicked = Signal()
     removeClicked = Signal()
+    showShapesClicked = Signal(float)
+    hideShapesClicked = Signal()
 
     def __init__(self, *args, **kwargs):
         QtWidgets.QMainWindow.__init__(self, *args, **kwargs)
@@ -50,6 +52,11 @@ class RetargeterWindow(QtWidgets.QMainWindow):
         self.snapBox.setChecked(True)
         settingLayout.addRow('Snap to Target', self.snapBox)
 
+        # Lean nodes setting
+        self.leanBox = QtWidgets.QCheckBox(settingsBox)
+        self.leanBox.setChecked(False)
+        settingLayout.addRow('Lean Nodes', self.leanBox)
+
         # Node Scale setting
         self.scaleLine = QtWidgets.QLineEdit(settingsBox)
         self.scaleLine.setValidator(QtGui.QDoubleValidator(0, 100, 2, self))
@@ -79,6 +86,16 @@ class RetargeterWindow(QtWidgets.QMainWindow):
         removeButton.clicked.connect(self.removeClicked)
         mainLayout.addWidget(removeButton)
 
+        # Show lean node shapes button
+        showShapesButton = QtWidgets.QPushButton('Show Lean Node Shapes', mainWidget)
+        showShapesButton.clicked.connect(self.showShapes)
+        mainLayout.addWidget(showShapesButton)
+
+        # Hide lean node shapes button
+        hideShapesButton = QtWidgets.QPushButton('Hide Lean Node Shapes', mainWidget)
+        hideShapesButton.clicked.connect(self.hideShapesClicked)
+        mainLayout.addWidget(hideShapesButton)
+
     @Slot()
     def bindTarget(self):
 
@@ -86,7 +103,14 @@ class RetargeterWindow(QtWidgets.QMainWindow):
         self.bindClicked.emit(self.bindTranslateBox.checkState(),
                               self.bindRotateBox.checkState(),
                               self.snapBox.checkState(),
-                              float(self.scaleLine.text()))
+                              float(self.scaleLine.text()),
+                              self.leanBox.checkState())
+
+    @Slot()
+    def showShapes(self):
+
+        # Shapes use the same scale as new nodes
+        self.showShapesClicked.emit(float(self.scaleLine.text()))
 
 window = None
 
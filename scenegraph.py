@@ -0,0 +1,1949 @@
+'''
+An in-memory stand-in for the subset of pymel the retargeter uses.
+
+Installing it registers this module as pymel.core, along with a maya.cmds
+subset working on names, so retargeter and controltools import and run
+unchanged outside of Maya:
+
+    import scenegraph
+    scenegraph.install()
+    import retargeter
+
+Transforms, joints, attributes, message connections, curves, anim curves
+and orient, point and parent constraints are modelled. World matrices are
+cached per node and dirtied along the hierarchy and constraints whenever an
+input changes. Everything is evaluated in the same order every run, so
+results are deterministic.
+'''
+import os
+import re
+import pickle
+import sys
+import types
+import uuid
+import tempfile
+import numpy as np
+import transformmath as tm
+
+
+##############################
+#         Datatypes          #
+##############################
+
+class Vector(object):
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if np.ndim(x) > 0:
+            x, y, z = list(x)[:3]
+        self._v = np.array([x, y, z], dtype=float)
+
+    x = property(lambda self: self._v[0])
+    y = property(lambda self: self._v[1])
+    z = property(lambda self: self._v[2])
+
+    def __iter__(self):
+        return iter(self._v.tolist())
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __repr__(self):
+        return '%s(%r, %r, %r)' % ((type(self).__name__,) + tuple(self._v.tolist()))
+
+    def rotateBy(self, matrix):
+        '''
+        Rotates the vector by the rotation part of a matrix.
+        '''
+        rotation = _normalized(np.asarray(Matrix(matrix)._m)[:3, :3])
+        return type(self)(np.dot(self._v, rotation))
+
+    def rotateTo(self, other):
+        '''
+        The shortest rotation taking this vector onto another.
+        '''
+        a = self._v / np.linalg.norm(self._v)
+        b = np.asarray(list(other), dtype=float)
+        b = b / np.linalg.norm(b)
+
+        axis = np.cross(a, b)
+        cosine = np.clip(np.dot(a, b), -1.0, 1.0)
+
+        # Opposite vectors turn half way around any perpendicular axis
+        if np.linalg.norm(axis) < 1e-9:
+            if cosine > 0:
+                return Quaternion()
+            axis = np.cross(a, [1.0, 0.0, 0.0])
+            if np.linalg.norm(axis) < 1e-9:
+                axis = np.cross(a, [0.0, 1.0, 0.0])
+
+        axis = axis / np.linalg.norm(axis)
+        angle = np.arccos(cosine)
+        xyz = axis * np.sin(angle / 2.0)
+
+        return Quaternion(xyz[0], xyz[1], xyz[2], np.cos(angle / 2.0))
+
+
+class Point(Vector):
+    pass
+
+
+class Color(Vector):
+
+    r = property(lambda self: self._v[0])
+    g = property(lambda self: self._v[1])
+    b = property(lambda self: self._v[2])
+
+
+Color.red = Color(1, 0, 0)
+Color.green = Color(0, 1, 0)
+Color.blue = Color(0, 0, 1)
+Color.white = Color(1, 1, 1)
+Color.black = Color(0, 0, 0)
+
+
+class Matrix(object):
+
+    def __init__(self, *args):
+        if not args:
+            values = np.identity(4)
+        elif len(args) == 1 and isinstance(args[0], Matrix):
+            values = args[0]._m
+        elif len(args) == 1:
+            values = args[0]
+        else:
+            values = args
+
+        self._m = np.array(values, dtype=float).reshape(4, 4)
+
+    def __iter__(self):
+        return iter([tuple(row) for row in self._m.tolist()])
+
+    def __getitem__(self, i):
+        return tuple(self._m[i].tolist())
+
+    def __mul__(self, other):
+        return Matrix(np.dot(self._m, Matrix(other)._m))
+
+    def __repr__(self):
+        return 'Matrix(%r)' % (self._m.tolist(),)
+
+    def get(self):
+        return tuple(tuple(row) for row in self._m.tolist())
+
+    def inverse(self):
+        return Matrix(np.linalg.inv(self._m))
+
+    @property
+    def translate(self):
+        return Vector(self._m[3, :3])
+
+
+class EulerRotation(object):
+    '''
+    Euler angles in degrees, keeping the rotate order they were read in.
+    '''
+    def __init__(self, x=0.0, y=0.0, z=0.0, order='XYZ'):
+        if np.ndim(x) > 0:
+            x, y, z = list(x)[:3]
+        self._v = np.array([x, y, z], dtype=float)
+        self.order = order.upper()
+
+    x = property(lambda self: self._v[0])
+    y = property(lambda self: self._v[1])
+    z = property(lambda self: self._v[2])
+
+    def __iter__(self):
+        return iter(self._v.tolist())
+
+    def __repr__(self):
+        return 'EulerRotation(%r, %r, %r, %r)' % (tuple(self._v.tolist()) + (self.order,))
+
+    def asMatrix(self):
+        return tm.eulerToMatrix(np.radians(self._v), self.order.lower())
+
+
+class Quaternion(object):
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        self._q = np.array([x, y, z, w], dtype=float)
+
+    def __iter__(self):
+        return iter(self._q.tolist())
+
+    def __repr__(self):
+        return 'Quaternion(%r, %r, %r, %r)' % tuple(self._q.tolist())
+
+    def asMatrix(self):
+        x, y, z, w = self._q / np.linalg.norm(self._q)
+
+        # Row vector form, matching Maya's MQuaternion.asMatrix
+        return np.array([[1 - 2 * (y * y + z * z), 2 * (x * y + z * w), 2 * (x * z - y * w)],
+                         [2 * (x * y - z * w), 1 - 2 * (x * x + z * z), 2 * (y * z + x * w)],
+                         [2 * (x * z + y * w), 2 * (y * z - x * w), 1 - 2 * (x * x + y * y)]])
+
+
+def _normalized(rotation):
+
+    # Strip scale from the rows of a 3x3 matrix
+    rotation = np.array(rotation, dtype=float)
+    return rotation / np.linalg.norm(rotation, axis=-1)[..., None]
+
+
+def _rotationMatrix(value, order='xyz'):
+
+    # Accept any of the rotation types pymel accepts
+    if isinstance(value, (EulerRotation, Quaternion)):
+        return value.asMatrix()
+    if isinstance(value, Matrix):
+        return _normalized(value._m[:3, :3])
+    return tm.eulerToMatrix(np.radians(list(value)[:3]), order)
+
+
+##############################
+#         Attributes         #
+##############################
+
+_COMPOUNDS = {'translate': 'XYZ', 'rotate': 'XYZ', 'scale': 'XYZ', 'rotatePivot': 'XYZ',
+              'jointOrient': 'XYZ', 'overrideColorRGB': ('R', 'G', 'B')}
+
+_ALIASES = {'t': 'translate', 'r': 'rotate', 's': 'scale', 'ro': 'rotateOrder', 'rp': 'rotatePivot',
+            'jo': 'jointOrient', 'v': 'visibility'}
+for _long, _short in (('translate', 't'), ('rotate', 'r'), ('scale', 's'), ('jointOrient', 'jo')):
+    for _axis in 'XYZ':
+        _ALIASES[_short + _axis.lower()] = _long + _axis
+
+_MATRIX_CHANNELS = ['translate' + a for a in 'XYZ'] + ['rotate' + a for a in 'XYZ'] + ['scale' + a for a in 'XYZ']
+
+
+def _attrName(name):
+    return _ALIASES.get(name, name)
+
+
+class Attribute(object):
+
+    def __init__(self, node, name):
+        self.node = node
+        self.attrName = _attrName(name)
+
+    def __eq__(self, other):
+        return isinstance(other, Attribute) and self.node is other.node and self.attrName == other.attrName
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.node), self.attrName))
+
+    def __str__(self):
+        return self.name()
+
+    def __repr__(self):
+        return 'Attribute(%r)' % self.name()
+
+    def name(self):
+        return self.node.name() + '.' + self.attrName
+
+    def nodeName(self):
+        return self.node.nodeName()
+
+    def longName(self):
+        return self.attrName
+
+    def plugNode(self):
+        return self.node
+
+    def get(self):
+        return getAttr(self)
+
+    def set(self, *args, **kwargs):
+        setAttr(self, *args, **kwargs)
+
+    def inputs(self, type=None):
+        return listConnections(self, source=True, destination=False, type=type)
+
+    def outputs(self, type=None):
+        return listConnections(self, source=False, destination=True, type=type)
+
+    def children(self):
+        return [Attribute(self.node, self.attrName + axis) for axis in _COMPOUNDS.get(self.attrName, ())]
+
+
+##############################
+#           Nodes            #
+##############################
+
+class DependNode(object):
+
+    nodeTypeName = 'node'
+    _builtins = {}
+    _computed = ()
+
+    def __init__(self, scene, name):
+        self.scene = scene
+        self._name = name
+        self._values = dict(self._builtins)
+        self._values.setdefault('nodeState', 0)
+        self._types = {}
+        self._flags = {}
+        self._cache = None
+        self._uuid = str(uuid.uuid4()).upper()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self.hasAttr(name):
+            return Attribute(self, name)
+        raise AttributeError('%s has no attribute %s' % (self._name, name))
+
+    def __str__(self):
+        return self._name
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self._name)
+
+    def name(self):
+        return self._name
+
+    def shortName(self):
+        return self._name
+
+    def longName(self):
+        return self._name
+
+    def nodeName(self, stripNamespace=False):
+        return self._name.split(':')[-1] if stripNamespace else self._name
+
+    def nodeType(self):
+        return self.nodeTypeName
+
+    def exists(self):
+        # Nodes of a scene that was closed are gone too
+        return self.scene is _scene and self.scene.names.get(self._name) is self
+
+    def attr(self, name):
+        if not self.hasAttr(name):
+            raise AttributeError('%s has no attribute %s' % (self._name, name))
+        return Attribute(self, name)
+
+    def hasAttr(self, name):
+        name = _attrName(name)
+        return name == 'message' or name in self._values or name in _COMPOUNDS and name + _COMPOUNDS[name][0] in self._values
+
+    def _dirty(self):
+        self._cache = None
+
+
+class Transform(DependNode):
+
+    nodeTypeName = 'transform'
+    _builtins = dict([(c, 0.0) for c in _MATRIX_CHANNELS] +
+                     [('scale' + a, 1.0) for a in 'XYZ'] +
+                     [('rotatePivot' + a, 0.0) for a in 'XYZ'] +
+                     [('rotateOrder', 0), ('visibility', True)])
+
+    def __init__(self, scene, name):
+        DependNode.__init__(self, scene, name)
+        self._parent = None
+        self._children = []
+        self._shapes = []
+        self._constraints = []
+
+    ### Hierarchy ###
+
+    def getParent(self):
+        return self._parent
+
+    def getChildren(self):
+        return list(self._children) + list(self._shapes)
+
+    def getShapes(self):
+        return list(self._shapes)
+
+    def getShape(self):
+        return self._shapes[0] if self._shapes else None
+
+    def _dirty(self):
+
+        # A node already dirty has nothing clean below it
+        if self._cache is None:
+            return
+
+        self._cache = None
+        for child in self._children:
+            child._dirty()
+        for driven in self.scene._drivenBy.get(self, ()):
+            driven._dirty()
+
+    ### Evaluation ###
+
+    def _channelValue(self, name):
+
+        # Anim curves drive channels directly, everything else reads the stored value
+        source = self.scene.inputs.get((self, name))
+        if source is not None and isinstance(source[0], AnimCurve):
+            return source[0]._valueAt(self.scene.time)
+        return self._values[name]
+
+    def _evaluate(self):
+
+        if self._cache is not None:
+            return self._cache
+
+        values = {}
+        for channel in ('translate', 'rotate', 'scale'):
+            values[channel] = np.array([self._channelValue(channel + a) for a in 'XYZ'])
+
+        # Constraints override whichever channels they are still connected to
+        for constraint in self._constraints:
+            constraint._apply(self, values)
+
+        local = self._composeLocal(values['translate'], values['rotate'], values['scale'])
+        parent = self._parent._evaluate()[1] if self._parent is not None else np.identity(4)
+
+        self._cache = (values, np.dot(local, parent))
+        return self._cache
+
+    def _pivot(self):
+        return np.array([self._values['rotatePivot' + a] for a in 'XYZ'])
+
+    def _orient(self):
+        return np.identity(3)
+
+    def _composeLocal(self, translate, rotate, scale):
+
+        # [-rp][S][R][JO][rp][T], with the scale pivot sharing the rotate pivot
+        pivot = self._pivot()
+        linear = np.dot(np.diag(scale), np.dot(tm.eulerToMatrix(np.radians(rotate), self._values['rotateOrder']),
+                                                self._orient()))
+        local = tm.composeMatrix(linear, -np.dot(pivot, linear) + pivot + translate)
+
+        return local
+
+    def _decomposeLocal(self, local, pivot=None):
+
+        # The inverse of _composeLocal for the node's pivot and orient
+        if pivot is None:
+            pivot = self._pivot()
+        linear = np.asarray(local)[:3, :3]
+        scale = np.linalg.norm(linear, axis=1)
+        rotation = np.dot(linear / scale[:, None], self._orient().T)
+        rotate = np.degrees(tm.matrixToEuler(rotation, self._values['rotateOrder']))
+        translate = np.asarray(local)[3, :3] + np.dot(pivot, linear) - pivot
+
+        return translate, rotate, scale
+
+    def _setLocalMatrix(self, local):
+        translate, rotate, scale = self._decomposeLocal(local)
+        self._setChannels(translate=translate, rotate=rotate, scale=scale)
+
+    def _setChannels(self, translate=None, rotate=None, scale=None):
+        for channel, value in (('translate', translate), ('rotate', rotate), ('scale', scale)):
+            if value is not None:
+                for axis, v in zip('XYZ', value):
+                    self._values[channel + axis] = float(v)
+        self._dirty()
+
+    def _localMatrix(self):
+        values = self._evaluate()[0]
+        return self._composeLocal(values['translate'], values['rotate'], values['scale'])
+
+    def _worldMatrix(self):
+        return self._evaluate()[1]
+
+    def _parentMatrix(self):
+        return self._parent._worldMatrix() if self._parent is not None else np.identity(4)
+
+    def _pivotFrame(self):
+
+        # The rotate pivot's world position with the node's unscaled world rotation
+        world = self._worldMatrix()
+        position = np.dot(np.append(self._pivot(), 1.0), world)[:3]
+        return tm.composeMatrix(_normalized(world[:3, :3]), position)
+
+    ### pymel Methods ###
+
+    def getMatrix(self, worldSpace=False, objectSpace=False):
+        return Matrix(self._worldMatrix() if worldSpace else self._localMatrix())
+
+    def setMatrix(self, matrix, worldSpace=False, objectSpace=False):
+        matrix = Matrix(matrix)._m
+        if worldSpace:
+            matrix = np.dot(matrix, np.linalg.inv(self._parentMatrix()))
+        self._setLocalMatrix(matrix)
+
+    def getTranslation(self, space='object', worldSpace=False):
+        if worldSpace or space == 'world':
+            return Vector(self._worldMatrix()[3, :3])
+        return Vector(self._evaluate()[0]['translate'])
+
+    def setTranslation(self, vector, space='object', worldSpace=False):
+        vector = np.array(list(vector)[:3], dtype=float)
+        if not (worldSpace or space == 'world'):
+            self._setChannels(translate=vector)
+            return
+
+        # Move the node so its world matrix lands on the position
+        local = self._localMatrix()
+        local[3, :3] = np.dot(np.append(vector, 1.0), np.linalg.inv(self._parentMatrix()))[:3]
+        self._setLocalMatrix(local)
+
+    def getRotation(self, space='object', worldSpace=False):
+        order = tm.ROTATE_ORDERS[self._values['rotateOrder']]
+        if worldSpace or space == 'world':
+            rotation = _normalized(self._worldMatrix()[:3, :3])
+            return EulerRotation(np.degrees(tm.matrixToEuler(rotation, order)), order=order)
+        return EulerRotation(self._evaluate()[0]['rotate'], order=order)
+
+    def setRotation(self, rotation, space='object', worldSpace=False):
+        order = self._values['rotateOrder']
+        rotation = _rotationMatrix(rotation, order)
+        if worldSpace or space == 'world':
+            rotation = np.dot(rotation, _normalized(self._parentMatrix()[:3, :3]).T)
+
+        # Remove the joint orient, then store the channels in the node's own order
+        rotation = np.dot(rotation, self._orient().T)
+        self._setChannels(rotate=np.degrees(tm.matrixToEuler(rotation, order)))
+
+
+class Joint(Transform):
+
+    nodeTypeName = 'joint'
+    _builtins = dict(Transform._builtins, **dict([('jointOrient' + a, 0.0) for a in 'XYZ'] + [('radius', 1.0)]))
+
+    def _orient(self):
+        return tm.eulerToMatrix(np.radians([self._values['jointOrient' + a] for a in 'XYZ']))
+
+
+class Constraint(Transform):
+    '''
+    A constraint node, parented under the node it drives like in Maya.
+    The offset is captured when it is created, keeping the driven node in place.
+    '''
+
+    nodeTypeName = 'constraint'
+    _drives = ()
+
+    def __init__(self, scene, name, driver, driven, maintainOffset):
+        Transform.__init__(self, scene, name)
+        self.driver = driver
+        self.driven = driven
+        self.offset = None
+
+        if maintainOffset:
+            self.offset = self._captureOffset()
+
+    def targetList(self):
+        return [self.driver]
+
+    def hasAttr(self, name):
+        return name in self._offsetAttrs or Transform.hasAttr(self, name)
+
+    def _captureOffset(self):
+        return None
+
+    # The attributes holding the offset, as Maya names them
+    _offsetAttrs = ()
+
+    def _getOffsetAttr(self, name):
+        return (0.0, 0.0, 0.0)
+
+    def _setOffsetAttr(self, name, value):
+        pass
+
+    def _connected(self, channel, driven):
+
+        # Only channels whose input is still this constraint are overridden
+        return [axis for axis in range(3)
+                if self.scene.inputs.get((driven, channel + 'XYZ'[axis]), (None,))[0] is self]
+
+    def _setRotation(self, driven, values, rotation):
+        axes = self._connected('rotate', driven)
+        if axes:
+            parent = _normalized(driven._parentMatrix()[:3, :3])
+            local = np.dot(np.dot(rotation, parent.T), driven._orient().T)
+            euler = np.degrees(tm.matrixToEuler(local, driven._values['rotateOrder']))
+            values['rotate'][axes] = euler[axes]
+
+    def _setPosition(self, driven, values, position):
+        axes = self._connected('translate', driven)
+        if axes:
+            local = np.dot(np.append(position, 1.0), np.linalg.inv(driven._parentMatrix()))[:3]
+            translate = local - driven._pivot()
+            values['translate'][axes] = translate[axes]
+
+
+class OrientConstraint(Constraint):
+
+    nodeTypeName = 'orientConstraint'
+    _drives = ('rotate',)
+
+    def _captureOffset(self):
+        return np.dot(_normalized(self.driven._worldMatrix()[:3, :3]),
+                      _normalized(self.driver._worldMatrix()[:3, :3]).T)
+
+    def _apply(self, driven, values):
+        rotation = _normalized(self.driver._worldMatrix()[:3, :3])
+        if self.offset is not None:
+            rotation = np.dot(self.offset, rotation)
+        self._setRotation(driven, values, rotation)
+
+    _offsetAttrs = ('offset',)
+
+    def _getOffsetAttr(self, name):
+        offset = np.eye(3) if self.offset is None else self.offset
+        return tuple(np.degrees(tm.matrixToEuler(offset)).tolist())
+
+    def _setOffsetAttr(self, name, value):
+        self.offset = tm.eulerToMatrix(np.radians(list(value)))
+
+
+class PointConstraint(Constraint):
+
+    nodeTypeName = 'pointConstraint'
+    _drives = ('translate',)
+
+    def _captureOffset(self):
+        return self.driven._pivotFrame()[3, :3] - self.driver._pivotFrame()[3, :3]
+
+    def _apply(self, driven, values):
+        position = self.driver._pivotFrame()[3, :3]
+        if self.offset is not None:
+            position = position + self.offset
+        self._setPosition(driven, values, position)
+
+    _offsetAttrs = ('offset',)
+
+    def _getOffsetAttr(self, name):
+        return (0.0, 0.0, 0.0) if self.offset is None else tuple(self.offset.tolist())
+
+    def _setOffsetAttr(self, name, value):
+        self.offset = np.array(list(value), dtype=float)
+
+
+class ParentConstraint(Constraint):
+
+    nodeTypeName = 'parentConstraint'
+    _drives = ('translate', 'rotate')
+
+    def _captureOffset(self):
+        return np.dot(self.driven._pivotFrame(), tm.invertRigid(self.driver._pivotFrame()))
+
+    def _apply(self, driven, values):
+        frame = self.driver._pivotFrame()
+        if self.offset is not None:
+            frame = np.dot(self.offset, frame)
+        self._setRotation(driven, values, frame[:3, :3])
+        self._setPosition(driven, values, frame[3, :3])
+
+    _offsetAttrs = ('target[0].targetOffsetTranslate', 'target[0].targetOffsetRotate')
+
+    def _getOffsetAttr(self, name):
+        offset = np.eye(4) if self.offset is None else self.offset
+        if name.endswith('Translate'):
+            return tuple(offset[3, :3].tolist())
+        return tuple(np.degrees(tm.matrixToEuler(offset)).tolist())
+
+    def _setOffsetAttr(self, name, value):
+        offset = np.eye(4) if self.offset is None else self.offset.copy()
+        if name.endswith('Translate'):
+            offset[3, :3] = list(value)
+        else:
+            offset[:3, :3] = tm.eulerToMatrix(np.radians(list(value)))
+        self.offset = offset
+
+
+class NurbsCurve(DependNode):
+
+    nodeTypeName = 'nurbsCurve'
+    _builtins = {'overrideColorRGBR': 0.0, 'overrideColorRGBG': 0.0, 'overrideColorRGBB': 0.0,
+                 'overrideRGBColors': False, 'overrideEnabled': False}
+
+    def __init__(self, scene, name, cvs, knots, degree):
+        DependNode.__init__(self, scene, name)
+        self._parent = None
+        self.cvs = np.array(cvs, dtype=float).reshape(-1, 3)
+        self.knots = [float(k) for k in knots]
+        self._degree = int(degree)
+
+    def getParent(self):
+        return self._parent
+
+    def getCVs(self, space='preTransform'):
+        return [Point(cv) for cv in self.cvs]
+
+    def getKnots(self):
+        return list(self.knots)
+
+    def degree(self):
+        return self._degree
+
+
+class AnimCurve(DependNode):
+    '''
+    Keys are linearly interpolated and held past either end.
+    Angular curves store radians, like Maya's internal units.
+    A blocked curve, with a nodeState of 2, holds the value it had when it was blocked.
+    '''
+
+    nodeTypeName = 'animCurve'
+    _builtins = {'output': 0.0}
+
+    def __init__(self, scene, name):
+        DependNode.__init__(self, scene, name)
+        self.times = np.zeros(0)
+        self.values = np.zeros(0)
+        self._held = None
+
+    def addKeys(self, time, values, tangentInType='linear', tangentOutType='linear', unit=None,
+                keepExistingKeys=False):
+        times = np.asarray(time, dtype=float)
+        values = np.asarray(values, dtype=float)
+
+        if keepExistingKeys and len(self.times):
+            # New keys replace existing keys at the same times
+            keep = ~np.isin(self.times, times)
+            times = np.concatenate([self.times[keep], times])
+            values = np.concatenate([self.values[keep], values])
+
+        order = np.argsort(times, kind='mergesort')
+        self.times = times[order]
+        self.values = values[order]
+        self.scene._curveChanged(self)
+
+    def numKeys(self):
+        return len(self.times)
+
+    def getTime(self, index):
+        return float(self.times[index])
+
+    def getValue(self, index):
+        return float(self.values[index])
+
+    def _valueAt(self, time):
+        if self._held is not None:
+            return self._held
+        if not len(self.times):
+            return 0.0
+        value = float(np.interp(time, self.times, self.values))
+        return np.degrees(value) if self.nodeTypeName == 'animCurveTA' else value
+
+    def _dirty(self):
+        DependNode._dirty(self)
+        self._held = None
+        if self._values['nodeState'] == 2:
+            self._held = self._valueAt(self.scene.time)
+        self.scene._curveChanged(self)
+
+
+class AnimCurveTL(AnimCurve):
+    nodeTypeName = 'animCurveTL'
+
+
+class AnimCurveTA(AnimCurve):
+    nodeTypeName = 'animCurveTA'
+
+
+class AnimCurveTU(AnimCurve):
+    nodeTypeName = 'animCurveTU'
+
+
+class Time(DependNode):
+    nodeTypeName = 'time'
+    _builtins = {'outTime': 1.0}
+
+
+class Shot(DependNode):
+    nodeTypeName = 'shot'
+    _builtins = {'startFrame': 1.0, 'endFrame': 1.0}
+
+
+class MultiplyDivide(DependNode):
+    '''
+    Operation 0 passes input1 through, 1 multiplies, 2 divides and 3 raises to a power, per axis.
+    '''
+
+    nodeTypeName = 'multiplyDivide'
+    _builtins = dict([('input1' + a, 0.0) for a in 'XYZ'] + [('input2' + a, 1.0) for a in 'XYZ'] +
+                     [('output' + a, 0.0) for a in 'XYZ'] + [('operation', 1)])
+    _computed = ('outputX', 'outputY', 'outputZ')
+
+    def _compute(self, name):
+        axis = name[-1]
+        first = getAttr(Attribute(self, 'input1' + axis))
+        second = getAttr(Attribute(self, 'input2' + axis))
+        operation = self._values['operation']
+        if operation == 1:
+            return first * second
+        if operation == 2:
+            return first / second
+        if operation == 3:
+            return first ** second
+        return first
+
+
+class PlusMinusAverage(DependNode):
+    '''
+    Operation 1 sums the 3D inputs, 2 subtracts the rest from the first and 3 averages them.
+    Only the first two inputs exist.
+    '''
+
+    nodeTypeName = 'plusMinusAverage'
+    _builtins = dict([('input3D[%d].input3D%s' % (i, a), 0.0) for i in range(2) for a in 'xyz'] +
+                     [('output3D' + a, 0.0) for a in 'xyz'] + [('operation', 1)])
+    _computed = ('output3Dx', 'output3Dy', 'output3Dz')
+
+    def _compute(self, name):
+        axis = name[-1]
+        values = [getAttr(Attribute(self, 'input3D[%d].input3D%s' % (i, axis))) for i in range(2)]
+        operation = self._values['operation']
+        if operation == 2:
+            return values[0] - sum(values[1:])
+        if operation == 3:
+            return sum(values) / len(values)
+        return sum(values)
+
+
+_NODE_TYPES = {'transform': Transform, 'joint': Joint, 'animCurveTL': AnimCurveTL,
+               'animCurveTA': AnimCurveTA, 'animCurveTU': AnimCurveTU, 'shot': Shot,
+               'multiplyDivide': MultiplyDivide, 'plusMinusAverage': PlusMinusAverage, 'time': Time}
+
+_TYPE_FAMILIES = {'animCurve': AnimCurve, 'transform': Transform, 'joint': Joint, 'constraint': Constraint,
+                  'orientConstraint': OrientConstraint, 'pointConstraint': PointConstraint,
+                  'parentConstraint': ParentConstraint, 'nurbsCurve': NurbsCurve, 'shot': Shot,
+                  'multiplyDivide': MultiplyDivide, 'plusMinusAverage': PlusMinusAverage, 'time': Time}
+
+
+##############################
+#           Scene            #
+##############################
+
+class Scene(object):
+
+    def __init__(self):
+        self.nodes = []
+        self.names = {}
+        self.uuids = {}
+        self.inputs = {}
+        self.time = 1.0
+        self.playback = {'min': 1.0, 'max': 120.0, 'ast': 1.0, 'aet': 120.0}
+        self.selection = []
+        self.refreshSuspended = False
+
+        self._drivenBy = {}
+        self._animated = {}
+        self._connections = {}
+        self._undoDepth = 0
+        self._undoStack = []
+        self._undoEnabled = True
+        self.fileName = ''
+
+        # Every scene has a time node, like Maya
+        self._add(Time(self, 'time1'))
+
+    ### Nodes ###
+
+    def _uniqueName(self, name):
+        if name not in self.names:
+            return name
+        base = re.sub(r'\d+$', '', name)
+        index = 1
+        while '%s%d' % (base, index) in self.names:
+            index += 1
+        return '%s%d' % (base, index)
+
+    def _add(self, node):
+        node._name = self._uniqueName(node._name)
+        self.nodes.append(node)
+        self.names[node._name] = node
+        self.uuids[node._uuid] = node
+        return node
+
+    def _rename(self, node, name):
+        del self.names[node._name]
+        node._name = self._uniqueName(name)
+        self.names[node._name] = node
+
+    def _remove(self, node):
+
+        if self.names.get(node._name) is not node:
+            return
+
+        # Remove everything below a transform first
+        if isinstance(node, Transform):
+            for child in list(node._children) + list(node._shapes):
+                self._remove(child)
+            node._dirty()
+            if node._parent is not None:
+                node._parent._children.remove(node)
+
+            # Constraints driven by this node hold their channels where they are
+            for driven in list(self._drivenBy.get(node, ())):
+                for constraint in [c for c in driven._constraints if c.driver is node]:
+                    self._remove(constraint)
+
+        if isinstance(node, NurbsCurve) and node._parent is not None:
+            node._parent._shapes.remove(node)
+
+        if isinstance(node, Constraint):
+            self._detachConstraint(node)
+
+        # Drop every connection touching the node
+        for key in list(self._connections.get(node, ())):
+            self._disconnect(key)
+        self._connections.pop(node, None)
+
+        self.nodes.remove(node)
+        del self.names[node._name]
+        del self.uuids[node._uuid]
+        if node in self.selection:
+            self.selection.remove(node)
+
+    def _detachConstraint(self, constraint):
+
+        # Freeze the driven channels at their current values
+        driven = constraint.driven
+        if self.names.get(driven._name) is driven:
+            values = driven._evaluate()[0]
+            for channel in constraint._drives:
+                for axis in range(3):
+                    key = (driven, channel + 'XYZ'[axis])
+                    if self.inputs.get(key, (None,))[0] is constraint:
+                        driven._values[key[1]] = float(values[channel][axis])
+            if constraint in driven._constraints:
+                driven._constraints.remove(constraint)
+
+        drivers = self._drivenBy.get(constraint.driver, [])
+        if driven in drivers:
+            drivers.remove(driven)
+
+    ### Connections ###
+
+    def _connect(self, source, destination):
+        key = (destination.node, destination.attrName)
+        if key in self.inputs:
+            self._disconnect(key)
+
+        self.inputs[key] = (source.node, source.attrName)
+        self._connections.setdefault(source.node, set()).add(key)
+        self._connections.setdefault(destination.node, set()).add(key)
+        if isinstance(source.node, AnimCurve):
+            self._animated.setdefault(source.node, set()).add(destination.node)
+        destination.node._dirty()
+
+    def _disconnect(self, key):
+        source = self.inputs.pop(key)
+        self._connections.get(source[0], set()).discard(key)
+        self._connections.get(key[0], set()).discard(key)
+        if isinstance(source[0], AnimCurve):
+            self._animated.get(source[0], set()).discard(key[0])
+        key[0]._dirty()
+
+    def _outputs(self, node, name):
+        return [key for key in self._connections.get(node, ()) if self.inputs[key] == (node, name)]
+
+    def _curveChanged(self, curve):
+        for node in self._animated.get(curve, ()):
+            node._dirty()
+
+    def _setTime(self, time):
+        if time != self.time:
+            self.time = float(time)
+
+            # Blocked curves hold their value, so nothing they drive changes
+            for curve, nodes in self._animated.items():
+                if curve._held is not None:
+                    continue
+                for node in nodes:
+                    node._dirty()
+
+    ### Files ###
+
+    def __getstate__(self):
+
+        # Undo history is never written to a file
+        state = dict(self.__dict__)
+        state['_undoDepth'] = 0
+        state['_undoStack'] = []
+        return state
+
+    ### Undo ###
+
+    def _snapshot(self):
+
+        def copy(value):
+            if isinstance(value, (dict, list, set)):
+                return type(value)(value)
+            if isinstance(value, np.ndarray):
+                return value.copy()
+            return value
+
+        states = [(node, dict((k, copy(v)) for k, v in node.__dict__.items())) for node in self.nodes]
+        scene = dict((k, copy(v)) for k, v in self.__dict__.items() if not k.startswith('_undo'))
+        scene['_drivenBy'] = dict((k, list(v)) for k, v in self._drivenBy.items())
+        scene['_animated'] = dict((k, set(v)) for k, v in self._animated.items())
+        scene['_connections'] = dict((k, set(v)) for k, v in self._connections.items())
+
+        return scene, states
+
+    def _restore(self, snapshot):
+        scene, states = snapshot
+        self.__dict__.update(scene)
+        for node, state in states:
+            node.__dict__.clear()
+            node.__dict__.update(state)
+            node._cache = None
+
+
+_scene = Scene()
+
+
+def currentScene():
+    '''
+    The scene every pymel function operates on.
+    '''
+    return _scene
+
+
+def setCurrentScene(scene):
+    '''
+    Makes a scene current, returning the one it replaced.
+    '''
+    global _scene
+    previous = _scene
+    _scene = scene
+    return previous
+
+
+##############################
+#      pymel.core Subset     #
+##############################
+
+class MayaNodeError(ValueError):
+    pass
+
+
+def _toList(objs):
+    if objs is None:
+        return []
+    if isinstance(objs, (list, tuple, set)):
+        return [o for obj in objs for o in _toList(obj)]
+    return [objs]
+
+
+def _toAttr(attr):
+    if isinstance(attr, Attribute):
+        return attr
+    name, attrName = str(attr).split('.', 1)
+    return PyNode(name).attr(attrName)
+
+
+def PyNode(obj):
+    if isinstance(obj, (DependNode, Attribute)):
+        return obj
+    if '.' in str(obj):
+        return _toAttr(obj)
+    try:
+        return _scene.names[str(obj)]
+    except KeyError:
+        raise MayaNodeError('No object matches name: %s' % obj)
+
+
+def objExists(name):
+    return str(name).split('.')[0] in _scene.names
+
+
+def newFile(force=False):
+    setCurrentScene(Scene())
+
+
+def createNode(nodeType, name=None, parent=None):
+    node = _scene._add(_NODE_TYPES[nodeType](_scene, name or nodeType + '1'))
+    if parent is not None:
+        _reparent(node, PyNode(parent), preserveWorld=False)
+    return node
+
+
+def group(*objs, **kwargs):
+    node = createNode('transform', name=kwargs.get('name') or kwargs.get('n') or 'group1')
+    for obj in _toList(objs):
+        _reparent(PyNode(obj), node, preserveWorld=True)
+    return node
+
+
+def curve(p=None, k=None, d=1, name=None):
+    node = createNode('transform', name=name or 'curve1')
+    shape = _scene._add(NurbsCurve(_scene, node.name() + 'Shape', p, k or range(len(p)), d))
+    shape._parent = node
+    node._shapes.append(shape)
+    return node
+
+
+def joint(p=(0.0, 0.0, 0.0), name=None, n=None):
+
+    # New joints are parented under a selected joint, like Maya
+    parent = _scene.selection[0] if _scene.selection and isinstance(_scene.selection[0], Joint) else None
+    node = createNode('joint', name=name or n or 'joint1')
+    if parent is not None:
+        _reparent(node, parent, preserveWorld=False)
+    node.setTranslation(p, worldSpace=True)
+    select(node)
+    return node
+
+
+def rename(obj, name):
+    node = PyNode(obj)
+    _scene._rename(node, name)
+    return node
+
+
+def delete(*objs):
+    for obj in _toList(objs):
+        _scene._remove(PyNode(obj))
+
+
+def _reparent(node, parent, preserveWorld=True):
+
+    if isinstance(node, NurbsCurve):
+        node._parent._shapes.remove(node)
+        node._parent = parent
+        parent._shapes.append(node)
+        return
+
+    world = node._worldMatrix() if preserveWorld else None
+
+    if node._parent is not None:
+        node._parent._children.remove(node)
+    node._parent = parent
+    if parent is not None:
+        parent._children.append(node)
+    node._dirty()
+
+    if preserveWorld:
+        node.setMatrix(world, worldSpace=True)
+
+
+def parent(*args, **kwargs):
+    objs = [PyNode(obj) for obj in _toList(args)]
+    relative = kwargs.get('r', kwargs.get('relative', False))
+
+    if kwargs.get('world', kwargs.get('w', False)):
+        for obj in objs:
+            _reparent(obj, None, preserveWorld=not relative)
+        return objs
+
+    newParent = objs.pop()
+    for obj in objs:
+        _reparent(obj, newParent, preserveWorld=not relative)
+    return objs
+
+
+def listRelatives(obj, allDescendents=False, ad=False, children=False, c=False, parent=False, p=False,
+                  shapes=False, type=None):
+    node = PyNode(obj)
+
+    if parent or p:
+        result = [node.getParent()] if node.getParent() is not None else []
+    elif not isinstance(node, Transform):
+        # Shapes have nothing below them
+        result = []
+    elif shapes:
+        result = node.getShapes()
+    elif allDescendents or ad:
+        # Parents are listed before their children
+        result = []
+        def walk(n):
+            for child in n._children:
+                result.append(child)
+                walk(child)
+        walk(node)
+    else:
+        result = node.getChildren()
+
+    if type is not None:
+        result = [r for r in result if isinstance(r, _TYPE_FAMILIES[type]) and
+                  (type != 'transform' or not isinstance(r, Constraint))]
+    return result
+
+
+def ls(*args, **kwargs):
+    if kwargs.get('selection') or kwargs.get('sl'):
+        nodes = list(_scene.selection)
+    elif args:
+        # Objects are given by name or by UUID
+        nodes = [_scene.uuids[str(obj)] if str(obj) in _scene.uuids else PyNode(obj)
+                 for obj in _toList(args) if str(obj) in _scene.uuids or objExists(obj)]
+    else:
+        nodes = list(_scene.nodes)
+
+    if kwargs.get('dag'):
+        nodes = [n for n in nodes if isinstance(n, (Transform, NurbsCurve))]
+    nodeType = kwargs.get('type')
+    if nodeType is not None:
+        nodes = [n for n in nodes if isinstance(n, _TYPE_FAMILIES[nodeType])]
+    if kwargs.get('uuid'):
+        return [n._uuid for n in nodes]
+    return nodes
+
+
+def selected():
+    return list(_scene.selection)
+
+
+def select(*objs, **kwargs):
+    if kwargs.get('clear'):
+        _scene.selection = []
+        return
+    nodes = [PyNode(obj) for obj in _toList(objs)]
+    if kwargs.get('add'):
+        _scene.selection += [n for n in nodes if n not in _scene.selection]
+    else:
+        _scene.selection = nodes
+
+
+### Attributes ###
+
+def hasAttr(obj, name, checkShape=True):
+    node = PyNode(obj)
+    if node.hasAttr(name):
+        return True
+    return bool(checkShape and isinstance(node, Transform) and node._shapes and node._shapes[0].hasAttr(name))
+
+
+def addAttr(obj, ln=None, longName=None, at=None, attributeType=None, dt=None, dataType=None, dv=None,
+            defaultValue=None, keyable=False, k=False):
+    node = PyNode(obj)
+    name = ln or longName
+    attrType = at or attributeType or dt or dataType or 'double'
+    default = dv if dv is not None else defaultValue
+
+    if node.hasAttr(name):
+        raise RuntimeError('Found a matching attribute %s on %s' % (name, node))
+
+    if attrType == 'message':
+        value = None
+    elif attrType == 'string':
+        value = default or ''
+    elif attrType == 'bool':
+        value = bool(default)
+    else:
+        value = default if default is not None else 0
+
+    node._values[name] = value
+    node._types[name] = attrType
+
+
+def deleteAttr(attr):
+    attr = _toAttr(attr)
+    key = (attr.node, attr.attrName)
+    for connection in _scene._outputs(*key) + ([key] if key in _scene.inputs else []):
+        _scene._disconnect(connection)
+    del attr.node._values[attr.attrName]
+    attr.node._types.pop(attr.attrName, None)
+
+
+def getAttr(attr, time=None, settable=False, lock=False):
+    attr = _toAttr(attr)
+    node, name = attr.node, attr.attrName
+
+    if lock:
+        return bool(node._flags.get(name, {}).get('lock'))
+    if settable:
+        # Like Maya, locked and connected attributes can't be set
+        return not node._flags.get(name, {}).get('lock') and (node, name) not in _scene.inputs
+
+    if time is not None:
+        current = _scene.time
+        _scene._setTime(time)
+        try:
+            return getAttr(attr)
+        finally:
+            _scene._setTime(current)
+
+    # Message attributes return whatever they are connected to
+    if node._types.get(name) == 'message' or name == 'message':
+        connected = listConnections(attr)
+        return connected[0] if connected else None
+
+    if isinstance(node, Constraint) and name in node._offsetAttrs:
+        return node._getOffsetAttr(name)
+
+    if name in _COMPOUNDS:
+        return tuple(getAttr(child) for child in attr.children())
+
+    if isinstance(node, Transform) and name in _MATRIX_CHANNELS:
+        channel = name[:-1]
+        return float(node._evaluate()[0][channel]['XYZ'.index(name[-1])])
+
+    if name in node._computed:
+        return node._compute(name)
+
+    # Anything else connected passes its value straight through
+    source = _scene.inputs.get((node, name))
+    if source is not None and isinstance(source[0], AnimCurve):
+        return source[0]._valueAt(_scene.time)
+    if source is not None:
+        return getAttr(Attribute(*source))
+
+    return node._values[name]
+
+
+def setAttr(attr, *args, **kwargs):
+    attr = _toAttr(attr)
+    node, name = attr.node, attr.attrName
+
+    for flag in ('lock', 'keyable', 'channelBox'):
+        if flag in kwargs:
+            for plug in attr.children() or [attr]:
+                plug.node._flags.setdefault(plug.attrName, {})[flag] = kwargs[flag]
+
+    if not args:
+        return
+
+    value = args[0] if len(args) == 1 else args
+    if isinstance(node, Constraint) and name in node._offsetAttrs:
+        node._setOffsetAttr(name, value)
+        node.driven._dirty()
+        return
+
+    children = attr.children()
+    if children:
+        for child, v in zip(children, list(value)):
+            setAttr(child, v)
+        return
+
+    if node._flags.get(name, {}).get('lock'):
+        raise RuntimeError('The attribute %s is locked' % attr)
+
+    # Keyed attributes take the value until the next time change, anything else connected refuses it
+    source = _scene.inputs.get((node, name))
+    if source is not None and not isinstance(source[0], AnimCurve):
+        raise RuntimeError('The attribute %s is connected and cannot be modified' % attr)
+
+    if isinstance(node, Transform) and name == 'rotateOrder':
+        node._values[name] = int(value)
+    elif node._types.get(name) == 'string' or kwargs.get('type') == 'string':
+        node._values[name] = str(value)
+    else:
+        node._values[name] = value
+    node._dirty()
+
+
+def connectAttr(source, destination, force=False, f=False):
+    source = _toAttr(source)
+    destination = _toAttr(destination)
+    key = (destination.node, destination.attrName)
+
+    if key in _scene.inputs and not (force or f):
+        raise RuntimeError('%s is already connected' % destination)
+    _scene._connect(source, destination)
+
+
+def listConnections(attr, source=True, destination=True, type=None, s=None, d=None):
+    source = source if s is None else s
+    destination = destination if d is None else d
+
+    # Names without an attribute list the connections of the whole node
+    attr = PyNode(attr)
+    if isinstance(attr, DependNode):
+        keys = [(attr, name) for name in list(attr._values) + ['message']]
+    else:
+        keys = [(attr.node, name) for name in [attr.attrName] + [c.attrName for c in attr.children()]]
+
+    result = []
+    for key in keys:
+        if source and key in _scene.inputs:
+            result.append(_scene.inputs[key][0])
+        if destination:
+            result += [dst[0] for dst in sorted(_scene._outputs(*key), key=lambda k: (k[0].name(), k[1]))]
+
+    if type is not None:
+        result = [node for node in result if isinstance(node, _TYPE_FAMILIES[type])]
+
+    # Keep the first of any duplicates
+    unique = []
+    for node in result:
+        if node not in unique:
+            unique.append(node)
+    return unique
+
+
+def listHistory(objs):
+
+    # The nodes and everything feeding them through connections, constraint drivers included
+    found = []
+    seen = set()
+    pending = [PyNode(obj) for obj in _toList(objs)]
+    while pending:
+        node = pending.pop()
+        if id(node) in seen:
+            continue
+        found.append(node)
+        seen.add(id(node))
+        pending += [_scene.inputs[key][0] for key in _scene._connections.get(node, ()) if key[0] is node]
+        if isinstance(node, Constraint):
+            pending += node.targetList()
+
+    return found
+
+
+### Transforms ###
+
+def xform(obj, q=False, query=False, ws=False, worldSpace=False, os=False, objectSpace=False, m=None, matrix=None,
+          t=None, translation=None, ro=None, rotation=None):
+    node = PyNode(obj)
+    worldSpace = ws or worldSpace
+    values = m if m is not None else matrix
+    translation = t if t is not None else translation
+    rotation = ro if ro is not None else rotation
+
+    if q or query:
+        if translation:
+            return list(node.getTranslation(worldSpace=worldSpace))
+        if rotation:
+            return list(node.getRotation(worldSpace=worldSpace))
+        return (node._worldMatrix() if worldSpace else node._localMatrix()).flatten().tolist()
+
+    if translation is not None:
+        node.setTranslation(translation, worldSpace=worldSpace)
+    if rotation is not None:
+        node.setRotation(rotation, worldSpace=worldSpace)
+    if values is not None:
+        node.setMatrix(np.asarray(values, dtype=float).reshape(4, 4), worldSpace=worldSpace)
+
+
+def rotate(obj, x=0.0, y=0.0, z=0.0, relative=False, r=False):
+    node = PyNode(obj)
+    values = np.array([x, y, z], dtype=float)
+    if relative or r:
+        values = values + node._evaluate()[0]['rotate']
+    node._setChannels(rotate=values)
+
+
+def scale(obj, x=1.0, y=1.0, z=1.0, relative=False, r=False):
+    node = PyNode(obj)
+    values = np.array([x, y, z], dtype=float)
+    if relative or r:
+        values = values * node._evaluate()[0]['scale']
+    node._setChannels(scale=values)
+
+
+def makeIdentity(obj, apply=False, translate=False, t=False, rotate=False, r=False, scale=False, s=False):
+    for node in [PyNode(o) for o in _toList(obj)]:
+        if translate or t:
+            _freeze(node, 'translate')
+        if rotate or r:
+            _freeze(node, 'rotate')
+        if scale or s:
+            _freeze(node, 'scale')
+
+
+def _freeze(node, channel):
+    values = node._evaluate()[0]
+    old = node._localMatrix()
+
+    if channel == 'rotate' and isinstance(node, Joint):
+        # Joints move their rotation into the orient
+        orient = np.dot(tm.eulerToMatrix(np.radians(values['rotate']), node._values['rotateOrder']), node._orient())
+        for axis, v in zip('XYZ', np.degrees(tm.matrixToEuler(orient))):
+            node._values['jointOrient' + axis] = float(v)
+        node._setChannels(rotate=(0.0, 0.0, 0.0))
+        return
+
+    if channel == 'translate':
+        # The pivot stays where it is in the world
+        pivot = node._pivot() + values['translate']
+        for axis, v in zip('XYZ', pivot):
+            node._values['rotatePivot' + axis] = float(v)
+        node._setChannels(translate=(0.0, 0.0, 0.0))
+    else:
+        node._setChannels(**{channel: (1.0, 1.0, 1.0) if channel == 'scale' else (0.0, 0.0, 0.0)})
+
+    # Shapes and children take on the difference so nothing moves
+    change = np.dot(old, np.linalg.inv(node._localMatrix()))
+    for shape in node._shapes:
+        shape.cvs = np.dot(np.column_stack([shape.cvs, np.ones(len(shape.cvs))]), change)[:, :3]
+    for child in node._children:
+        if not isinstance(child, Constraint):
+            child._setLocalMatrix(np.dot(child._localMatrix(), change))
+
+
+### Constraints ###
+
+def _constrain(cls, args, kwargs):
+    objs = [PyNode(obj) for obj in _toList(args)]
+
+    if kwargs.get('q') or kwargs.get('query'):
+        if kwargs.get('targetList') or kwargs.get('tl'):
+            return objs[0].targetList()
+        raise NotImplementedError('Only targetList can be queried')
+
+    driver, driven = objs[0], objs[-1]
+    constraint = _scene._add(cls(_scene, '%s_%s1' % (driven.nodeName(), cls.nodeTypeName), driver, driven,
+                                 kwargs.get('mo', kwargs.get('maintainOffset', False))))
+    _reparent(constraint, driven, preserveWorld=False)
+
+    # Connect the outputs, then let the driven node follow the driver
+    driven._constraints.append(constraint)
+    _scene._drivenBy.setdefault(driver, []).append(driven)
+    for channel in cls._drives:
+        for axis in 'XYZ':
+            _scene._connect(Attribute(constraint, 'message'), Attribute(driven, channel + axis))
+
+    return constraint
+
+
+def orientConstraint(*args, **kwargs):
+    return _constrain(OrientConstraint, args, kwargs)
+
+
+def pointConstraint(*args, **kwargs):
+    return _constrain(PointConstraint, args, kwargs)
+
+
+def parentConstraint(*args, **kwargs):
+    return _constrain(ParentConstraint, args, kwargs)
+
+
+### Time and Animation ###
+
+def refresh(suspend=None, force=False):
+    if suspend is not None:
+        _scene.refreshSuspended = bool(suspend)
+
+
+def memory(heapMemory=False, hm=False, megaByte=False, mb=False):
+
+    # The process's resident memory stands in for Maya's heap, where the platform reports it
+    try:
+        with open('/proc/self/statm') as statm:
+            size = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        size = 0
+    return size / 1048576.0 if megaByte or mb else size / 1024.0
+
+
+def currentTime(*args, **kwargs):
+    if kwargs.get('q') or kwargs.get('query') or not args:
+        return _scene.time
+    _scene._setTime(float(args[0]))
+    return _scene.time
+
+
+def playbackOptions(q=False, query=False, **kwargs):
+    flags = {'min': 'min', 'minTime': 'min', 'max': 'max', 'maxTime': 'max',
+             'ast': 'ast', 'animationStartTime': 'ast', 'aet': 'aet', 'animationEndTime': 'aet'}
+
+    if q or query:
+        for flag, value in kwargs.items():
+            if value:
+                return _scene.playback[flags[flag]]
+        raise ValueError('No playback option given to query')
+
+    for flag, value in kwargs.items():
+        _scene.playback[flags[flag]] = float(value)
+
+
+def _curveFor(attr):
+
+    # Reuse the curve driving a plug, or create and connect a new one
+    key = (attr.node, attr.attrName)
+    source = _scene.inputs.get(key)
+    if source is not None and isinstance(source[0], AnimCurve):
+        return source[0]
+
+    curveType = 'animCurveTA' if attr.attrName.startswith('rotate') else \
+                'animCurveTL' if attr.attrName.startswith('translate') else 'animCurveTU'
+    curve = createNode(curveType, name=attr.nodeName() + '_' + attr.attrName)
+    _scene._connect(Attribute(curve, 'output'), attr)
+    return curve
+
+
+def setKeyframe(attr, t=None, time=None, v=None, value=None):
+    attr = _toAttr(attr)
+    when = _scene.time if t is None and time is None else (t if t is not None else time)
+    what = v if v is not None else value
+    if what is None:
+        what = getAttr(attr)
+
+    curve = _curveFor(attr)
+    if isinstance(curve, AnimCurveTA):
+        what = np.radians(what)
+    curve.addKeys([when], [what], keepExistingKeys=True)
+
+
+def _drivingCurves(objs):
+
+    # Every curve driving the objects, ordered by channel name so queries are repeatable.
+    # Curves given directly stand for themselves, like in Maya
+    curves = []
+    for node in [PyNode(obj) for obj in _toList(objs)]:
+        if isinstance(node, AnimCurve):
+            curves.append(node)
+            continue
+        for key in sorted(_scene._connections.get(node, ()), key=lambda key: str(key[1])):
+            source = _scene.inputs[key][0]
+            if key[0] is node and isinstance(source, AnimCurve):
+                curves.append(source)
+    return curves
+
+
+def keyframe(objs, q=False, query=False, timeChange=False, tc=False, valueChange=False, vc=False):
+    if not (q or query):
+        raise NotImplementedError('Only keys can be queried')
+
+    # Every key on every curve driving the objects, values in degrees for angles
+    times = []
+    values = []
+    for curve in _drivingCurves(objs):
+        times += curve.times.tolist()
+        values += (np.degrees(curve.values) if isinstance(curve, AnimCurveTA) else curve.values).tolist()
+
+    if (timeChange or tc) and (valueChange or vc):
+        return list(zip(times, values))
+    return values if valueChange or vc else times
+
+
+def keyTangent(objs, q=False, query=False, inAngle=False, ia=False, outAngle=False, oa=False):
+    if not (q or query):
+        raise NotImplementedError('Only tangents can be queried')
+
+    # Keys are interpolated linearly here, their tangents are left flat
+    return [0.0] * sum(curve.numKeys() for curve in _drivingCurves(objs))
+
+
+def bakeResults(objs, t=None, time=None, simulation=True, attribute=None, at=None):
+    start, end = t if t is not None else time
+    frames = np.arange(start, end + 1)
+
+    # Plugs bake as given, nodes bake their transform channels
+    plugs = []
+    for obj in _toList(objs):
+        obj = PyNode(obj)
+        if isinstance(obj, Attribute):
+            plugs.append(obj)
+        else:
+            names = _toList(attribute or at) or _MATRIX_CHANNELS[:6]
+            plugs += [obj.attr(name) for name in names]
+
+    current = _scene.time
+    samples = np.empty((len(frames), len(plugs)))
+    for f, frame in enumerate(frames):
+        _scene._setTime(frame)
+        samples[f] = [getAttr(plug) for plug in plugs]
+    _scene._setTime(current)
+
+    # Replace whatever drove the plugs with the baked curves
+    for i, plug in enumerate(plugs):
+        key = (plug.node, plug.attrName)
+        source = _scene.inputs.get(key)
+        if source is not None and not isinstance(source[0], AnimCurve):
+            _scene._disconnect(key)
+
+        curve = _curveFor(plug)
+        values = np.radians(samples[:, i]) if isinstance(curve, AnimCurveTA) else samples[:, i]
+        curve.addKeys(frames, values)
+
+
+### Files ###
+
+def sceneName():
+    return _scene.fileName
+
+
+def renameFile(path):
+    _scene.fileName = str(path)
+
+
+def exportAll(path, type=None, force=False, preserveReferences=False):
+    with open(path, 'wb') as f:
+        pickle.dump(_scene, f, 2)
+    return path
+
+
+def openFile(path, force=False):
+    with open(path, 'rb') as f:
+        scene = pickle.load(f)
+    scene.fileName = str(path)
+    setCurrentScene(scene)
+    return path
+
+
+### Undo ###
+
+def undoInfo(openChunk=False, closeChunk=False, q=False, query=False, state=None, stateWithoutFlush=None,
+             **kwargs):
+    if q or query:
+        return _scene._undoEnabled
+
+    # Turning undo off flushes the queue, unless asked not to
+    if state is not None:
+        _scene._undoEnabled = bool(state)
+        if not state:
+            _scene._undoStack = []
+    if stateWithoutFlush is not None:
+        _scene._undoEnabled = bool(stateWithoutFlush)
+
+    if openChunk:
+        if _scene._undoDepth == 0 and _scene._undoEnabled:
+            _scene._undoStack.append(_scene._snapshot())
+        _scene._undoDepth += 1
+    if closeChunk:
+        _scene._undoDepth = max(0, _scene._undoDepth - 1)
+
+
+def undo():
+    if _scene._undoStack and _scene._undoEnabled:
+        _scene._restore(_scene._undoStack.pop())
+
+
+##############################
+#      maya.cmds Subset      #
+##############################
+
+def _names(result):
+    if isinstance(result, (list, tuple)):
+        return [_names(r) for r in result]
+    if isinstance(result, (DependNode, Attribute)):
+        return result.name()
+    return result
+
+
+class _Commands(object):
+    '''
+    The maya.cmds subset, the same commands taking and returning names.
+    Empty lists come back as None wherever Maya returns None.
+    '''
+
+    _KEYS = re.compile(r'^(?P<node>[^.]+)\.(?:ktv|keyTimeValue)\[(?P<start>\d+):(?P<end>\d+)\]$')
+
+    ### Nodes ###
+
+    @staticmethod
+    def createNode(nodeType, name=None, n=None, parent=None, p=None):
+        return createNode(nodeType, name=name or n, parent=parent or p).name()
+
+    @staticmethod
+    def group(*objs, **kwargs):
+        return group(*objs, **kwargs).name()
+
+    @staticmethod
+    def curve(p=None, k=None, d=1, name=None, n=None):
+        return curve(p=p, k=k, d=d, name=name or n).name()
+
+    @staticmethod
+    def rename(obj, name):
+        return rename(obj, name).name()
+
+    @staticmethod
+    def delete(*objs):
+        delete(*objs)
+
+    @staticmethod
+    def parent(*args, **kwargs):
+        return _names(parent(*args, **kwargs))
+
+    @staticmethod
+    def listRelatives(objs, **kwargs):
+        kwargs.pop('fullPath', None)
+        return _names([r for obj in _toList(objs) for r in listRelatives(obj, **kwargs)]) or None
+
+    @staticmethod
+    def ls(*args, **kwargs):
+        return _names(ls(*args, **kwargs))
+
+    @staticmethod
+    def objExists(name):
+        if '.' not in str(name):
+            return objExists(name)
+        node, attr = str(name).split('.', 1)
+        return objExists(node) and PyNode(node).hasAttr(attr)
+
+    @staticmethod
+    def nodeType(obj):
+        return PyNode(obj).nodeType()
+
+    @staticmethod
+    def select(*objs, **kwargs):
+        select(*objs, **kwargs)
+
+    ### Attributes ###
+
+    @staticmethod
+    def attributeQuery(name, node=None, n=None, exists=False, ex=False):
+        return PyNode(node or n).hasAttr(name)
+
+    @staticmethod
+    def addAttr(*args, **kwargs):
+        addAttr(*args, **kwargs)
+
+    @staticmethod
+    def deleteAttr(attr):
+        deleteAttr(attr)
+
+    @staticmethod
+    def getAttr(attr, size=False, **kwargs):
+        if size:
+            return PyNode(str(attr).split('.')[0]).numKeys()
+
+        # Compound values come back as a tuple in a list
+        value = _names(getAttr(attr, **kwargs))
+        return [value] if isinstance(value, tuple) else value
+
+    @staticmethod
+    def setAttr(attr, *args, **kwargs):
+        match = _Commands._KEYS.match(str(attr))
+        if match is None:
+            kwargs.pop('size', None)
+            setAttr(attr, *args, **kwargs)
+            return
+
+        # Key blocks are given as time value pairs, angles in degrees
+        curve = PyNode(match.group('node'))
+        times = np.asarray(args[0::2], dtype=float)
+        values = np.asarray(args[1::2], dtype=float)
+        curve.addKeys(times, np.radians(values) if isinstance(curve, AnimCurveTA) else values,
+                      keepExistingKeys=True)
+
+    @staticmethod
+    def connectAttr(source, destination, **kwargs):
+        connectAttr(source, destination, **kwargs)
+
+    @staticmethod
+    def listConnections(attr, **kwargs):
+        return _names(listConnections(attr, **kwargs)) or None
+
+    @staticmethod
+    def listHistory(objs):
+        return _names(listHistory(objs)) or None
+
+    ### Transforms ###
+
+    @staticmethod
+    def xform(obj, **kwargs):
+        return xform(obj, **kwargs)
+
+    @staticmethod
+    def makeIdentity(obj, **kwargs):
+        makeIdentity(obj, **kwargs)
+
+    @staticmethod
+    def orientConstraint(*args, **kwargs):
+        return _Commands._constrain(orientConstraint, args, kwargs)
+
+    @staticmethod
+    def pointConstraint(*args, **kwargs):
+        return _Commands._constrain(pointConstraint, args, kwargs)
+
+    @staticmethod
+    def parentConstraint(*args, **kwargs):
+        return _Commands._constrain(parentConstraint, args, kwargs)
+
+    @staticmethod
+    def _constrain(command, args, kwargs):
+        result = _names(command(*args, **kwargs))
+        return result if isinstance(result, list) else [result]
+
+    ### Time and Animation ###
+
+    @staticmethod
+    def currentTime(*args, **kwargs):
+        return currentTime(*args, **kwargs)
+
+    @staticmethod
+    def refresh(**kwargs):
+        refresh(**kwargs)
+
+    @staticmethod
+    def memory(**kwargs):
+        return memory(**kwargs)
+
+    @staticmethod
+    def playbackOptions(**kwargs):
+        return playbackOptions(**kwargs)
+
+    @staticmethod
+    def setKeyframe(obj, t=None, time=None, v=None, value=None):
+        curve = PyNode(obj)
+        if not isinstance(curve, AnimCurve):
+            setKeyframe(obj, t=t, time=time, v=v, value=value)
+            return
+
+        # Keys set straight on a curve are in degrees for angles
+        when = t if t is not None else time
+        what = v if v is not None else value
+        curve.addKeys([when], [np.radians(what) if isinstance(curve, AnimCurveTA) else what],
+                      keepExistingKeys=True)
+
+    @staticmethod
+    def findKeyframe(obj, which='next'):
+        curve = PyNode(obj)
+        return curve.getTime(0 if which == 'first' else curve.numKeys() - 1)
+
+    @staticmethod
+    def keyframe(objs, **kwargs):
+        # Times and values come back as one flat list
+        keys = keyframe(objs, **kwargs)
+        return [value for key in keys for value in (key if isinstance(key, tuple) else (key,))] or None
+
+    @staticmethod
+    def keyTangent(*args, **kwargs):
+        # Keys are always interpolated linearly here, so only queries do anything
+        if kwargs.get('q') or kwargs.get('query'):
+            return keyTangent(*args, **kwargs) or None
+
+    @staticmethod
+    def bakeResults(objs, **kwargs):
+        bakeResults(objs, **kwargs)
+
+    ### Undo ###
+
+    @staticmethod
+    def undoInfo(**kwargs):
+        return undoInfo(**kwargs)
+
+    @staticmethod
+    def undo():
+        undo()
+
+
+##############################
+#         Installing         #
+##############################
+
+def install():
+    '''
+    Registers this module as pymel.core, its datatypes as pymel.core.datatypes
+    and its command subset as maya.cmds.
+    Must be called before retargeter or controltools are imported.
+    '''
+    datatypes = types.ModuleType('pymel.core.datatypes')
+    for cls in (Vector, Point, Color, Matrix, EulerRotation, Quaternion):
+        setattr(datatypes, cls.__name__, cls)
+
+    core = sys.modules[__name__]
+    core.datatypes = datatypes
+
+    package = types.ModuleType('pymel')
+    package.core = core
+
+    sys.modules['pymel'] = package
+    sys.modules['pymel.core'] = core
+    sys.modules['pymel.core.datatypes'] = datatypes
+
+    # maya.cmds runs the same scene through names
+    commands = types.ModuleType('maya.cmds')
+    for name in dir(_Commands):
+        if not name.startswith('_'):
+            setattr(commands, name, getattr(_Commands, name))
+
+    maya = types.ModuleType('maya')
+    maya.cmds = commands
+
+    sys.modules['maya'] = maya
+    sys.modules['maya.cmds'] = commands
+
+    # controltools keeps its cache under the Maya app directory
+    os.environ.setdefault('MAYA_APP_DIR', tempfile.gettempdir())
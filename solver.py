@@ -0,0 +1,472 @@
+import os
+import sys
+import math
+import multiprocessing
+import multiprocessing.pool
+import numpy as np
+import transformmath as tm
+
+
+def _localMatrices(world, parentWorld):
+
+    # Local matrices under parents that may carry scale. Rotation is taken between the
+    # unscaled matrices, translation through the full parent inverse
+    rotation = np.matmul(tm.removeScale(world), np.swapaxes(tm.removeScale(parentWorld), -1, -2))
+    inverse = np.linalg.inv(parentWorld)
+    translation = np.einsum('...i,...ij->...j', world[..., 3, :3], inverse[..., :3, :3]) + inverse[..., 3, :3]
+
+    return tm.composeMatrix(rotation, translation)
+
+def _worldMatrices(local, parentWorld, scales):
+
+    # The inverse of _localMatrices, with the scale of each row put back
+    rotation = scales[..., None] * np.matmul(local[..., :3, :3], tm.removeScale(parentWorld))
+    translation = np.einsum('...i,...ij->...j', local[..., 3, :3], parentWorld[..., :3, :3]) + parentWorld[..., 3, :3]
+
+    return tm.composeMatrix(rotation, translation)
+
+
+class RetargetSolver(object):
+    '''
+    A batched solve of the bind network built by retargeter._bind.
+    The target's world rotation follows the source's world rotation through a
+    fixed offset, and its position is carried by the source's parent. Targets keep
+    the world scale they had at rest, such as that of a scaled group above them.
+    All inputs and outputs are (frames, pairs, 4, 4) world matrices.
+    '''
+
+    def __init__(self, rotateOffsets, pivotOffsets, parentIndices, parentMatrices, jointOrients, rotateOrders,
+                 sourceIndices=None, translateMask=None, rotateMask=None, restLocal=None, scales=None):
+        self.sourceIndices = None if sourceIndices is None else np.asarray(sourceIndices, dtype=int)
+        self.rotateOffsets = np.asarray(rotateOffsets, dtype=float)
+        self.pivotOffsets = np.asarray(pivotOffsets, dtype=float)
+        self.parentIndices = np.asarray(parentIndices, dtype=int)
+        self.parentMatrices = np.asarray(parentMatrices, dtype=float)
+        self.jointOrients = np.asarray(jointOrients, dtype=float)
+        self.rotateOrders = list(rotateOrders)
+
+        # Channels that are not bound hold their rest local values
+        count = len(self.rotateOffsets)
+        self.translateMask = np.ones(count, dtype=bool) if translateMask is None else np.asarray(translateMask, dtype=bool)
+        self.rotateMask = np.ones(count, dtype=bool) if rotateMask is None else np.asarray(rotateMask, dtype=bool)
+        self.restLocal = tm.composeMatrix(shape=(count,)) if restLocal is None else np.asarray(restLocal, dtype=float)
+        self.scales = np.ones((count, 3)) if scales is None else np.asarray(scales, dtype=float)
+
+        self._partial = ~(self.translateMask & self.rotateMask)
+        self._hierarchy = ForwardKinematics(self.parentIndices)
+
+    @classmethod
+    def fromRestPose(cls, sourceWorld, sourceParentWorld, targetWorld, targetParents=None,
+                     targetParentWorld=None, jointOrients=None, rotateOrders=None, sourceIndices=None,
+                     translate=None, rotate=None):
+        '''
+        Captures the bind offsets from a single pose of the sources and targets.
+        :param sourceWorld: The (pairs, 4, 4) source world matrices
+        :param sourceParentWorld: The (pairs, 4, 4) source parent world matrices
+        :param targetWorld: The (pairs, 4, 4) target world matrices
+        :param targetParents: For each pair, the index of the pair driving the target's parent, or -1
+        :param targetParentWorld: The (pairs, 4, 4) target parent world matrices
+        :param jointOrients: The (pairs, 3) target joint orients in radians
+        :param rotateOrders: The target rotate order indices
+        :param sourceIndices: For each pair, the index of its source, when sources are shared between pairs
+        :param translate: For each pair, whether its translation is bound, all are if None
+        :param rotate: For each pair, whether its rotation is bound, all are if None
+        :return: The new solver
+        '''
+        sourceWorld = np.asarray(sourceWorld, dtype=float)
+        sourceParentWorld = np.asarray(sourceParentWorld, dtype=float)
+        if sourceIndices is not None:
+            sourceWorld = sourceWorld[sourceIndices]
+            sourceParentWorld = sourceParentWorld[sourceIndices]
+
+        targetWorld = np.asarray(targetWorld, dtype=float)
+        count = len(targetWorld)
+
+        if targetParents is None:
+            targetParents = [-1] * count
+        if targetParentWorld is None:
+            targetParentWorld = tm.composeMatrix(shape=(count,))
+        if jointOrients is None:
+            jointOrients = np.zeros((count, 3))
+        if rotateOrders is None:
+            rotateOrders = [0] * count
+
+        # The rotation offset from the source to the target in world space, ignoring scale
+        rotateOffsets = np.matmul(tm.removeScale(targetWorld), np.swapaxes(tm.removeScale(sourceWorld), -1, -2))
+
+        # The target's position in the space of the source's parent
+        parentInverse = np.linalg.inv(sourceParentWorld)
+        pivotOffsets = np.einsum('ni,nij->nj', targetWorld[:, 3, :3], parentInverse[:, :3, :3]) + parentInverse[:, 3, :3]
+
+        # The target's local matrix, held by any channel that is not bound
+        targetParents = np.asarray(targetParents, dtype=int)
+        parentWorld = np.array(targetParentWorld, dtype=float)
+        bound = targetParents >= 0
+        parentWorld[bound] = targetWorld[targetParents[bound]]
+        restLocal = _localMatrices(targetWorld, parentWorld)
+
+        # The world scale of each target's axes
+        scales = np.linalg.norm(targetWorld[:, :3, :3], axis=-1)
+
+        return cls(rotateOffsets, pivotOffsets, targetParents, targetParentWorld,
+                   tm.eulerToMatrix(jointOrients), rotateOrders, sourceIndices,
+                   translate, rotate, restLocal, scales)
+
+    def __len__(self):
+        return len(self.rotateOffsets)
+
+    def subset(self, indices):
+        '''
+        A solver for some of the pairs, solving them exactly as this one does.
+        :param indices: The pairs to keep, which must include the parent pair of each of them
+        :return: The new solver, which takes the same source matrices as this one
+        '''
+        # The extra last entry maps a parent index of -1 to itself
+        indices = np.sort(np.asarray(indices, dtype=int))
+        remap = np.full(len(self) + 1, -1)
+        remap[indices] = np.arange(len(indices))
+
+        parents = self.parentIndices[indices]
+        if np.any(remap[parents[parents >= 0]] < 0):
+            raise ValueError('A subset must include the parent of every pair in it')
+
+        # Shared sources stay indexed into the full source matrices
+        sourceIndices = indices if self.sourceIndices is None else self.sourceIndices[indices]
+
+        return type(self)(self.rotateOffsets[indices], self.pivotOffsets[indices], remap[parents],
+                          self.parentMatrices[indices], self.jointOrients[indices],
+                          [self.rotateOrders[i] for i in indices], sourceIndices,
+                          self.translateMask[indices], self.rotateMask[indices], self.restLocal[indices],
+                          self.scales[indices])
+
+    def solve(self, sourceWorld, sourceParentWorld):
+        '''
+        Solves the target world matrices for a block of frames.
+        Shared sources are given once and gathered for every pair that uses them.
+        :param sourceWorld: The (frames, sources, 4, 4) source world matrices
+        :param sourceParentWorld: The (frames, sources, 4, 4) source parent world matrices
+        :return: The (frames, pairs, 4, 4) target world matrices
+        '''
+        sourceWorld = np.asarray(sourceWorld, dtype=float)
+        sourceParentWorld = np.asarray(sourceParentWorld, dtype=float)
+        if self.sourceIndices is not None:
+            sourceWorld = sourceWorld[:, self.sourceIndices]
+            sourceParentWorld = sourceParentWorld[:, self.sourceIndices]
+
+        rotation = np.matmul(self.rotateOffsets, tm.removeScale(sourceWorld))
+        position = np.einsum('ni,fnij->fnj', self.pivotOffsets, sourceParentWorld[..., :3, :3]) + sourceParentWorld[..., 3, :3]
+        world = tm.composeMatrix(self.scales[:, :, None] * rotation, position)
+
+        # Partial binds restore their unbound channels, parents first so children see the result
+        if self._partial.any():
+            for level in self._hierarchy.levels:
+                joints = level[self._partial[level]]
+                if len(joints) == 0:
+                    continue
+
+                parents = self.parentIndices[joints]
+                parentWorld = np.broadcast_to(self.parentMatrices[joints], world[:, joints].shape).copy()
+                bound = parents >= 0
+                parentWorld[:, bound] = world[:, parents[bound]]
+
+                local = _localMatrices(world[:, joints], parentWorld)
+                rest = self.restLocal[joints]
+                held = ~self.rotateMask[joints]
+                local[:, held, :3, :3] = rest[held, :3, :3]
+                held = ~self.translateMask[joints]
+                local[:, held, 3, :3] = rest[held, 3, :3]
+
+                world[:, joints] = _worldMatrices(local, parentWorld, self.scales[joints])
+
+        return world
+
+    def localize(self, targetWorld):
+        '''
+        Converts solved target world matrices to local channel values.
+        :param targetWorld: The (frames, pairs, 4, 4) target world matrices
+        :return: The (frames, pairs, 3) translations and (frames, pairs, 3) rotations in radians
+        '''
+        targetWorld = np.asarray(targetWorld, dtype=float)
+
+        # Parents that are bound use their solved matrix, the rest stay where they were
+        parentWorld = np.broadcast_to(self.parentMatrices, targetWorld.shape).copy()
+        bound = self.parentIndices >= 0
+        parentWorld[:, bound] = targetWorld[:, self.parentIndices[bound]]
+
+        local = _localMatrices(targetWorld, parentWorld)
+
+        # Remove the joint orient, which sits between rotate and translate
+        rotation = np.matmul(local[..., :3, :3], np.swapaxes(self.jointOrients, -1, -2))
+
+        # Extract the euler values for each group of rotate orders
+        rotate = np.empty(targetWorld.shape[:-2] + (3,))
+        orders = np.asarray(self.rotateOrders)
+        for order in set(self.rotateOrders):
+            group = orders == order
+            rotate[:, group] = tm.matrixToEuler(rotation[:, group], order)
+
+        return local[..., 3, :3], rotate
+
+
+class ForwardKinematics(object):
+    '''
+    Computes world matrices from local matrices one hierarchy level at a time.
+    Joints are grouped by depth so each level is a single vectorized multiply.
+    The last result is cached, and only joints marked dirty, along with their
+    descendants, are recomputed on the next evaluation.
+    '''
+
+    def __init__(self, parents):
+        '''
+        :param parents: For each joint, the index of its parent, or -1 for roots
+        '''
+        self.parents = np.asarray(parents, dtype=int)
+
+        # Work out each joint's depth, parents may be listed after their children
+        depths = np.full(len(self.parents), -1)
+        for i in range(len(self.parents)):
+            chain = []
+            joint = i
+            while joint >= 0 and depths[joint] < 0:
+                chain.append(joint)
+                joint = self.parents[joint]
+            depth = depths[joint] if joint >= 0 else -1
+            for link in reversed(chain):
+                depth += 1
+                depths[link] = depth
+
+        self.depths = depths
+        self.levels = [np.flatnonzero(depths == d) for d in range(depths.max() + 1)] if len(depths) else []
+
+        self._local = None
+        self._roots = None
+        self._world = None
+        self._dirty = np.ones(len(self.parents), dtype=bool)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def solve(self, local, rootMatrices=None):
+        '''
+        Computes world matrices without touching the cache.
+        :param local: The (frames, joints, 4, 4) local matrices
+        :param rootMatrices: The (frames, joints, 4, 4) parent matrices used by roots, identity if None
+        :return: The (frames, joints, 4, 4) world matrices
+        '''
+        local = np.asarray(local, dtype=float)
+        world = local.copy()
+
+        for level in self.levels:
+            parents = self.parents[level]
+            carried = parents >= 0
+
+            if carried.any():
+                world[:, level[carried]] = np.matmul(local[:, level[carried]], world[:, parents[carried]])
+            if rootMatrices is not None and not carried.all():
+                roots = level[~carried]
+                world[:, roots] = np.matmul(local[:, roots], rootMatrices[:, roots])
+
+        return world
+
+    def setLocal(self, local, indices=None, rootMatrices=None):
+        '''
+        Updates the cached local matrices, marking the changed joints dirty.
+        :param local: The (frames, n, 4, 4) local matrices of the changed joints
+        :param indices: The n joint indices being changed, all joints if None
+        :param rootMatrices: The (frames, n, 4, 4) parent matrices used by any roots among them
+        '''
+        local = np.asarray(local, dtype=float)
+        if indices is None:
+            indices = np.arange(len(self.parents))
+
+        # A new frame count invalidates the whole cache
+        if self._local is None or self._local.shape[0] != local.shape[0]:
+            self._local = tm.composeMatrix(shape=(local.shape[0], len(self.parents)))
+            self._roots = tm.composeMatrix(shape=(local.shape[0], len(self.parents)))
+            self._world = None
+            self._dirty[:] = True
+
+        self._local[:, indices] = local
+        if rootMatrices is not None:
+            self._roots[:, indices] = rootMatrices
+        self._dirty[indices] = True
+
+    def getWorld(self):
+        '''
+        Evaluates the dirty joints and returns every cached world matrix.
+        :return: The (frames, joints, 4, 4) world matrices
+        '''
+        if self._local is None:
+            raise RuntimeError('No local matrices have been set')
+
+        if self._world is None:
+            self._world = self.solve(self._local, self._roots)
+            self._dirty[:] = False
+            return self._world
+
+        # Walk down the levels, a joint is stale if it or its parent changed
+        for level in self.levels:
+            parents = self.parents[level]
+            stale = self._dirty[level] | ((parents >= 0) & self._dirty[np.maximum(parents, 0)])
+            if not stale.any():
+                continue
+
+            joints = level[stale]
+            parents = parents[stale]
+            self._dirty[joints] = True
+
+            parentWorld = self._roots[:, joints].copy()
+            carried = parents >= 0
+            parentWorld[:, carried] = self._world[:, parents[carried]]
+            self._world[:, joints] = np.matmul(self._local[:, joints], parentWorld)
+
+        self._dirty[:] = False
+        return self._world
+
+
+def jointGroups(parents, count):
+    '''
+    Splits a hierarchy into groups of whole trees, balanced by joint count.
+    Trees are never split, so each group can be solved on its own.
+    :param parents: For each joint, the index of its parent, or -1 for roots
+    :param count: The most groups to make
+    :return: A list of sorted index arrays, one per non empty group
+    '''
+    # Every joint belongs to the tree of its topmost ancestor
+    parents = np.asarray(parents, dtype=int)
+    roots = np.arange(len(parents))
+    for level in ForwardKinematics(parents).levels:
+        carried = level[parents[level] >= 0]
+        roots[carried] = roots[parents[carried]]
+
+    trees = [np.flatnonzero(roots == root) for root in np.unique(roots)]
+
+    # Largest trees first, each into the emptiest group, ties broken by order
+    groups = [[] for i in range(max(1, min(count, len(trees))))]
+    sizes = [0] * len(groups)
+    for tree in sorted(trees, key=lambda tree: (-len(tree), tree[0])):
+        emptiest = sizes.index(min(sizes))
+        groups[emptiest].append(tree)
+        sizes[emptiest] += len(tree)
+
+    return [np.sort(np.concatenate(group)) for group in groups if group]
+
+
+def useMayapy():
+    '''
+    Points multiprocessing at mayapy when running inside an interactive Maya, whose own
+    executable would open another Maya for every process started. Does nothing elsewhere.
+    :return: The executable new processes are started with
+    '''
+    folder, name = os.path.split(sys.executable)
+    if not name.lower().startswith('maya') or name.lower().startswith('mayapy'):
+        return sys.executable
+
+    # mayapy sits beside the Maya executable, or in the bin folder of a macOS bundle
+    mayapy = 'mayapy.exe' if sys.platform == 'win32' else 'mayapy'
+    for path in (os.path.join(folder, mayapy), os.path.join(folder, os.pardir, 'bin', mayapy)):
+        if os.path.isfile(path):
+            try:
+                multiprocessing.set_executable(os.path.normpath(path))
+            except (ImportError, AttributeError):
+                # Python 2 only spawns on Windows, processes fork everywhere else
+                pass
+            return os.path.normpath(path)
+
+    return sys.executable
+
+
+# The group solvers of a process pool worker, set once when the worker starts
+_workerSolvers = None
+
+def _initWorker(solvers):
+
+    global _workerSolvers
+    _workerSolvers = solvers
+
+def _solveChunk(task):
+
+    # Thread pools hand over their solver, process pools look theirs up
+    group, retarget, sourceWorld, sourceParentWorld = task
+    if retarget is None:
+        retarget = _workerSolvers[group]
+
+    return retarget.localize(retarget.solve(sourceWorld, sourceParentWorld))
+
+
+class ParallelSolver(object):
+    '''
+    Solves and localizes a RetargetSolver on a pool of workers, splitting each
+    block of frames into chunks and the pairs into groups of whole target trees.
+    Threads share memory and scale because NumPy releases the GIL in its loops,
+    processes copy each chunk but sidestep the GIL entirely. Every chunk is
+    written back to its own place, so results never depend on which finishes first.
+    '''
+
+    def __init__(self, retarget, workers=None, processes=False, groups=None):
+        '''
+        :param retarget: The RetargetSolver to run
+        :param workers: The number of workers, one per core if None
+        :param processes: Use a process pool instead of a thread pool, started with mayapy inside Maya
+        :param groups: The most joint groups to split the pairs into, one per worker if None
+        '''
+        self.retarget = retarget
+        self.workers = multiprocessing.cpu_count() if workers is None else max(1, workers)
+
+        self.groups = jointGroups(retarget.parentIndices, self.workers if groups is None else groups)
+        self._solvers = [retarget.subset(group) for group in self.groups] if len(self.groups) > 1 else [retarget]
+
+        self._processes = processes
+        self._pool = None
+        if self.workers > 1:
+            if processes:
+                useMayapy()
+                self._pool = multiprocessing.Pool(self.workers, _initWorker, (self._solvers,))
+            else:
+                self._pool = multiprocessing.pool.ThreadPool(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def localize(self, sourceWorld, sourceParentWorld):
+        '''
+        Solves the target local channels for a block of frames.
+        :param sourceWorld: The (frames, sources, 4, 4) source world matrices
+        :param sourceParentWorld: The (frames, sources, 4, 4) source parent world matrices
+        :return: The (frames, pairs, 3) translations and (frames, pairs, 3) rotations in radians
+        '''
+        if self._pool is None:
+            return self.retarget.localize(self.retarget.solve(sourceWorld, sourceParentWorld))
+
+        sourceWorld = np.asarray(sourceWorld, dtype=float)
+        sourceParentWorld = np.asarray(sourceParentWorld, dtype=float)
+
+        # Enough frame chunks per group to keep every worker busy
+        count = len(sourceWorld)
+        chunkSize = max(1, int(math.ceil(count / float(math.ceil(self.workers / float(len(self._solvers)))))))
+        chunks = [slice(i, min(i + chunkSize, count)) for i in range(0, count, chunkSize)]
+
+        tasks = []
+        places = []
+        for group, indices in enumerate(self.groups):
+            retarget = None if self._processes else self._solvers[group]
+            for chunk in chunks:
+                tasks.append((group, retarget, sourceWorld[chunk], sourceParentWorld[chunk]))
+                places.append((chunk, indices))
+
+        translate = np.empty((count, len(self.retarget), 3))
+        rotate = np.empty((count, len(self.retarget), 3))
+        for (chunk, indices), (t, r) in zip(places, self._pool.map(_solveChunk, tasks)):
+            translate[chunk, indices] = t
+            rotate[chunk, indices] = r
+
+        return translate, rotate
@@ -0,0 +1,60 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bakecache
+
+
+class TestBakeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='bakecacheTest')
+        self.cache = bakecache.BakeCache(self.folder)
+        self.key = bakecache.BakeCache.key('bake', np.arange(3))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def testRoundTrip(self):
+        self.cache.store(self.key, translate=np.arange(6.0).reshape(2, 3), rotate=np.ones((2, 3)))
+        entry = self.cache.load(self.key, ['translate', 'rotate'])
+
+        self.assertIsInstance(entry['translate'], np.memmap)
+        np.testing.assert_array_equal(entry['translate'], np.arange(6.0).reshape(2, 3))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 0))
+
+        # Nothing is left behind from writing the entry
+        self.assertEqual(os.listdir(self.folder), [self.key])
+
+    def testPartialEntries(self):
+        # An empty entry, one missing an array and one with a damaged array are all misses
+        path = os.path.join(self.folder, self.key)
+        os.makedirs(path)
+        self.assertIsNone(self.cache.load(self.key))
+
+        np.save(os.path.join(path, 'translate.npy'), np.zeros(3))
+        self.assertIsNone(self.cache.load(self.key, ['translate', 'rotate']))
+
+        with open(os.path.join(path, 'rotate.npy'), 'wb') as damaged:
+            damaged.write(b'\x93NUMPY')
+        self.assertIsNone(self.cache.load(self.key, ['translate', 'rotate']))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+
+        # Storing over it replaces the whole entry
+        self.cache.store(self.key, translate=np.ones(3), rotate=np.ones(3))
+        self.assertIsNotNone(self.cache.load(self.key, ['translate', 'rotate']))
+
+    def testEvict(self):
+        for i in range(4):
+            self.cache.store(bakecache.BakeCache.key(i), values=np.zeros(1000))
+        self.cache.evict(maxBytes=self.cache.size // 2)
+        self.assertEqual(len(self.cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pymel.core as pmc
+except ImportError:
+    # Outside of Maya, run against the in-memory scene
+    import scenegraph
+    scenegraph.install()
+    import pymel.core as pmc
+
+os.environ.setdefault('MAYA_APP_DIR', tempfile.gettempdir())
+import retargeter
+import bakecache
+
+
+def _createSkeletons(frames=20):
+
+    # A keyed source chain and a target chain in a different pose
+    pmc.newFile(force=True)
+    pmc.playbackOptions(ast=1, aet=frames)
+    pmc.select(clear=True)
+    source = [pmc.joint(p=(0, i, i * 0.3), name='src:j%d' % i) for i in range(5)]
+    pmc.select(clear=True)
+    target = [pmc.joint(p=(1, i * 1.1, 0), name='tgt:j%d' % i) for i in range(5)]
+
+    for i, joint in enumerate(source):
+        pmc.setKeyframe(joint.rotateX, t=1, v=0.0)
+        pmc.setKeyframe(joint.rotateX, t=frames, v=40.0 + i)
+        pmc.setKeyframe(joint.rotateY, t=1, v=5.0)
+        pmc.setKeyframe(joint.rotateY, t=frames, v=-30.0)
+    pmc.setKeyframe(source[0].translateX, t=1, v=0.0)
+    pmc.setKeyframe(source[0].translateX, t=frames, v=3.0)
+    target[2].rotateZ.set(15)
+
+    return source, target
+
+def _scaleTargetParent(target, scale=2.0):
+
+    # Put the target skeleton under a scaled, rotated and moved group
+    group = pmc.group(target[0], name='tgtGrp')
+    group.scale.set((scale, scale, scale))
+    group.rotateZ.set(30.0)
+    group.translate.set((2.0, 1.0, 0.0))
+
+    return group
+
+def _sampleWorldMatrices(nodes, frames=(1, 7, 20)):
+
+    # World matrices of the nodes at a few frames
+    matrices = []
+    for frame in frames:
+        pmc.currentTime(frame)
+        matrices.append([pmc.xform(node, q=True, ws=True, m=True) for node in nodes])
+    pmc.currentTime(frames[0])
+
+    return np.array(matrices)
+
+
+class TestBindOffsetCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='retargeterTest')
+
+    def tearDown(self):
+        retargeter.setBackend('pymel')
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def testBindTwice(self):
+        # The second bind of the same pair loads the offsets, and must drive the target the same way
+        for backend in ('pymel', 'cmds'):
+            retargeter.setBackend(backend)
+            for translate, rotate in ((True, True), (True, False), (False, True)):
+                cache = bakecache.BakeCache(os.path.join(self.folder, '%s%d%d' % (backend, translate, rotate)))
+
+                results = []
+                for i in range(2):
+                    source, target = _createSkeletons()
+                    retargeter.bindHierarchy('src:j0', 'tgt:j0', translate, rotate, cache=cache)
+                    results.append(_sampleWorldMatrices(target))
+
+                self.assertEqual(cache.hits, 1)
+                np.testing.assert_allclose(results[1], results[0], atol=1e-9, err_msg=backend)
+
+
+
+class TestVerifyBake(unittest.TestCase):
+
+    def tearDown(self):
+        retargeter.setBackend('pymel')
+
+    def _assertPassed(self, **kwargs):
+        report = retargeter.verifyBake(raiseOnFailure=False, **kwargs)
+        self.assertTrue(report['passed'], (kwargs, report['summary']))
+
+    def testOutOfCore(self):
+        for backend in ('pymel', 'cmds'):
+            retargeter.setBackend(backend)
+            source, target = _createSkeletons()
+            retargeter.bindHierarchy('src:j0', 'tgt:j0')
+            self._assertPassed(outOfCore=True)
+
+    def testScaledParent(self):
+        # The solver must match the constraints when the targets sit under a scaled group
+        for backend in ('pymel', 'cmds'):
+            retargeter.setBackend(backend)
+            for kwargs in ({'outOfCore': True}, {'outOfCore': True, 'ranges': [(1, 8), (12, 20)]}):
+                source, target = _createSkeletons()
+                _scaleTargetParent(target)
+                retargeter.bindHierarchy('src:j0', 'tgt:j0')
+                self._assertPassed(**kwargs)
+
+    def testScaledParentPartial(self):
+        # Rotation only binds hold their rest translation in the scaled space
+        for backend in ('pymel', 'cmds'):
+            retargeter.setBackend(backend)
+            source, target = _createSkeletons()
+            _scaleTargetParent(target)
+            retargeter.bindPairs(list(zip(source, target))[:2], translate=True, rotate=True)
+            retargeter.bindPairs(list(zip(source, target))[2:], translate=False, rotate=True)
+            self._assertPassed(outOfCore=True)
+
+
+
+class TestSparseTimes(unittest.TestCase):
+
+    def tearDown(self):
+        retargeter.setBackend('pymel')
+
+    def testConstrainedSource(self):
+        # A source without keys of its own is sampled at the keys of the control driving it
+        for backend in ('pymel', 'cmds'):
+            retargeter.setBackend(backend)
+            source, target = _createSkeletons(frames=40)
+            control = pmc.createNode('transform', name='control')
+            pmc.setKeyframe(control.rotateX, t=1, v=0.0)
+            pmc.setKeyframe(control.rotateX, t=13, v=80.0)
+            pmc.setKeyframe(control.rotateX, t=27, v=-30.0)
+            pmc.orientConstraint(control, source[4])
+
+            times = retargeter._rangeTimes([(1, 40)], [source[4]])
+            self.assertTrue(set([1.0, 13.0, 27.0, 40.0]) <= set(times.tolist()), times)
+
+
+if __name__ == '__main__':
+    unittest.main()
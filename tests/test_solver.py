@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import solver
+import transformmath as tm
+
+
+def _randomLocal(random, shape):
+
+    # Rigid local matrices with random rotations and offsets
+    return tm.composeMatrix(tm.eulerToMatrix(random.uniform(-np.pi, np.pi, shape + (3,))), random.randn(*(shape + (3,))))
+
+
+class TestForwardKinematics(unittest.TestCase):
+
+    # Parents listed after some of their children, with two roots
+    PARENTS = [-1, 0, 5, 2, 0, 1, -1, 6, 3]
+
+    def testSolve(self):
+        random = np.random.RandomState(0)
+        local = _randomLocal(random, (3, len(self.PARENTS)))
+        world = solver.ForwardKinematics(self.PARENTS).solve(local)
+
+        # Walk each joint's chain up to its root
+        for joint in range(len(self.PARENTS)):
+            expected = local[:, joint]
+            parent = self.PARENTS[joint]
+            while parent >= 0:
+                expected = np.matmul(expected, local[:, parent])
+                parent = self.PARENTS[parent]
+            np.testing.assert_allclose(world[:, joint], expected, atol=1e-12)
+
+    def testDirtyUpdates(self):
+        # Updating a few joints at a time must match solving everything again
+        random = np.random.RandomState(1)
+        hierarchy = solver.ForwardKinematics(self.PARENTS)
+        local = _randomLocal(random, (1, len(self.PARENTS)))
+        hierarchy.setLocal(local)
+        np.testing.assert_allclose(hierarchy.getWorld(), hierarchy.solve(local), atol=1e-12)
+
+        for step in range(20):
+            changed = random.choice(len(self.PARENTS), random.randint(1, 4), replace=False)
+            local[:, changed] = _randomLocal(random, (1, len(changed)))
+            hierarchy.setLocal(local[:, changed], changed)
+            np.testing.assert_allclose(hierarchy.getWorld(), hierarchy.solve(local), atol=1e-12)
+
+    def testLevels(self):
+        levels = solver.ForwardKinematics(self.PARENTS).levels
+        self.assertEqual([sorted(level.tolist()) for level in levels], [[0, 6], [1, 4, 7], [5], [2], [3], [8]])
+
+
+if __name__ == '__main__':
+    unittest.main()
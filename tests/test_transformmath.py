@@ -0,0 +1,229 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pymel.core as pmc
+except ImportError:
+    # Outside of Maya, run against the in-memory scene
+    import scenegraph
+    scenegraph.install()
+    import pymel.core as pmc
+
+import pymel.core.datatypes as dt
+import transformmath as tm
+
+os.environ.setdefault('MAYA_APP_DIR', tempfile.gettempdir())
+import controltools
+
+
+def _axisReference(axis, angle):
+
+    # Maya's row vector rotations, written out per axis
+    c, s = np.cos(angle), np.sin(angle)
+    if axis == 'x':
+        return np.array([[1, 0, 0], [0, c, s], [0, -s, c]])
+    if axis == 'y':
+        return np.array([[c, 0, -s], [0, 1, 0], [s, 0, c]])
+    return np.array([[c, s, 0], [-s, c, 0], [0, 0, 1]])
+
+def _eulerReference(euler, order):
+
+    # The first axis in the order is applied first, so its matrix comes first
+    matrix = np.identity(3)
+    for axis in order:
+        matrix = np.dot(matrix, _axisReference(axis, euler['xyz'.index(axis)]))
+    return matrix
+
+def _quaternionReference(axis, angle):
+
+    # Rodrigues' formula, transposed into row vector form
+    axis = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+    cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    column = np.cos(angle) * np.identity(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * np.outer(axis, axis)
+    quat = np.append(axis * np.sin(angle / 2.0), np.cos(angle / 2.0))
+    return quat, column.T
+
+def _moveToTransformReference(obj, target, upVector=dt.Vector(0, 1, 0)):
+
+    # move_to_transform as it was written with pymel datatypes
+    worldUp = dt.Vector(0, 1, 0)
+    targetSpace = target.getMatrix(worldSpace=True)
+    targetUp = upVector.rotateBy(targetSpace)
+    rotation = worldUp.rotateTo(targetUp)
+    obj.setMatrix(targetSpace, worldSpace=True)
+    obj.setRotation(rotation, space='world')
+
+
+# Angles as first, middle and last in the rotate order, clear of gimbal lock
+ANGLES = np.radians([[0.0, 0.0, 0.0],
+                     [90.0, 0.0, 0.0],
+                     [30.0, -45.0, 60.0],
+                     [-120.0, 80.0, 15.0],
+                     [170.0, -10.0, -170.0],
+                     [5.0, 60.0, -95.0]])
+
+def _eulers(order):
+
+    # The angles moved into x, y, z slots so the middle axis stays inside +-90 degrees
+    return ANGLES[:, [order.index(axis) for axis in 'xyz']]
+
+
+class TestEuler(unittest.TestCase):
+
+    def testAxisMatrix(self):
+        # A quarter turn about x takes y onto z, about y takes z onto x and about z takes x onto y
+        quarter = np.pi / 2.0
+        np.testing.assert_allclose(np.dot([0, 1, 0], tm.axisMatrix('x', quarter)), [0, 0, 1], atol=1e-12)
+        np.testing.assert_allclose(np.dot([0, 0, 1], tm.axisMatrix('y', quarter)), [1, 0, 0], atol=1e-12)
+        np.testing.assert_allclose(np.dot([1, 0, 0], tm.axisMatrix('z', quarter)), [0, 1, 0], atol=1e-12)
+
+    def testEulerToMatrix(self):
+        for order in tm.ROTATE_ORDERS:
+            eulers = _eulers(order)
+            expected = np.array([_eulerReference(euler, order) for euler in eulers])
+            np.testing.assert_allclose(tm.eulerToMatrix(eulers, order), expected, atol=1e-12, err_msg=order)
+
+            # Orders can be given as rotateOrder indices
+            index = tm.ROTATE_ORDERS.index(order)
+            np.testing.assert_allclose(tm.eulerToMatrix(eulers, index), expected, atol=1e-12, err_msg=order)
+
+    def testMatrixToEuler(self):
+        for order in tm.ROTATE_ORDERS:
+            eulers = _eulers(order)
+            matrices = np.array([_eulerReference(euler, order) for euler in eulers])
+            np.testing.assert_allclose(tm.matrixToEuler(matrices, order), eulers, atol=1e-9, err_msg=order)
+
+    def testGimbalLock(self):
+        # Any angles that rebuild the same matrix are fine once the middle axis is locked
+        for order in tm.ROTATE_ORDERS:
+            euler = np.zeros(3)
+            euler['xyz'.index(order[1])] = np.pi / 2.0
+            euler['xyz'.index(order[0])] = 0.3
+            euler['xyz'.index(order[2])] = -0.7
+            matrix = _eulerReference(euler, order)
+            np.testing.assert_allclose(tm.eulerToMatrix(tm.matrixToEuler(matrix, order), order), matrix,
+                                       atol=1e-9, err_msg=order)
+
+
+class TestQuaternion(unittest.TestCase):
+
+    AXES = [(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 2, 3), (-1, 0.5, 0.25)]
+    ANGLES = [0.0, 0.1, np.pi / 2.0, 2.5, np.pi - 1e-6]
+
+    def testQuaternionToMatrix(self):
+        for axis in self.AXES:
+            for angle in self.ANGLES:
+                quat, matrix = _quaternionReference(axis, angle)
+                np.testing.assert_allclose(tm.quaternionToMatrix(quat), matrix, atol=1e-12)
+
+                # Scaled quaternions are normalized first
+                np.testing.assert_allclose(tm.quaternionToMatrix(quat * 3.0), matrix, atol=1e-12)
+
+    def testMatrixToQuaternion(self):
+        for axis in self.AXES:
+            for angle in self.ANGLES:
+                quat, matrix = _quaternionReference(axis, angle)
+                result = tm.matrixToQuaternion(matrix)
+                self.assertGreaterEqual(result[3], 0.0)
+                np.testing.assert_allclose(result, quat, atol=1e-9)
+
+    def testEulerRoundTrip(self):
+        for order in tm.ROTATE_ORDERS:
+            eulers = _eulers(order)
+            quat = tm.eulerToQuaternion(eulers, order)
+            matrices = np.array([_eulerReference(euler, order) for euler in eulers])
+            np.testing.assert_allclose(tm.quaternionToMatrix(quat), matrices, atol=1e-12, err_msg=order)
+            np.testing.assert_allclose(tm.quaternionToEuler(quat, order), eulers, atol=1e-9, err_msg=order)
+
+    def testSlerp(self):
+        identity = np.array([0.0, 0.0, 0.0, 1.0])
+        quarter, _ = _quaternionReference((0, 0, 1), np.pi / 2.0)
+        eighth, _ = _quaternionReference((0, 0, 1), np.pi / 4.0)
+
+        np.testing.assert_allclose(tm.slerp(identity, quarter, 0.0), identity, atol=1e-12)
+        np.testing.assert_allclose(tm.slerp(identity, quarter, 1.0), quarter, atol=1e-12)
+        np.testing.assert_allclose(tm.slerp(identity, quarter, 0.5), eighth, atol=1e-12)
+
+        # The negated end is the same rotation, the shortest path still turns through an eighth
+        halfway = tm.slerp(identity, -quarter, 0.5)
+        np.testing.assert_allclose(tm.quaternionToMatrix(halfway), tm.quaternionToMatrix(eighth), atol=1e-12)
+
+        # Weights broadcast against the quaternions
+        weights = np.linspace(0.0, 1.0, 5)
+        steps = tm.slerp(identity, quarter, weights)
+        expected = np.array([_quaternionReference((0, 0, 1), w * np.pi / 2.0)[0] for w in weights])
+        np.testing.assert_allclose(steps, expected, atol=1e-12)
+
+        # Equal rotations fall back to a linear blend
+        np.testing.assert_allclose(tm.slerp(quarter, quarter, 0.3), quarter, atol=1e-12)
+
+    def testRotateBetween(self):
+        starts = np.array([[1, 0, 0], [0, 1, 0], [1, 2, 3], [0, 0, 2]], dtype=float)
+        ends = np.array([[0, 1, 0], [0, 0, 5], [-2, 1, 0.5], [1, 1, 1]], dtype=float)
+        matrices = tm.quaternionToMatrix(tm.rotateBetween(starts, ends))
+        for start, end, matrix in zip(starts, ends, matrices):
+            np.testing.assert_allclose(np.dot(start / np.linalg.norm(start), matrix),
+                                       end / np.linalg.norm(end), atol=1e-12)
+
+        # A quarter turn about z takes x onto y
+        quarter, _ = _quaternionReference((0, 0, 1), np.pi / 2.0)
+        np.testing.assert_allclose(tm.rotateBetween([1, 0, 0], [0, 1, 0]), quarter, atol=1e-12)
+
+        # Parallel vectors need no rotation
+        np.testing.assert_allclose(tm.rotateBetween([0, 2, 0], [0, 1, 0]), [0, 0, 0, 1], atol=1e-12)
+
+    def testRotateBetweenOpposite(self):
+        for start in ([1, 0, 0], [0, 1, 0], [0, 0, -1], [1, -2, 3]):
+            start = np.asarray(start, dtype=float)
+            quat = tm.rotateBetween(start, -start)
+
+            # A half turn about an axis perpendicular to the vector
+            self.assertAlmostEqual(quat[3], 0.0, places=12)
+            self.assertAlmostEqual(np.dot(quat[:3], start), 0.0, places=12)
+            np.testing.assert_allclose(np.dot(start, tm.quaternionToMatrix(quat)), -start, atol=1e-12)
+
+
+class TestMoveToTransform(unittest.TestCase):
+
+    def setUp(self):
+        pmc.newFile(force=True)
+
+    def _createTarget(self, rotation, translation, scale=(1.0, 1.0, 1.0)):
+
+        # A target under a rotated parent, so its world space differs from its local space
+        parent = pmc.createNode('transform', name='targetParent')
+        parent.setMatrix(tm.composeMatrix(tm.eulerToMatrix(np.radians([10.0, 20.0, 30.0])),
+                                          [1.0, 2.0, 3.0]).ravel().tolist())
+        target = pmc.createNode('transform', name='target', parent=parent)
+        rotation = np.asarray(scale)[:, None] * tm.eulerToMatrix(np.radians(rotation))
+        target.setMatrix(tm.composeMatrix(rotation, translation).ravel().tolist())
+        return target
+
+    def _assertMatches(self, target, upVector):
+        obj = pmc.createNode('transform', name='obj')
+        expected = pmc.createNode('transform', name='expected')
+
+        controltools.move_to_transform(obj, target, upVector)
+        _moveToTransformReference(expected, target, upVector)
+
+        np.testing.assert_allclose(np.array(list(obj.getMatrix(worldSpace=True))),
+                                   np.array(list(expected.getMatrix(worldSpace=True))), atol=1e-9)
+
+    def testUpVectors(self):
+        target = self._createTarget([30.0, -60.0, 45.0], [4.0, -5.0, 6.0])
+        for upVector in ([0, 1, 0], [1, 0, 0], [0, 0, -1], [0.5, 1, -0.25], [0, -1, 0]):
+            self._assertMatches(target, dt.Vector(*upVector))
+
+    def testScaledTarget(self):
+        target = self._createTarget([-15.0, 70.0, 120.0], [0.0, 3.0, -2.0], scale=(2.0, 0.5, 1.5))
+        self._assertMatches(target, dt.Vector(0, 1, 0))
+        self._assertMatches(target, dt.Vector(1, 1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,367 @@
+import numpy as np
+
+# Maya's rotate orders, indexed the same way as the rotateOrder attribute
+ROTATE_ORDERS = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+_AXES = {'x': 0, 'y': 1, 'z': 2}
+
+
+##############################
+#     Rotation Matrices      #
+##############################
+
+def axisMatrix(axis, angles):
+    '''
+    Builds rotation matrices about a single axis.
+    Matrices use Maya's row vector convention (v' = v * M).
+    :param axis: The axis letter, 'x', 'y' or 'z'
+    :param angles: An array of angles in radians
+    :return: An (..., 3, 3) array of rotation matrices
+    '''
+    angles = np.asarray(angles, dtype=float)
+    c = np.cos(angles)
+    s = np.sin(angles)
+    m = np.zeros(angles.shape + (3, 3))
+
+    i = _AXES[axis]
+    j = (i + 1) % 3
+    k = (i + 2) % 3
+
+    m[..., i, i] = 1.0
+    m[..., j, j] = c
+    m[..., j, k] = s
+    m[..., k, j] = -s
+    m[..., k, k] = c
+
+    return m
+
+
+def eulerToMatrix(euler, order='xyz'):
+    '''
+    Converts euler angles to rotation matrices.
+    :param euler: An (..., 3) array of x, y, z angles in radians
+    :param order: The rotate order, either a name or a rotateOrder index
+    :return: An (..., 3, 3) array of rotation matrices
+    '''
+    if not isinstance(order, str):
+        order = ROTATE_ORDERS[order]
+
+    euler = np.asarray(euler, dtype=float)
+
+    # The first axis in the order is applied first
+    m = None
+    for axis in order:
+        r = axisMatrix(axis, euler[..., _AXES[axis]])
+        m = r if m is None else np.matmul(m, r)
+
+    return m
+
+
+def matrixToEuler(matrix, order='xyz'):
+    '''
+    Extracts euler angles from rotation matrices.
+    :param matrix: An (..., 3, 3) or (..., 4, 4) array of matrices
+    :param order: The rotate order, either a name or a rotateOrder index
+    :return: An (..., 3) array of x, y, z angles in radians
+    '''
+    if not isinstance(order, str):
+        order = ROTATE_ORDERS[order]
+
+    # Work with the column vector form, which is the transpose of Maya's
+    m = np.swapaxes(np.asarray(matrix, dtype=float)[..., :3, :3], -1, -2)
+
+    i, j, k = [_AXES[axis] for axis in order]
+    sign = 1.0 if (j - i) % 3 == 1 else -1.0
+
+    euler = np.empty(m.shape[:-2] + (3,))
+    euler[..., j] = np.arcsin(np.clip(-sign * m[..., k, i], -1.0, 1.0))
+    euler[..., i] = np.arctan2(sign * m[..., k, j], m[..., k, k])
+    euler[..., k] = np.arctan2(sign * m[..., j, i], m[..., i, i])
+
+    return euler
+
+
+##############################
+#        Quaternions         #
+##############################
+
+def quaternionToMatrix(quat):
+    '''
+    Converts quaternions to rotation matrices, matching MQuaternion.asMatrix.
+    :param quat: An (..., 4) array of x, y, z, w quaternions
+    :return: An (..., 3, 3) array of rotation matrices
+    '''
+    quat = np.asarray(quat, dtype=float)
+    x, y, z, w = np.moveaxis(quat / np.linalg.norm(quat, axis=-1)[..., None], -1, 0)
+
+    m = np.empty(quat.shape[:-1] + (3, 3))
+    m[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    m[..., 0, 1] = 2 * (x * y + z * w)
+    m[..., 0, 2] = 2 * (x * z - y * w)
+    m[..., 1, 0] = 2 * (x * y - z * w)
+    m[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    m[..., 1, 2] = 2 * (y * z + x * w)
+    m[..., 2, 0] = 2 * (x * z + y * w)
+    m[..., 2, 1] = 2 * (y * z - x * w)
+    m[..., 2, 2] = 1 - 2 * (x * x + y * y)
+
+    return m
+
+
+def matrixToQuaternion(matrix):
+    '''
+    Extracts quaternions from rotation matrices.
+    :param matrix: An (..., 3, 3) or (..., 4, 4) array of matrices without scale
+    :return: An (..., 4) array of x, y, z, w quaternions, with w never negative
+    '''
+    # Work with the column vector form, which is the transpose of Maya's
+    m = np.swapaxes(np.asarray(matrix, dtype=float)[..., :3, :3], -1, -2)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+
+    # Each row is w, x, y, z scaled by four times one of them, the largest is the most stable
+    candidates = np.stack([np.stack([1 + m00 + m11 + m22, m21 - m12, m02 - m20, m10 - m01], -1),
+                           np.stack([m21 - m12, 1 + m00 - m11 - m22, m01 + m10, m02 + m20], -1),
+                           np.stack([m02 - m20, m01 + m10, 1 - m00 + m11 - m22, m12 + m21], -1),
+                           np.stack([m10 - m01, m02 + m20, m12 + m21, 1 - m00 - m11 + m22], -1)], -2)
+
+    best = np.argmax(np.stack([m00 + m11 + m22, m00, m11, m22], -1), axis=-1)
+    rows = np.take_along_axis(candidates, best[..., None, None], axis=-2)[..., 0, :]
+    wxyz = rows / (2.0 * np.sqrt(np.take_along_axis(rows, best[..., None], axis=-1)))
+
+    quat = np.concatenate([wxyz[..., 1:], wxyz[..., :1]], axis=-1)
+    return np.where(quat[..., 3:] < 0, -quat, quat)
+
+
+def eulerToQuaternion(euler, order='xyz'):
+    '''
+    Converts euler angles to quaternions.
+    :param euler: An (..., 3) array of x, y, z angles in radians
+    :param order: The rotate order, either a name or a rotateOrder index
+    :return: An (..., 4) array of x, y, z, w quaternions
+    '''
+    return matrixToQuaternion(eulerToMatrix(euler, order))
+
+
+def quaternionToEuler(quat, order='xyz'):
+    '''
+    Converts quaternions to euler angles.
+    :param quat: An (..., 4) array of x, y, z, w quaternions
+    :param order: The rotate order, either a name or a rotateOrder index
+    :return: An (..., 3) array of x, y, z angles in radians
+    '''
+    return matrixToEuler(quaternionToMatrix(quat), order)
+
+
+def slerp(start, end, weight):
+    '''
+    Spherically interpolates between quaternions along the shortest path.
+    :param start: An (..., 4) array of quaternions at weight 0
+    :param end: An (..., 4) array of quaternions at weight 1
+    :param weight: The weights, broadcast against the quaternions
+    :return: An (..., 4) array of unit quaternions
+    '''
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    start = start / np.linalg.norm(start, axis=-1)[..., None]
+    end = end / np.linalg.norm(end, axis=-1)[..., None]
+    weight = np.asarray(weight, dtype=float)[..., None]
+
+    # q and -q are the same rotation, take whichever is closer
+    cosine = np.sum(start * end, axis=-1)[..., None]
+    end = np.where(cosine < 0, -end, end)
+    cosine = np.abs(cosine)
+
+    # Nearly equal rotations fall back to a linear blend to avoid dividing by zero
+    angle = np.arccos(np.clip(cosine, -1.0, 1.0))
+    sine = np.sin(angle)
+    near = sine < 1e-10
+    sine = np.where(near, 1.0, sine)
+    startWeight = np.where(near, 1.0 - weight, np.sin((1.0 - weight) * angle) / sine)
+    endWeight = np.where(near, weight, np.sin(weight * angle) / sine)
+
+    quat = startWeight * start + endWeight * end
+    return quat / np.linalg.norm(quat, axis=-1)[..., None]
+
+
+def rotateBetween(start, end):
+    '''
+    The shortest rotations taking vectors onto others, like Vector.rotateTo.
+    :param start: An (..., 3) array of vectors
+    :param end: An (..., 3) array of vectors
+    :return: An (..., 4) array of x, y, z, w quaternions
+    '''
+    start, end = np.broadcast_arrays(np.asarray(start, dtype=float), np.asarray(end, dtype=float))
+    start = start / np.linalg.norm(start, axis=-1)[..., None]
+    end = end / np.linalg.norm(end, axis=-1)[..., None]
+
+    # Half way between the identity and the full rotation gives the half angle directly
+    quat = np.concatenate([np.cross(start, end), 1.0 + np.sum(start * end, axis=-1)[..., None]], axis=-1)
+
+    # Opposite vectors turn half way around any perpendicular axis
+    opposite = quat[..., 3] < 1e-9
+    if opposite.any():
+        axis = np.cross(start[opposite], [1.0, 0.0, 0.0])
+        parallel = np.linalg.norm(axis, axis=-1) < 1e-9
+        axis[parallel] = np.cross(start[opposite][parallel], [0.0, 1.0, 0.0])
+        quat[opposite] = np.concatenate([axis, np.zeros(axis.shape[:-1] + (1,))], axis=-1)
+
+    return quat / np.linalg.norm(quat, axis=-1)[..., None]
+
+
+def rotationAngle(start, end):
+    '''
+    The angles of the rotations taking one set of orientations onto another, ignoring scale.
+    :param start: An (..., 3, 3) or (..., 4, 4) array of matrices
+    :param end: An (..., 3, 3) or (..., 4, 4) array of matrices
+    :return: An (...) array of angles in radians, from 0 to pi
+    '''
+    # The relative rotation's trace is 1 + 2cos(angle) and its skew part 2sin(angle) along the axis,
+    # together they stay accurate for the tiny angles an arccos would round away
+    relative = np.einsum('...ji,...jk->...ik', removeScale(start), removeScale(end))
+    skew = np.stack([relative[..., 2, 1] - relative[..., 1, 2],
+                     relative[..., 0, 2] - relative[..., 2, 0],
+                     relative[..., 1, 0] - relative[..., 0, 1]], axis=-1)
+    trace = relative[..., 0, 0] + relative[..., 1, 1] + relative[..., 2, 2]
+
+    return np.arctan2(0.5 * np.linalg.norm(skew, axis=-1), 0.5 * (trace - 1.0))
+
+
+##############################
+#     Transform Matrices     #
+##############################
+
+def composeMatrix(rotation=None, translation=None, shape=()):
+    '''
+    Builds 4x4 transform matrices from rotations and translations.
+    :param rotation: An (..., 3, 3) array of rotation matrices
+    :param translation: An (..., 3) array of translations
+    :param shape: The leading shape to use when neither is given
+    :return: An (..., 4, 4) array of transform matrices
+    '''
+    if rotation is not None:
+        shape = np.shape(rotation)[:-2]
+    elif translation is not None:
+        shape = np.shape(translation)[:-1]
+
+    m = np.zeros(tuple(shape) + (4, 4))
+    m[..., 3, 3] = 1.0
+
+    if rotation is not None:
+        m[..., :3, :3] = rotation
+    else:
+        m[..., 0, 0] = m[..., 1, 1] = m[..., 2, 2] = 1.0
+
+    if translation is not None:
+        m[..., 3, :3] = translation
+
+    return m
+
+
+def invertRigid(matrix):
+    '''
+    Inverts transform matrices that hold only rotation and translation.
+    :param matrix: An (..., 4, 4) array of matrices
+    :return: The inverted matrices
+    '''
+    matrix = np.asarray(matrix, dtype=float)
+    rotation = np.swapaxes(matrix[..., :3, :3], -1, -2)
+    translation = -np.einsum('...i,...ij->...j', matrix[..., 3, :3], rotation)
+
+    return composeMatrix(rotation, translation)
+
+
+def interpolateMatrices(start, end, weight):
+    '''
+    Blends rigid transform matrices, slerping their rotations and interpolating their translations.
+    :param start: An (..., 4, 4) array of matrices at weight 0
+    :param end: An (..., 4, 4) array of matrices at weight 1
+    :param weight: The weights, broadcast against the matrices' leading shape
+    :return: An (..., 4, 4) array of matrices
+    '''
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+
+    rotation = quaternionToMatrix(slerp(matrixToQuaternion(start), matrixToQuaternion(end), weight))
+    translation = start[..., 3, :3] + weight[..., None] * (end[..., 3, :3] - start[..., 3, :3])
+
+    return composeMatrix(rotation, translation)
+
+
+def removeScale(matrix):
+    '''
+    Strips the scale from the rotation part of transform matrices.
+    :param matrix: An (..., 3, 3) or (..., 4, 4) array of matrices
+    :return: An (..., 3, 3) array of rotation matrices
+    '''
+    rotation = np.asarray(matrix, dtype=float)[..., :3, :3]
+    return rotation / np.linalg.norm(rotation, axis=-1)[..., None]
+
+
+def rotateVectors(vectors, matrix):
+    '''
+    Rotates vectors by the rotation part of matrices, like Vector.rotateBy.
+    :param vectors: An (..., 3) array of vectors
+    :param matrix: An (..., 3, 3) or (..., 4, 4) array of matrices
+    :return: An (..., 3) array of vectors
+    '''
+    return np.einsum('...i,...ij->...j', np.asarray(vectors, dtype=float), removeScale(matrix))
+
+
+def flatToMatrix(values):
+    '''
+    Converts flat 16 value lists, as returned by xform, into matrices.
+    :param values: A list of 16 values, or a list of such lists
+    :return: An (..., 4, 4) array of matrices
+    '''
+    values = np.asarray(values, dtype=float)
+    return values.reshape(values.shape[:-1] + (4, 4))
+
+
+##############################
+#      Euler Continuity      #
+##############################
+
+def filterEuler(euler, orders, previous=None):
+    '''
+    Makes euler angles continuous along the first axis, like Maya's euler filter.
+    Each frame picks whichever equivalent solution lies closest to the frame before.
+    :param euler: A (frames, n, 3) array of angles in radians
+    :param orders: The rotate order of each of the n rotations
+    :param previous: The (n, 3) angles preceding the first frame, used to carry continuity across blocks
+    :return: The filtered angles
+    '''
+    euler = np.array(euler, dtype=float)
+    if len(euler) == 0:
+        return euler
+
+    # The alternate solution flips the first and last axes and mirrors the middle one
+    first, middle, last = np.array([[_AXES[axis] for axis in (ROTATE_ORDERS[o] if not isinstance(o, str) else o)]
+                                    for o in orders]).T
+    columns = np.arange(euler.shape[1])
+
+    def closest(angles, reference):
+        return angles + 2.0 * np.pi * np.round((reference - angles) / (2.0 * np.pi))
+
+    start = 0
+    if previous is None:
+        previous = euler[0]
+        start = 1
+
+    for f in range(start, len(euler)):
+        alternate = euler[f].copy()
+        alternate[columns, first] += np.pi
+        alternate[columns, middle] = np.pi - alternate[columns, middle]
+        alternate[columns, last] += np.pi
+
+        candidate = closest(euler[f], previous)
+        alternate = closest(alternate, previous)
+
+        swap = np.abs(alternate - previous).sum(axis=-1) < np.abs(candidate - previous).sum(axis=-1)
+        candidate[swap] = alternate[swap]
+
+        euler[f] = previous = candidate
+
+    return euler